@@ -3,6 +3,7 @@ __version__ = "0.12.0"
 
 from python_socks import ProxyType
 
+from ._addresses import LocalAddressPool
 from ._deprecated import (
     SocksConnectionError,
     SocksConnector,
@@ -14,21 +15,86 @@ from ._errors import (
     ProxyError,
     ProxyTimeoutError,
 )
-from .connector import ChainProxyConnector, ProxyConnector, ProxyInfo
+from ._failover import Failover
+from ._health import HealthCheck
+from ._keepalive import TunnelKeepAlive
+from ._metrics import (
+    Metric,
+    MetricsExporter,
+    ProxyMetrics,
+    Sample,
+    TextExporter,
+)
+from ._pool import (
+    ConsistentHashStrategy,
+    LatencyWeightedStrategy,
+    LeastConnectionsStrategy,
+    RandomStrategy,
+    RoundRobinStrategy,
+    SelectionStrategy,
+    Upstream,
+)
+from ._providers import FileProvider, UpstreamProvider, URLProvider
+from ._resolver import CachingResolver
+from ._tls import TLSSessionCache
+from ._tracing import (
+    ProxyTraceConfig,
+    TraceDestTlsEndParams,
+    TraceProxyConnectEndParams,
+    TraceProxyConnectStartParams,
+    TraceProxyHandshakeEndParams,
+    TraceProxyHopEndParams,
+)
+from ._warm import WarmPool
+from .connector import (
+    ChainProxyConnector,
+    ProxyConnector,
+    ProxyInfo,
+    ProxyPoolConnector,
+)
 from .utils import create_connection, open_connection
 
 __all__ = (
+    "CachingResolver",
     "ChainProxyConnector",
+    "ConsistentHashStrategy",
+    "Failover",
+    "FileProvider",
+    "HealthCheck",
+    "LatencyWeightedStrategy",
+    "LeastConnectionsStrategy",
+    "LocalAddressPool",
+    "Metric",
+    "MetricsExporter",
     "ProxyConnectionError",
     "ProxyConnector",
     "ProxyError",
     "ProxyInfo",
+    "ProxyMetrics",
+    "ProxyPoolConnector",
     "ProxyTimeoutError",
+    "ProxyTraceConfig",
     "ProxyType",
+    "RandomStrategy",
+    "RoundRobinStrategy",
+    "Sample",
+    "SelectionStrategy",
     "SocksConnectionError",
     "SocksConnector",
     "SocksError",
     "SocksVer",
+    "TLSSessionCache",
+    "TextExporter",
+    "TraceDestTlsEndParams",
+    "TraceProxyConnectEndParams",
+    "TraceProxyConnectStartParams",
+    "TraceProxyHandshakeEndParams",
+    "TraceProxyHopEndParams",
+    "TunnelKeepAlive",
+    "URLProvider",
+    "Upstream",
+    "UpstreamProvider",
+    "WarmPool",
     "__title__",
     "__version__",
     "create_connection",
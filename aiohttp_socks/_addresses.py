@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import errno
+import functools
+import ipaddress
+import socket
+from collections.abc import Callable, Iterable
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:  # pragma: no cover
+    from aiohappyeyeballs import AddrInfoType
+
+    from ._dialer import SocketFactory
+
+
+class _PooledSocket(socket.socket):
+    """
+    Gives its local address back to the pool once closed (or detached)
+    """
+
+    __slots__ = ("on_release",)
+
+    def __init__(self, *args: object, **kwargs: object) -> None:
+        super().__init__(*args, **kwargs)  # type: ignore[arg-type]
+        self.on_release: Callable[[], None] | None = None
+
+    def close(self) -> None:
+        self._released()
+        super().close()
+
+    def detach(self) -> int:
+        self._released()
+        return super().detach()
+
+    def _released(self) -> None:
+        release, self.on_release = self.on_release, None
+        if release is not None:
+            release()
+
+
+class LocalAddressPool:
+    """
+    Local addresses to spread connections to proxy servers across,
+    e.g. to have more ephemeral ports than a single address offers.
+
+    Every new socket is bound to the least used address of its family
+    (ties are rotated), and counts against that address until it's closed.
+
+    addresses - local IPv4 and/or IPv6 addresses.
+    max_per_address - (optional) maximum number of open sockets per address,
+        connecting fails when all addresses of the family are used up.
+    """
+
+    def __init__(
+        self,
+        addresses: Iterable[str],
+        max_per_address: int | None = None,
+    ) -> None:
+        self._families: dict[str, socket.AddressFamily] = {}
+        for address in addresses:
+            ip = ipaddress.ip_address(address)  # ValueError if it's not an IP
+            self._families[str(ip)] = (
+                socket.AF_INET6 if ip.version == 6 else socket.AF_INET  # noqa: PLR2004
+            )
+        if not self._families:
+            raise ValueError("At least one local address is required")
+        if max_per_address is not None and max_per_address < 1:
+            raise ValueError(f"Invalid max_per_address: {max_per_address}")
+
+        self._max_per_address = max_per_address
+        self._in_use: dict[str, int] = dict.fromkeys(self._families, 0)
+        self._turn = 0
+
+    @property
+    def addresses(self) -> tuple[str, ...]:
+        return tuple(self._families)
+
+    def in_use(self) -> dict[str, int]:
+        """
+        Number of open sockets per local address
+        """
+        return dict(self._in_use)
+
+    def socket_factory(
+        self, socket_factory: SocketFactory | None = None
+    ) -> SocketFactory:
+        """
+        Wraps socket_factory (or the plain socket constructor)
+        to bind new sockets to the pooled addresses
+        """
+
+        def create_socket(addr_info: AddrInfoType) -> socket.socket:
+            family, type_, proto, _, _ = addr_info
+            if socket_factory is None:
+                sock = _PooledSocket(family=family, type=type_, proto=proto)
+            else:
+                orig = socket_factory(addr_info)
+                sock = _PooledSocket(orig.family, orig.type, orig.proto, orig.detach())
+
+            try:
+                self._bind(sock, family)
+            except BaseException:
+                sock.close()
+                raise
+            return sock
+
+        return create_socket
+
+    def _candidates(self, family: int) -> list[str]:
+        addresses = [a for a, f in self._families.items() if f == family]
+        if not addresses:
+            raise OSError(
+                errno.EADDRNOTAVAIL,
+                f"No local address of family {family!r} in the pool",
+            )
+
+        self._turn += 1
+        turn = self._turn % len(addresses)
+        addresses = addresses[turn:] + addresses[:turn]
+        addresses.sort(key=self._in_use.__getitem__)  # stable, keeps the rotation
+        if self._max_per_address is not None:
+            addresses = [a for a in addresses if self._in_use[a] < self._max_per_address]
+            if not addresses:
+                raise OSError(errno.EADDRNOTAVAIL, "All local addresses are used up")
+        return addresses
+
+    def _bind(self, sock: _PooledSocket, family: int) -> None:
+        # let the kernel pick the port on connect(), so that it's only
+        # required to be unique per destination (Linux)
+        no_port = getattr(socket, "IP_BIND_ADDRESS_NO_PORT", None)
+        if no_port is not None:
+            sock.setsockopt(socket.IPPROTO_IP, no_port, 1)
+
+        error: OSError | None = None
+        for address in self._candidates(family):
+            try:
+                sock.bind((address, 0))
+            except OSError as e:  # e.g. no ephemeral ports left
+                error = e
+                continue
+            self._in_use[address] += 1
+            sock.on_release = functools.partial(self._release, address)
+            return
+
+        assert error is not None
+        raise error
+
+    def _release(self, address: str) -> None:
+        self._in_use[address] -= 1
@@ -0,0 +1,478 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import functools
+import socket
+from collections.abc import Awaitable, Callable, Hashable, Iterator, Sequence
+from typing import TYPE_CHECKING, Any, TypeVar
+
+import aiohappyeyeballs
+import python_socks
+
+from ._h2 import H2ProxyConnection, HTTP2Unsupported
+from ._handshake import (
+    HandshakeProtocol,
+    Stream,
+    negotiate,
+    open_stream,
+    pipelining_errors,
+    pipelining_timeout,
+    request_connect,
+    request_pipelined,
+    start_tls,
+    within_pipelining_timeout,
+)
+from ._protocols import is_ipv4_address, is_ipv6_address
+
+if TYPE_CHECKING:  # pragma: no cover
+    from ssl import SSLContext
+
+    from aiohappyeyeballs import AddrInfoType
+    from aiohttp.abc import AbstractResolver
+
+    from ._keepalive import TunnelKeepAlive
+    from ._pool import Upstream
+    from ._tls import TLSSessionCache
+    from .connector import ProxyInfo
+
+    # (hop index, duration)
+    HopCallback = Callable[[int, float], Awaitable[None]]
+    SocketFactory = Callable[[AddrInfoType], socket.socket]
+
+# (level, option, value) as passed to socket.setsockopt()
+SocketOption = tuple[int, int, "int | bytes"]
+
+
+_T = TypeVar("_T")
+
+
+class Dialer:
+    """
+    Opens connections through upstream proxies.
+
+    Proxy host names are resolved with the given aiohttp resolver.
+
+    All resolved addresses of a proxy server are raced as described
+    in RFC 8305 (Happy Eyeballs), with the same happy_eyeballs_delay
+    and interleave settings TCPConnector uses for direct connections.
+
+    Sockets to proxy servers are created with socket_factory and bound
+    to local_addr_infos, if they are given.
+
+    TLS sessions (to HTTPS proxies and destinations) are resumed
+    with tls_sessions if it's given.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        resolver: AbstractResolver,
+        family: socket.AddressFamily = socket.AF_UNSPEC,
+        happy_eyeballs_delay: float | None = None,
+        interleave: int | None = None,
+        tls_sessions: TLSSessionCache | None = None,
+        local_addr_infos: Sequence[AddrInfoType] | None = None,
+        socket_factory: SocketFactory | None = None,
+    ) -> None:
+        self._loop = loop
+        self._resolver = resolver
+        self._family = family
+        self._happy_eyeballs_delay = happy_eyeballs_delay
+        self._interleave = interleave
+        self._tls_sessions = tls_sessions
+        self._local_addr_infos = local_addr_infos
+        self._socket_factory = socket_factory
+
+    async def resolve(self, host: str, port: int) -> Sequence[AddrInfoType]:
+        if is_ipv4_address(host):
+            return [
+                (
+                    socket.AF_INET,
+                    socket.SOCK_STREAM,
+                    socket.IPPROTO_TCP,
+                    "",
+                    (host, port),
+                )
+            ]
+
+        if is_ipv6_address(host):
+            return [
+                (
+                    socket.AF_INET6,
+                    socket.SOCK_STREAM,
+                    socket.IPPROTO_TCP,
+                    "",
+                    (host, port, 0, 0),
+                )
+            ]
+
+        addr_infos: list[AddrInfoType] = []
+        for result in await self._resolver.resolve(host, port, family=self._family):
+            if result["family"] == socket.AF_INET6:
+                addr: tuple[Any, ...] = (result["host"], result["port"], 0, 0)
+            else:
+                addr = (result["host"], result["port"])
+            addr_infos.append(
+                (result["family"], socket.SOCK_STREAM, socket.IPPROTO_TCP, "", addr)
+            )
+        return addr_infos
+
+    async def open_connection(self, host: str, port: int) -> Stream:
+        sock = await self.open_socket(host, port)
+        try:
+            return await open_stream(sock)
+        except BaseException:  # pragma: no cover
+            sock.close()
+            raise
+
+    async def open_socket(self, host: str, port: int) -> socket.socket:
+        try:
+            addr_infos = await self.resolve(host, port)
+            sock = await aiohappyeyeballs.start_connection(
+                addr_infos,
+                happy_eyeballs_delay=self._happy_eyeballs_delay,
+                interleave=self._interleave,
+                loop=self._loop,
+                local_addr_infos=self._local_addr_infos,
+                socket_factory=self._socket_factory,
+            )
+        except OSError as e:
+            raise python_socks.ProxyConnectionError(
+                e.errno,
+                f"Couldn't connect to proxy {host}:{port} [{e.strerror or e}]",
+            ) from e
+        return sock
+
+    async def open_upstream(
+        self,
+        upstream: Upstream,
+        on_hop: HopCallback | None = None,
+    ) -> Stream:
+        """
+        Connects to the last proxy of the upstream (going through
+        the forward proxies, if any) and runs the destination independent
+        part of its handshake. Only the CONNECT request is left to do.
+        """
+        stream = await self.connect_first_hop(upstream)
+        return await self.prepare(stream, upstream, on_hop=on_hop)
+
+    async def connect_first_hop(self, upstream: Upstream) -> Stream:
+        first = upstream.hops[0]
+        return await _within_timeout(
+            self.open_connection(first.host, first.port),
+            first,
+        )
+
+    async def connect_socket(self, upstream: Upstream) -> socket.socket:
+        """
+        connect_first_hop for connect_h2()
+        """
+        first = upstream.hops[0]
+        return await _within_timeout(
+            self.open_socket(first.host, first.port),
+            first,
+        )
+
+    async def connect_h2(
+        self,
+        upstream: Upstream,
+        proxy_ssl: SSLContext,
+    ) -> H2ProxyConnection:
+        """
+        Opens an HTTP/2 connection to a single HTTPS proxy (see H2Session).
+        Raises HTTP2Unsupported if the proxy doesn't negotiate it.
+
+        proxy_ssl - SSLContext offering h2 with ALPN.
+        """
+        info = upstream.info
+
+        sock = await self.connect_socket(upstream)
+        try:
+            session_key = ("h2", upstream.name, info.host, info.port)
+            with self._tls_session(session_key, proxy_ssl) as store:
+                transport, connection = await _within_timeout(
+                    self._loop.create_connection(
+                        lambda: H2ProxyConnection(self._loop, info),
+                        sock=sock,
+                        ssl=proxy_ssl,
+                        server_hostname=info.host,
+                    ),
+                    info,
+                )
+        except BaseException:
+            sock.close()
+            raise
+
+        store(transport.get_extra_info("ssl_object"))
+        if not connection.negotiated:
+            transport.close()
+            raise HTTP2Unsupported(
+                f"Proxy {info.host}:{info.port} doesn't support HTTP/2"
+            )
+        return connection
+
+    async def request_h2(
+        self,
+        connection: H2ProxyConnection,
+        upstream: Upstream,
+        host: str,
+        port: int,
+    ) -> HandshakeProtocol:
+        """
+        Opens a tunnel as a CONNECT stream of a connection returned
+        by connect_h2. The stream gets a HandshakeProtocol with nothing
+        left to do, for upgrade() and the hand over.
+        """
+        stream = await _within_timeout(connection.request(host, port), upstream.info)
+        protocol = HandshakeProtocol()
+        stream.start(protocol)
+        return protocol
+
+    async def pipeline(
+        self,
+        stream: Stream,
+        upstream: Upstream,
+        host: str,
+        port: int,
+        rtt: float = 0.0,
+    ) -> Stream:
+        """
+        Runs the whole handshake with a single plain SOCKS5 proxy over a stream
+        returned by connect_first_hop, with the requests pipelined
+        (see pipelined_steps). Raises PipeliningRejected if the proxy
+        doesn't take it, also if it doesn't accept the requests within
+        a few round trip times (see pipelining_timeout).
+
+        rtt - round trip time to the proxy, e.g. the time the TCP connect took.
+        """
+        reader, writer = stream
+        info = upstream.info
+        accepted = self._loop.create_future()
+        handshake = request_pipelined(
+            reader,
+            writer,
+            upstream.templates[-1],
+            host,
+            port,
+            accepted=functools.partial(accepted.set_result, None),
+        )
+        try:
+            with pipelining_errors():
+                await _within_timeout(
+                    within_pipelining_timeout(
+                        handshake, accepted, pipelining_timeout(rtt)
+                    ),
+                    info,
+                )
+        except BaseException:
+            writer.transport.abort()
+            raise
+
+        return stream
+
+    async def prepare(
+        self,
+        stream: Stream,
+        upstream: Upstream,
+        on_hop: HopCallback | None = None,
+    ) -> Stream:
+        """
+        Finishes open_upstream on a stream returned by connect_first_hop.
+
+        on_hop - (optional) called when a hop is ready to take the CONNECT
+            request with the index of the hop in upstream.hops and the time
+            it took: TLS and authentication for the first hop, the CONNECT
+            request through the previous hop, TLS and authentication
+            for the others.
+        """
+        last = len(upstream.hops) - 1
+        prev = None
+        try:
+            for index, info in enumerate(upstream.hops):
+                proxy_ssl = upstream.proxy_ssl if index == last else info.proxy_ssl
+                started = self._loop.time()
+                stream = await _within_timeout(
+                    self._enter_hop(stream, upstream, prev, index, proxy_ssl),
+                    info,
+                )
+                if on_hop is not None:
+                    await on_hop(index, self._loop.time() - started)
+                prev = info
+        except BaseException:
+            stream[1].transport.abort()
+            raise
+
+        return stream
+
+    async def request(
+        self,
+        stream: Stream,
+        upstream: Upstream,
+        host: str,
+        port: int,
+    ) -> Stream:
+        """
+        Sends the CONNECT request over a stream returned by open_upstream
+        """
+        reader, writer = stream
+        try:
+            await request_connect(reader, writer, upstream.info, host, port)
+        except BaseException:
+            writer.transport.abort()
+            raise
+
+        return reader, writer
+
+    async def start_tls(
+        self,
+        stream: Stream,
+        host: str,
+        ssl_context: SSLContext,
+        session_key: Hashable | None = None,
+    ) -> Stream:
+        """
+        session_key - (optional) key of the TLS session to resume,
+            see TLSSessionCache.
+        """
+        try:
+            return await self._start_tls(stream, host, ssl_context, session_key)
+        except BaseException:
+            stream[1].transport.abort()
+            raise
+
+    async def upgrade(
+        self,
+        protocol: HandshakeProtocol,
+        host: str,
+        ssl_context: SSLContext,
+        session_key: Hashable | None = None,
+    ) -> None:
+        """
+        start_tls for a HandshakeProtocol returned by request_h2()
+        """
+        assert protocol.transport is not None
+        try:
+            with self._tls_session(session_key, ssl_context) as store:
+                await protocol.start_tls(ssl_context, hostname=host)
+            store(protocol.transport.get_extra_info("ssl_object"))
+        except BaseException:
+            protocol.transport.abort()
+            raise
+
+    async def _start_tls(
+        self,
+        stream: Stream,
+        host: str,
+        ssl_context: SSLContext,
+        session_key: Hashable | None = None,
+    ) -> Stream:
+        reader, writer = stream
+        with self._tls_session(session_key, ssl_context) as store:
+            reader, writer = await start_tls(
+                reader, writer, hostname=host, ssl_context=ssl_context
+            )
+        store(writer.get_extra_info("ssl_object"))
+        return reader, writer
+
+    @contextlib.contextmanager
+    def _tls_session(
+        self,
+        session_key: Hashable | None,
+        ssl_context: SSLContext,
+    ) -> Iterator[Callable[[Any], None]]:
+        """
+        Resumes the TLS session cached under the key (if any),
+        yields the function to cache the new one with
+        """
+        sessions = self._tls_sessions
+        if sessions is None or session_key is None:
+            yield lambda _: None
+            return
+
+        with sessions.resume(session_key, ssl_context):
+            yield functools.partial(sessions.store, session_key, ssl_context)
+
+    async def _enter_hop(
+        self,
+        stream: Stream,
+        upstream: Upstream,
+        prev: ProxyInfo | None,
+        index: int,
+        proxy_ssl: SSLContext | None,
+    ) -> Stream:
+        info = upstream.hops[index]
+        reader, writer = stream
+        if prev is not None:
+            await request_connect(reader, writer, prev, info.host, info.port)
+        if proxy_ssl is not None:
+            stream = await self._start_tls(
+                stream,
+                host=info.host,
+                ssl_context=proxy_ssl,
+                session_key=("proxy", upstream.name, info.host, info.port),
+            )
+        await negotiate(*stream, upstream.templates[index])
+        return stream
+
+    async def connect(
+        self,
+        upstream: Upstream,
+        host: str,
+        port: int,
+        dest_ssl: SSLContext | None = None,
+    ) -> asyncio.StreamWriter:
+        stream = await self.open_upstream(upstream)
+        stream = await self.request(stream, upstream, host=host, port=port)
+        if dest_ssl is not None:
+            stream = await self.start_tls(
+                stream,
+                host=host,
+                ssl_context=dest_ssl,
+                session_key=("dest", upstream.name, host, port),
+            )
+        return stream[1]
+
+
+async def _within_timeout(aw: Awaitable[_T], info: ProxyInfo) -> _T:
+    if info.timeout is None:
+        return await aw
+
+    try:
+        return await asyncio.wait_for(aw, timeout=info.timeout)
+    except asyncio.TimeoutError as e:
+        raise python_socks.ProxyTimeoutError(
+            f"Proxy {info.host}:{info.port} timed out: {info.timeout}"
+        ) from e
+
+
+def configure_sockets(
+    socket_options: Sequence[SocketOption] = (),
+    keepalive: TunnelKeepAlive | None = None,
+    socket_factory: SocketFactory | None = None,
+) -> SocketFactory | None:
+    """
+    Wraps socket_factory (or the plain socket constructor)
+    to set socket_options and keepalive options on new sockets
+    """
+    if not socket_options and keepalive is None:
+        return socket_factory
+
+    def create_socket(addr_info: AddrInfoType) -> socket.socket:
+        if socket_factory is not None:
+            sock = socket_factory(addr_info)
+        else:
+            family, type_, proto, _, _ = addr_info
+            sock = socket.socket(family=family, type=type_, proto=proto)
+
+        try:
+            for level, option, value in socket_options:
+                sock.setsockopt(level, option, value)
+            if keepalive is not None:
+                keepalive.apply(sock)
+        except BaseException:
+            sock.close()
+            raise
+        return sock
+
+    return create_socket
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+from typing import NamedTuple
+
+import python_socks
+
+# SOCKS5: general failure, network unreachable, host unreachable, TTL expired;
+# SOCKS4: request rejected or failed;
+# HTTP: bad gateway, service unavailable, gateway timeout
+DEFAULT_RETRY_ERROR_CODES = frozenset((1, 3, 4, 6, 91, 502, 503, 504))
+
+
+class Failover(NamedTuple):
+    """
+    Retrying failed proxy connections through other upstreams.
+    All attempts share the sock_connect timeout of the request.
+
+    max_attempts - maximum number of attempts per connection.
+    hedge_delay - (optional) if an attempt hasn't finished within that many
+        seconds, the next one is started in parallel and the first tunnel
+        established wins. By default the next attempt waits for a failure.
+    retry_error_codes - ProxyError.error_code values after which the next
+        attempt is made. Connection errors and timeouts are always retried,
+        errors without a code (e.g. authentication failures) never are.
+    """
+
+    max_attempts: int = 3
+    hedge_delay: float | None = None
+    retry_error_codes: frozenset[int] = DEFAULT_RETRY_ERROR_CODES
+
+    def should_retry(self, exc: BaseException) -> bool:
+        if isinstance(
+            exc,
+            (python_socks.ProxyConnectionError, python_socks.ProxyTimeoutError),
+        ):
+            return True
+        return (
+            isinstance(exc, python_socks.ProxyError)
+            and exc.error_code in self.retry_error_codes
+        )
@@ -0,0 +1,595 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import http
+from collections import deque
+from collections.abc import Awaitable, Callable
+from typing import TYPE_CHECKING, Any
+
+import python_socks
+
+from ._protocols.http import authority, basic_auth
+
+try:
+    import h2.config
+    import h2.connection
+    import h2.errors
+    import h2.events
+    import h2.exceptions
+    import h2.settings
+except ImportError:  # pragma: no cover
+    h2 = None  # type: ignore[assignment]
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .connector import ProxyInfo
+
+ALPN_PROTOCOLS = ["h2", "http/1.1"]
+
+# flow control windows we advertise, the defaults (64 KiB for the whole
+# connection) would throttle tunnels sharing a connection
+STREAM_WINDOW = 2**18
+CONNECTION_WINDOW = 2**24
+DEFAULT_WINDOW = 2**16 - 1
+
+WRITE_BUFFER_HIGH = 2**16  # the default of asyncio transports
+
+# extra info of the connection to the proxy that applies to its streams
+_SHARED_EXTRA_INFO = ("peername", "sockname", "socket")
+
+
+class HTTP2Unsupported(python_socks.ProxyError):
+    """
+    The proxy server didn't negotiate HTTP/2 (with ALPN)
+    """
+
+
+def require_h2() -> None:
+    if h2 is None:  # pragma: no cover
+        raise ImportError("HTTP/2 support requires h2: pip install aiohttp-socks[http2]")
+
+
+class H2Stream(asyncio.Transport):
+    """
+    Transport over a single CONNECT stream (RFC 7540, section 8.3):
+    END_STREAM stands for the EOF of a TCP connection and RST_STREAM
+    for a reset. Received data is only acknowledged (and so the proxy
+    only sends more) as it's passed on to the protocol.
+
+    Nothing is passed on until the protocol is started with start().
+    """
+
+    _start_tls_compatible = True
+
+    def __init__(self, connection: H2ProxyConnection, stream_id: int) -> None:
+        super().__init__()
+        self._connection = connection
+        self.stream_id = stream_id
+        self.response: asyncio.Future[int] = connection.loop.create_future()
+        self._protocol: asyncio.BaseProtocol | None = None
+        self._outgoing = bytearray()
+        self._incoming: deque[bytes] = deque()
+        self._unacknowledged = 0
+        self._high_water = WRITE_BUFFER_HIGH
+        self._low_water = WRITE_BUFFER_HIGH // 4
+        self._reading = True
+        self._writing_paused = False
+        self._eof_written = False  # END_STREAM is sent once the buffer is flushed
+        self._ended = False  # END_STREAM sent
+        self._remote_ended = False
+        self._eof_pending = False  # END_STREAM received, not passed on yet
+        self._reset = False
+        self._closing = False
+        self._lost = False
+
+    def start(self, protocol: asyncio.BaseProtocol) -> None:
+        self._protocol = protocol
+        protocol.connection_made(self)
+        self._deliver()
+
+    def get_extra_info(self, name: str, default: Any = None) -> Any:
+        if name in _SHARED_EXTRA_INFO:
+            return self._connection.get_extra_info(name, default)
+        return super().get_extra_info(name, default)
+
+    def set_protocol(self, protocol: asyncio.BaseProtocol) -> None:
+        self._protocol = protocol
+
+    def get_protocol(self) -> asyncio.BaseProtocol:
+        assert self._protocol is not None
+        return self._protocol
+
+    def is_closing(self) -> bool:
+        return self._closing
+
+    def is_reading(self) -> bool:
+        return self._reading
+
+    def pause_reading(self) -> None:
+        self._reading = False
+
+    def resume_reading(self) -> None:
+        if not self._reading:
+            self._reading = True
+            self._deliver()
+
+    def set_write_buffer_limits(
+        self, high: int | None = None, low: int | None = None
+    ) -> None:
+        if high is None:
+            high = WRITE_BUFFER_HIGH if low is None else 4 * low
+        if low is None:
+            low = high // 4
+        self._high_water, self._low_water = high, low
+        self.update_writing()
+
+    def get_write_buffer_limits(self) -> tuple[int, int]:
+        return self._low_water, self._high_water
+
+    def get_write_buffer_size(self) -> int:
+        return len(self._outgoing)
+
+    def write(self, data: bytes | bytearray | memoryview) -> None:
+        if self._eof_written or not data:
+            return
+        self._outgoing += data
+        self.flush()
+
+    def can_write_eof(self) -> bool:
+        return True
+
+    def write_eof(self) -> None:
+        if not self._eof_written:
+            self._eof_written = True
+            self.flush()
+
+    def close(self) -> None:
+        if self._closing:
+            return
+        self._closing = True
+        self._discard_incoming()
+        self.write_eof()
+        self._connection.loop.call_soon(self._lose, None)
+
+    def abort(self) -> None:
+        self._closing = True
+        self._outgoing.clear()
+        self._discard_incoming()
+        self._cancel()
+        self._connection.loop.call_soon(self._lose, None)
+
+    def flush(self) -> None:
+        """
+        Sends as much of the buffer as the flow control windows allow
+        """
+        connection = self._connection
+        while self._outgoing and not self._reset:
+            size = min(len(self._outgoing), connection.window(self.stream_id))
+            if size <= 0:
+                break
+            connection.send_data(self.stream_id, bytes(self._outgoing[:size]))
+            del self._outgoing[:size]
+
+        if self._eof_written and not self._outgoing and not self._ended:
+            self._ended = True
+            if not self._reset:
+                connection.end_stream(self.stream_id)
+            if self._remote_ended:
+                connection.forget(self.stream_id)
+
+        connection.send()
+        self.update_writing()
+
+    def update_writing(self) -> None:
+        if self._protocol is None or self._lost:
+            return
+
+        size = len(self._outgoing)
+        if not self._writing_paused:
+            if self._connection.writing_paused or size > self._high_water:
+                self._writing_paused = True
+                self._protocol.pause_writing()
+        elif not self._connection.writing_paused and size <= self._low_water:
+            self._writing_paused = False
+            self._protocol.resume_writing()
+
+    def on_response(self, status: int) -> None:
+        if not self.response.done():
+            self.response.set_result(status)
+
+    def on_data(self, data: bytes, flow_controlled_length: int) -> None:
+        self._unacknowledged += flow_controlled_length
+        if self._closing:
+            # data after close(), a TCP connection would reset
+            self._discard_incoming()
+            self._cancel()
+            return
+        self._incoming.append(data)
+        self._deliver()
+
+    def on_end(self) -> None:
+        self._remote_ended = True
+        if self._ended:
+            self._connection.forget(self.stream_id)
+        self._eof_pending = True
+        self._deliver()
+
+    def on_reset(self, error_code: int) -> None:
+        self._reset = True
+        self._outgoing.clear()
+        self._connection.forget(self.stream_id)
+        self._fail(
+            ConnectionResetError(f"Stream reset by the proxy server [{error_code!r}]")
+        )
+
+    def on_lost(self, exc: Exception | None) -> None:
+        self._reset = True
+        self._outgoing.clear()
+        if exc is None:
+            exc = ConnectionResetError("Connection to the proxy server closed")
+        self._fail(exc)
+
+    def _deliver(self) -> None:
+        protocol = self._protocol
+        if protocol is None or self._lost:
+            return
+
+        while self._incoming and self._reading:
+            _feed_data(protocol, self._incoming.popleft())
+
+        if not self._incoming and self._unacknowledged:
+            self._connection.acknowledge(self.stream_id, self._unacknowledged)
+            self._unacknowledged = 0
+            self._connection.send()
+
+        if self._eof_pending and self._reading and not self._incoming:
+            self._eof_pending = False
+            if not protocol.eof_received():  # type: ignore[attr-defined]
+                self.close()
+
+    def _discard_incoming(self) -> None:
+        self._incoming.clear()
+        if self._unacknowledged:
+            self._connection.acknowledge(self.stream_id, self._unacknowledged)
+            self._unacknowledged = 0
+
+    def _cancel(self) -> None:
+        if not self._reset:
+            self._reset = True
+            self._connection.reset_stream(self.stream_id)
+            self._connection.forget(self.stream_id)
+            self._connection.send()
+
+    def _fail(self, exc: Exception) -> None:
+        if not self.response.done():
+            self.response.set_exception(
+                python_socks.ProxyConnectionError(
+                    getattr(exc, "errno", None),
+                    f"Connection to the proxy server lost [{exc}]",
+                )
+            )
+        self._closing = True
+        self._lose(exc)
+
+    def _lose(self, exc: Exception | None) -> None:
+        if self._lost:
+            return
+        self._lost = True
+        if self._protocol is not None:
+            self._protocol.connection_lost(exc)
+
+
+class H2ProxyConnection(asyncio.Protocol):
+    """
+    HTTP/2 connection to an HTTPS proxy, carrying tunnels as CONNECT streams.
+
+    negotiated - whether HTTP/2 was negotiated with ALPN, nothing is sent
+        otherwise.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, info: ProxyInfo) -> None:
+        self.loop = loop
+        self._info = info
+        self._h2 = h2.connection.H2Connection(
+            config=h2.config.H2Configuration(client_side=True, header_encoding="utf-8")
+        )
+        self._streams: dict[int, H2Stream] = {}
+        self._closed = False
+        self.transport: asyncio.Transport | None = None
+        self.negotiated = False
+        self.writing_paused = False
+
+    @property
+    def closed(self) -> bool:
+        """
+        Whether the connection no longer takes new streams
+        """
+        return self._closed
+
+    @property
+    def available(self) -> bool:
+        """
+        Whether the connection takes new streams
+        """
+        return (
+            not self._closed
+            and self._h2.open_outbound_streams
+            < self._h2.remote_settings.max_concurrent_streams
+        )
+
+    @property
+    def streams(self) -> int:
+        return len(self._streams)
+
+    async def request(self, host: str, port: int) -> H2Stream:
+        """
+        Opens a tunnel to the destination
+        """
+        headers = [(":method", "CONNECT"), (":authority", authority(host, port))]
+        if self._info.username and self._info.password:
+            auth = basic_auth(self._info.username, self._info.password)
+            headers.append(("proxy-authorization", auth))
+
+        try:
+            stream_id = self._h2.get_next_available_stream_id()
+        except h2.exceptions.NoAvailableStreamIDError as e:  # pragma: no cover
+            self._closed = True
+            raise python_socks.ProxyError("No stream IDs left on the connection") from e
+
+        stream = self._streams[stream_id] = H2Stream(self, stream_id)
+        self._h2.send_headers(stream_id, headers)
+        self.send()
+
+        try:
+            status = await stream.response
+        except BaseException:
+            stream.abort()
+            raise
+
+        if not http.HTTPStatus.OK <= status < http.HTTPStatus.MULTIPLE_CHOICES:
+            stream.abort()
+            reason = _reason(status)
+            raise python_socks.ProxyError(f"{status} {reason}", error_code=status)
+        return stream
+
+    def close(self) -> None:
+        self._closed = True
+        if self.transport is not None and not self.transport.is_closing():
+            if self.negotiated:
+                self._h2.close_connection()
+                self.send()
+            self.transport.close()
+        self._lose(None)
+
+    def drain(self) -> None:
+        """
+        Stops taking new streams, closes the connection once
+        the ones there are have been closed
+        """
+        self._closed = True
+        if not self._streams:
+            self.close()
+
+    def get_extra_info(self, name: str, default: Any = None) -> Any:
+        if self.transport is None:  # pragma: no cover
+            return default
+        return self.transport.get_extra_info(name, default)
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self.transport = transport  # type: ignore[assignment]
+        ssl_object = transport.get_extra_info("ssl_object")
+        self.negotiated = (
+            ssl_object is not None and ssl_object.selected_alpn_protocol() == "h2"
+        )
+        if not self.negotiated:
+            self._closed = True
+            return
+
+        self._h2.initiate_connection()
+        self._h2.update_settings(
+            {
+                h2.settings.SettingCodes.ENABLE_PUSH: 0,
+                h2.settings.SettingCodes.INITIAL_WINDOW_SIZE: STREAM_WINDOW,
+            }
+        )
+        self._h2.increment_flow_control_window(CONNECTION_WINDOW - DEFAULT_WINDOW)
+        self.send()
+
+    def data_received(self, data: bytes) -> None:
+        if not self.negotiated:  # pragma: no cover
+            return
+
+        try:
+            events = self._h2.receive_data(data)
+        except h2.exceptions.ProtocolError as e:
+            self.send()  # GOAWAY
+            self._closed = True
+            assert self.transport is not None
+            self.transport.close()
+            self._lose(ConnectionResetError(f"HTTP/2 protocol error [{e}]"))
+            return
+
+        for event in events:
+            self._handle(event)
+        self.send()
+
+    def eof_received(self) -> None:
+        self._closed = True
+
+    def connection_lost(self, exc: Exception | None) -> None:
+        self._closed = True
+        self._lose(exc)
+
+    def pause_writing(self) -> None:
+        self.writing_paused = True
+        for stream in list(self._streams.values()):
+            stream.update_writing()
+
+    def resume_writing(self) -> None:
+        self.writing_paused = False
+        for stream in list(self._streams.values()):
+            stream.update_writing()
+
+    def window(self, stream_id: int) -> int:
+        try:
+            window = self._h2.local_flow_control_window(stream_id)
+        except h2.exceptions.StreamClosedError:  # pragma: no cover
+            return 0
+        return min(window, self._h2.max_outbound_frame_size)
+
+    def send_data(self, stream_id: int, data: bytes) -> None:
+        self._h2.send_data(stream_id, data)
+
+    def end_stream(self, stream_id: int) -> None:
+        with contextlib.suppress(h2.exceptions.StreamClosedError):
+            self._h2.end_stream(stream_id)
+
+    def reset_stream(self, stream_id: int) -> None:
+        with contextlib.suppress(h2.exceptions.StreamClosedError):
+            self._h2.reset_stream(stream_id, h2.errors.ErrorCodes.CANCEL)
+
+    def acknowledge(self, stream_id: int, size: int) -> None:
+        self._h2.acknowledge_received_data(size, stream_id)
+
+    def forget(self, stream_id: int) -> None:
+        self._streams.pop(stream_id, None)
+        if self._closed and not self._streams:
+            self.close()
+
+    def send(self) -> None:
+        data = self._h2.data_to_send()
+        if data and self.transport is not None and not self.transport.is_closing():
+            self.transport.write(data)
+
+    def _handle(self, event: h2.events.Event) -> None:
+        if isinstance(event, h2.events.ConnectionTerminated):
+            self._closed = True  # GOAWAY, streams above the last one are dropped
+            last = event.last_stream_id or 0
+            for stream_id, stream in list(self._streams.items()):
+                if stream_id > last:
+                    stream.on_reset(event.error_code or 0)
+        elif isinstance(event, h2.events.RemoteSettingsChanged) or (
+            isinstance(event, h2.events.WindowUpdated) and not event.stream_id
+        ):
+            for stream in list(self._streams.values()):
+                stream.flush()  # the windows might have grown
+        else:
+            self._handle_stream_event(event)
+
+    def _handle_stream_event(self, event: h2.events.Event) -> None:
+        stream_id = getattr(event, "stream_id", None)
+        stream = self._streams.get(stream_id) if stream_id else None
+        if isinstance(event, h2.events.DataReceived):
+            assert event.stream_id is not None
+            assert event.flow_controlled_length is not None
+            if stream is None:
+                self.acknowledge(event.stream_id, event.flow_controlled_length)
+            else:
+                stream.on_data(event.data or b"", event.flow_controlled_length)
+        elif stream is None:
+            return
+        elif isinstance(event, h2.events.ResponseReceived):
+            stream.on_response(_status(event.headers or []))
+        elif isinstance(event, h2.events.StreamEnded):
+            stream.on_end()
+        elif isinstance(event, h2.events.StreamReset):
+            stream.on_reset(event.error_code or 0)
+        elif isinstance(event, h2.events.WindowUpdated):
+            stream.flush()
+
+    def _lose(self, exc: Exception | None) -> None:
+        streams = list(self._streams.values())
+        self._streams.clear()
+        for stream in streams:
+            stream.on_lost(exc)
+
+
+class H2Session:
+    """
+    HTTP/2 connections to a single HTTPS proxy, shared by all tunnels
+    through it. Another connection is only opened when the ones there are
+    can't take more streams (or have been closed).
+
+    connect - opens a new connection.
+    """
+
+    def __init__(self, connect: Callable[[], Awaitable[H2ProxyConnection]]) -> None:
+        require_h2()
+        self._connect = connect
+        self._connections: list[H2ProxyConnection] = []
+        self._connecting: asyncio.Task[None] | None = None
+
+    @property
+    def connections(self) -> int:
+        return len(self._connections)
+
+    async def acquire(self) -> H2ProxyConnection:
+        """
+        Returns a connection that takes a new stream
+        """
+        while True:
+            self._connections = [c for c in self._connections if not c.closed]
+            for connection in self._connections:
+                if connection.available:
+                    return connection
+
+            if self._connecting is None:
+                self._connecting = asyncio.ensure_future(self._open())
+            await asyncio.shield(self._connecting)
+
+    def close(self) -> None:
+        if self._connecting is not None:
+            self._connecting.cancel()
+            self._connecting = None
+        for connection in self._connections:
+            connection.close()
+        self._connections.clear()
+
+    def drain(self) -> None:
+        """
+        close() that lets the open tunnels finish
+        """
+        if self._connecting is not None:
+            self._connecting.cancel()
+            self._connecting = None
+        for connection in self._connections:
+            connection.drain()
+        self._connections.clear()
+
+    async def _open(self) -> None:
+        try:
+            connection = await self._connect()
+            self._connections.append(connection)
+        finally:
+            self._connecting = None
+
+
+def _feed_data(protocol: asyncio.BaseProtocol, data: bytes) -> None:
+    if not isinstance(protocol, asyncio.BufferedProtocol):
+        protocol.data_received(data)  # type: ignore[attr-defined]
+        return
+
+    # e.g. SSLProtocol, see asyncio.protocols._feed_data_to_buffered_proto
+    view = memoryview(data)
+    while view:
+        buffer = memoryview(protocol.get_buffer(len(view)))
+        size = min(len(buffer), len(view))
+        if not size:  # pragma: no cover
+            raise RuntimeError("get_buffer() returned an empty buffer")
+        buffer[:size] = view[:size]
+        protocol.buffer_updated(size)
+        view = view[size:]
+
+
+def _status(headers: list[tuple[Any, Any]]) -> int:
+    for name, value in headers:
+        if name in (":status", b":status"):
+            return int(value)
+    return 0  # pragma: no cover
+
+
+def _reason(status: int) -> str:
+    try:
+        return http.HTTPStatus(status).phrase
+    except ValueError:  # pragma: no cover
+        return ""
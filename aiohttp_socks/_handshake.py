@@ -0,0 +1,543 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import socket
+import sys
+from collections.abc import Awaitable, Callable, Generator, Iterator
+from ssl import SSLContext
+from typing import TYPE_CHECKING
+
+import python_socks
+from python_socks import ProxyType
+
+from ._protocols import http, is_ip_address, socks4, socks5
+from ._protocols.errors import ReplyError
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .connector import ProxyInfo
+
+    # what a handshake step waits for: a number of bytes, the bytes up to
+    # (and including) a terminator, or a function telling the size
+    # of the reply from its first bytes
+    Read = int | bytes | Callable[[bytes], int]
+    Steps = Generator[Read, bytes, None]
+    Write = Callable[[bytes], None]
+
+HTTP_REPLY_TERMINATOR = b"\r\n\r\n"
+
+# see pipelining_timeout
+PIPELINING_RTT_FACTOR = 4
+PIPELINING_MIN_TIMEOUT = 1.0
+
+_SOCKS5_SUCCEEDED = bytes((socks5.SOCKS_VER, socks5.ReplyCode.SUCCEEDED, socks5.RSV))
+_SOCKS5_REPLY_SIZES: dict[int, int] = {
+    socks5.AddressType.IPV4: 10,
+    socks5.AddressType.IPV6: 22,
+}
+
+_stream_writer_del = getattr(asyncio.StreamWriter, "__del__", None)
+
+
+class PipeliningRejected(python_socks.ProxyError):
+    """
+    The proxy server didn't take a pipelined handshake (see pipelined_steps):
+    it chose another authentication method, closed the connection or stalled
+    instead of replying to the requests.
+    """
+
+
+class TunnelWriter(asyncio.StreamWriter):
+    """
+    StreamWriter that hands its transport over to another protocol
+    once the handshake is done. Neither the writer nor the reader
+    has to be kept alive after that: a detached writer doesn't close
+    the transport when it's garbage collected
+    (see StreamWriter.__del__, added in Python 3.11.5).
+    """
+
+    _detached = False
+
+    def detach(self) -> asyncio.Transport:
+        self._detached = True
+        return self.transport  # type: ignore[return-value]
+
+    def hand_over(self, protocol: asyncio.Protocol) -> asyncio.Transport:
+        """
+        Switches the transport to the protocol, see switch_protocol
+        """
+        transport = self.detach()
+        reader = self._reader  # type: ignore[attr-defined]
+        switch_protocol(transport, protocol, _take_buffer(reader), eof=reader.at_eof())
+        return transport
+
+    def __del__(self) -> None:
+        if not self._detached and _stream_writer_del is not None:
+            _stream_writer_del(self)
+
+
+Stream = tuple[asyncio.StreamReader, TunnelWriter]
+
+
+class ProxyStream:
+    """
+    A tunnel opened by python-socks (see Proxy.connect). Unlike a TunnelWriter,
+    its StreamWriter can't be detached: whatever the transport is handed over
+    to has to keep a reference to it, see
+    https://github.com/romis2012/aiohttp-socks/issues/27
+    """
+
+    def __init__(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        self.reader = reader
+        self.writer = writer
+
+    def hand_over(self, protocol: asyncio.Protocol) -> asyncio.Transport:
+        """
+        Switches the transport to the protocol, see switch_protocol
+        """
+        transport: asyncio.Transport = self.writer.transport  # type: ignore[assignment]
+        reader = self.reader
+        switch_protocol(transport, protocol, _take_buffer(reader), eof=reader.at_eof())
+        return transport
+
+
+class HandshakeProtocol(asyncio.Protocol):
+    """
+    Holds a tunnel whose proxy handshake is done (e.g. an HTTP/2 CONNECT
+    stream) until TLS to the destination, if any, is set up over it
+    and it's handed over to another protocol in place. Bytes received
+    meanwhile are passed on, as is the EOF.
+    """
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+        self._eof = False
+        self.transport: asyncio.Transport | None = None
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self.transport = transport  # type: ignore[assignment]
+
+    def data_received(self, data: bytes) -> None:
+        self._buffer += data
+
+    def eof_received(self) -> bool:
+        self._eof = True
+        return True  # the EOF is passed on by hand_over()
+
+    async def start_tls(self, ssl_context: SSLContext, hostname: str) -> None:
+        assert self.transport is not None
+        loop = asyncio.get_running_loop()
+        transport = await loop.start_tls(
+            self.transport,
+            self,
+            ssl_context,
+            server_side=False,
+            server_hostname=hostname,
+        )
+        assert transport is not None
+        self.transport = transport
+
+    def hand_over(self, protocol: asyncio.Protocol) -> asyncio.Transport:
+        """
+        Switches the transport to the protocol, see switch_protocol
+        """
+        assert self.transport is not None
+        buffer, self._buffer = self._buffer, bytearray()
+        switch_protocol(self.transport, protocol, buffer, eof=self._eof)
+        return self.transport
+
+
+if TYPE_CHECKING:  # pragma: no cover
+    Tunnel = TunnelWriter | HandshakeProtocol | ProxyStream
+
+
+def switch_protocol(
+    transport: asyncio.Transport,
+    protocol: asyncio.Protocol,
+    buffer: bytearray,
+    *,
+    eof: bool = False,
+) -> None:
+    """
+    Switches the transport to the protocol. Bytes already read past
+    the handshake (e.g. sent by the destination along with the proxy reply)
+    are passed on without copying, as is the EOF.
+    """
+    paused = not transport.is_reading()  # by the flow control of a StreamReader
+
+    transport.set_protocol(protocol)
+    protocol.connection_made(transport)
+    if paused:
+        transport.resume_reading()
+    if buffer:
+        protocol.data_received(buffer)  # type: ignore[arg-type]
+    if eof and not protocol.eof_received():
+        transport.close()
+
+
+async def open_stream(sock: socket.socket) -> Stream:
+    """
+    asyncio.open_connection() with a TunnelWriter
+    """
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(loop=loop)
+    protocol = asyncio.StreamReaderProtocol(reader, loop=loop)
+    transport, _ = await loop.create_connection(lambda: protocol, sock=sock)
+    return reader, TunnelWriter(transport, protocol, reader, loop)
+
+
+def _take_buffer(reader: asyncio.StreamReader) -> bytearray:
+    # StreamReader has no public way to take the buffer over without a copy
+    buffer: bytearray = reader._buffer  # type: ignore[attr-defined]  # noqa: SLF001
+    reader._buffer = bytearray()  # type: ignore[attr-defined]  # noqa: SLF001
+    return buffer
+
+
+@contextlib.contextmanager
+def handshake_errors() -> Iterator[None]:
+    """
+    Turns the errors of a handshake into python-socks errors
+    """
+    try:
+        yield
+    except ReplyError as e:
+        raise python_socks.ProxyError(e, error_code=e.error_code) from e
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError) as e:
+        raise python_socks.ProxyError(e) from e
+    except TimeoutError:
+        raise
+    except OSError as e:  # e.g. the connection has been reset
+        raise python_socks.ProxyConnectionError(
+            e.errno, f"Connection to the proxy server lost [{e}]"
+        ) from e
+
+
+async def start_tls(
+    reader: asyncio.StreamReader,
+    writer: TunnelWriter,
+    hostname: str,
+    ssl_context: SSLContext,
+) -> Stream:
+    if sys.version_info < (3, 11):  # pragma: no cover
+        loop = asyncio.get_running_loop()
+        tls_reader = asyncio.StreamReader()
+        protocol = asyncio.StreamReaderProtocol(tls_reader)
+        transport = await loop.start_tls(
+            writer.transport,
+            protocol,
+            ssl_context,
+            server_side=False,
+            server_hostname=hostname,
+        )
+        protocol.connection_made(transport)
+        tls_writer = TunnelWriter(transport, protocol, tls_reader, loop)
+        return tls_reader, tls_writer
+
+    await writer.start_tls(ssl_context, server_hostname=hostname)
+    return reader, writer
+
+
+class HandshakeTemplate:
+    """
+    The destination independent requests of a proxy handshake, encoded
+    once per proxy: the SOCKS5 method selection and authentication requests
+    don't change between connections.
+
+    greeting - method selection request offering every method
+        the credentials allow.
+    auth - username/password authentication request, empty without credentials.
+    pipelined_greeting - method selection request offering only the method
+        the pipelined requests are made for (see pipelined_steps).
+    """
+
+    def __init__(self, info: ProxyInfo) -> None:
+        self.info = info
+        self._methods = socks5.AuthMethodsRequest(
+            username=info.username,
+            password=info.password,
+        )
+        self._pipelined_methods = socks5.AuthMethodsRequest(
+            username=info.username,
+            password=info.password,
+        )
+        self.auth = b""
+        if socks5.AuthMethod.USERNAME_PASSWORD in self._methods.methods:
+            assert info.username is not None
+            assert info.password is not None
+
+            self._pipelined_methods.methods = bytearray(
+                (socks5.AuthMethod.USERNAME_PASSWORD,)
+            )
+            self.auth = socks5.AuthRequest(
+                username=info.username,
+                password=info.password,
+            ).dumps()
+        self.greeting = self._methods.dumps()
+        self.pipelined_greeting = self._pipelined_methods.dumps()
+
+    def validate(self, reply: socks5.AuthMethodReply, *, pipelined: bool) -> None:
+        """
+        Checks the method the server chose was offered
+        """
+        reply.validate(self._pipelined_methods if pipelined else self._methods)
+
+
+async def negotiate(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    template: HandshakeTemplate,
+) -> None:
+    """
+    Runs the destination independent part of the handshake
+    (SOCKS5 method selection and authentication)
+    """
+    await _run_steps(negotiate_steps(template, writer.write), reader)
+
+
+async def request_connect(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    info: ProxyInfo,
+    host: str,
+    port: int,
+) -> None:
+    """
+    Asks an already negotiated proxy to connect to the destination
+    """
+    host = await resolve_destination(info, host)
+    await _run_steps(connect_steps(info, host, port, writer.write), reader)
+
+
+async def request_pipelined(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    template: HandshakeTemplate,
+    host: str,
+    port: int,
+    accepted: Callable[[], None] | None = None,
+) -> None:
+    """
+    negotiate and request_connect in one go, see pipelined_steps
+    """
+    host = await resolve_destination(template.info, host)
+    await _run_steps(
+        pipelined_steps(template, host, port, writer.write, accepted=accepted),
+        reader,
+    )
+
+
+def negotiate_steps(template: HandshakeTemplate, write: Write) -> Steps:
+    if template.info.proxy_type != ProxyType.SOCKS5:
+        return
+
+    write(template.greeting)
+
+    reply = socks5.AuthMethodReply.loads((yield socks5.AuthMethodReply.SIZE))
+    template.validate(reply, pipelined=False)
+
+    if reply.method == socks5.AuthMethod.USERNAME_PASSWORD:
+        write(template.auth)
+        socks5.AuthReply.loads((yield socks5.AuthReply.SIZE))
+
+
+def connect_steps(info: ProxyInfo, host: str, port: int, write: Write) -> Steps:
+    """
+    host - resolved with resolve_destination()
+    """
+    if info.proxy_type == ProxyType.SOCKS5:
+        write(socks5.ConnectRequest(host=host, port=port).dumps())
+        socks5.ConnectReply.loads((yield _socks5_reply_size))
+
+    elif info.proxy_type == ProxyType.SOCKS4:
+        socks4_request = socks4.ConnectRequest(
+            host=host,
+            port=port,
+            user_id=info.username,
+        )
+        write(socks4_request.dumps())
+        socks4.ConnectReply.loads((yield socks4.ConnectReply.SIZE))
+
+    elif info.proxy_type == ProxyType.HTTP:
+        http_request = http.ConnectRequest(
+            host=host,
+            port=port,
+            username=info.username,
+            password=info.password,
+        )
+        write(http_request.dumps())
+        http.ConnectReply.loads((yield HTTP_REPLY_TERMINATOR))
+
+    else:  # pragma: no cover
+        raise ValueError(f"Invalid proxy type: {info.proxy_type}")
+
+
+def pipelined_steps(
+    template: HandshakeTemplate,
+    host: str,
+    port: int,
+    write: Write,
+    accepted: Callable[[], None] | None = None,
+) -> Steps:
+    """
+    SOCKS5 method selection, authentication and the CONNECT request written
+    back to back, the replies are then checked in order. Only the method
+    the requests are made for is offered, so that the server can't pick
+    another one.
+
+    host - resolved with resolve_destination()
+    accepted - (optional) called once the authentication reply shows
+        the server has read past the method selection request
+    """
+    write(
+        template.pipelined_greeting
+        + template.auth
+        + socks5.ConnectRequest(host=host, port=port).dumps()
+    )
+
+    try:
+        reply = socks5.AuthMethodReply.loads((yield socks5.AuthMethodReply.SIZE))
+        template.validate(reply, pipelined=True)
+    except ReplyError as e:
+        raise PipeliningRejected(str(e)) from e
+
+    if template.auth:
+        socks5.AuthReply.loads((yield socks5.AuthReply.SIZE))
+        if accepted is not None:
+            accepted()
+    socks5.ConnectReply.loads((yield _socks5_reply_size))
+
+
+def pipelining_timeout(rtt: float) -> float:
+    """
+    How long a proxy gets to accept pipelined requests, given the round trip
+    time to it (e.g. the time the TCP connect took)
+    """
+    return max(PIPELINING_MIN_TIMEOUT, PIPELINING_RTT_FACTOR * rtt)
+
+
+async def within_pipelining_timeout(
+    handshake: Awaitable[None],
+    accepted: asyncio.Future[None],
+    timeout: float,
+) -> None:
+    """
+    Awaits a pipelined handshake. Raises PipeliningRejected unless it's done
+    or accepted (see pipelined_steps) within timeout: a server that drops
+    the bytes sent past the method selection request waits for them
+    until its own timeout.
+    """
+    task = asyncio.ensure_future(handshake)
+    try:
+        await asyncio.wait(
+            (task, accepted), timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+        )
+        if not task.done() and not accepted.done():
+            raise PipeliningRejected(
+                f"No reply to the pipelined requests within {timeout:.3g}s"
+            )
+        await task
+    finally:
+        task.cancel()
+
+
+@contextlib.contextmanager
+def pipelining_errors() -> Iterator[None]:
+    """
+    Turns the errors of a pipelined handshake that aren't replies
+    to its requests into PipeliningRejected
+    """
+    try:
+        yield
+    except PipeliningRejected:
+        raise
+    except (
+        python_socks.ProxyError,
+        python_socks.ProxyTimeoutError,
+        python_socks.ProxyConnectionError,
+    ) as e:
+        if isinstance(e.__cause__, ReplyError):
+            raise  # e.g. authentication failure, the destination is unreachable
+        raise PipeliningRejected(str(e)) from e
+
+
+async def resolve_destination(info: ProxyInfo, host: str) -> str:
+    """
+    Resolves the destination host name locally unless the proxy does it
+    """
+    if is_ip_address(host):
+        return host
+
+    if info.proxy_type == ProxyType.SOCKS5:
+        rdns = True if info.rdns is None else info.rdns
+        if not rdns:
+            _, host = await _resolve(host, family=socket.AF_UNSPEC)
+    elif info.proxy_type == ProxyType.SOCKS4 and not info.rdns:
+        _, host = await _resolve(host, family=socket.AF_INET)
+    return host
+
+
+async def _run_steps(steps: Steps, reader: asyncio.StreamReader) -> None:
+    with handshake_errors():
+        try:
+            read = next(steps)
+            while True:
+                if isinstance(read, int):
+                    data = await reader.readexactly(read)
+                elif isinstance(read, bytes):
+                    data = await reader.readuntil(read)
+                else:
+                    data = b""
+                    while len(data) < (size := read(data)):
+                        data += await reader.readexactly(size - len(data))
+                read = steps.send(data)
+        except StopIteration:
+            return
+
+
+class Resolver:
+    """
+    Resolves the destination host names proxies don't resolve themselves,
+    IPv4 addresses first (as python-socks does)
+    """
+
+    async def resolve(
+        self,
+        host: str,
+        port: int = 0,
+        family: socket.AddressFamily = socket.AF_UNSPEC,
+    ) -> tuple[socket.AddressFamily, str]:
+        infos = await asyncio.get_running_loop().getaddrinfo(
+            host=host,
+            port=port,
+            family=family,
+            type=socket.SOCK_STREAM,
+        )
+        if not infos:  # pragma: no cover
+            raise OSError(f"Can't resolve address {host}:{port} [{family}]")
+
+        family, _, _, _, address = min(infos, key=lambda info: info[0])
+        return family, str(address[0])
+
+
+async def _resolve(host: str, family: socket.AddressFamily) -> tuple[int, str]:
+    return await Resolver().resolve(host, family=family)
+
+
+def _socks5_reply_size(data: bytes) -> int:
+    """
+    Size of a SOCKS5 CONNECT reply, as far as it can be told
+    from the bytes received so far
+    """
+    if data[:3] != _SOCKS5_SUCCEEDED:
+        return 3  # a failure reply is parsed from its first 3 bytes
+    if len(data) < 4:  # noqa: PLR2004
+        return 4
+
+    addr_type = data[3]
+    if addr_type == socks5.AddressType.DOMAIN:  # pragma: no cover
+        return 5 if len(data) < 5 else 7 + data[4]  # noqa: PLR2004
+    return _SOCKS5_REPLY_SIZES.get(addr_type, 4)
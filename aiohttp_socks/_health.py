@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+from typing import NamedTuple
+
+
+class HealthCheck(NamedTuple):
+    """
+    Circuit breaking and active probing settings for upstream proxies.
+
+    failure_threshold - consecutive connection failures (ProxyConnectionError
+        or ProxyTimeoutError) after which the upstream is ejected.
+    ejection_time - initial ejection period in seconds, doubled on every
+        subsequent ejection up to max_ejection_time.
+    probe_target - (host, port) to connect to through each upstream
+        in the background. Probing is disabled if None.
+    probe_interval - delay between background probes in seconds.
+    probe_timeout - timeout of a single probe in seconds.
+    """
+
+    failure_threshold: int = 3
+    ejection_time: float = 1.0
+    max_ejection_time: float = 60.0
+    probe_target: tuple[str, int] | None = None
+    probe_interval: float = 5.0
+    probe_timeout: float = 5.0
+
+
+class UpstreamHealth:
+    def __init__(self) -> None:
+        self.failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+
+    def is_available(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+
+    def record_failure(self, now: float, policy: HealthCheck) -> None:
+        self.failures += 1
+        if self.failures < policy.failure_threshold:
+            return
+
+        ejection_time = policy.ejection_time * 2**self.ejections
+        self.ejections += 1
+        self.ejected_until = now + min(ejection_time, policy.max_ejection_time)
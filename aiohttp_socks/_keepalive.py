@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import socket
+from typing import NamedTuple
+
+
+class TunnelKeepAlive(NamedTuple):
+    """
+    TCP keepalive options of sockets to upstream proxies, keeping connections
+    through them from going stale. Idle pooled connections are closed
+    after the keepalive_timeout of the connector (see TCPConnector)
+    or ProxyInfo.idle_timeout.
+
+    tcp_keepalive - enables TCP keepalive on the socket to the proxy server.
+    keepidle - idle time in seconds before keepalive probes are sent.
+    keepintvl - interval between keepalive probes in seconds.
+    keepcnt - number of unanswered probes after which the connection is dropped.
+    user_timeout - (Linux only) TCP_USER_TIMEOUT in seconds: how long sent data
+        may remain unacknowledged before the connection is dropped.
+
+    Unset values keep the system defaults, options not supported
+    by the platform are skipped.
+    """
+
+    tcp_keepalive: bool = True
+    keepidle: int | None = None
+    keepintvl: int | None = None
+    keepcnt: int | None = None
+    user_timeout: float | None = None
+
+    def apply(self, sock: socket.socket) -> None:
+        if self.tcp_keepalive:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            # TCP_KEEPALIVE is the macOS name of TCP_KEEPIDLE
+            keepidle = getattr(socket, "TCP_KEEPIDLE", None) or getattr(
+                socket, "TCP_KEEPALIVE", None
+            )
+            for option, value in (
+                (keepidle, self.keepidle),
+                (getattr(socket, "TCP_KEEPINTVL", None), self.keepintvl),
+                (getattr(socket, "TCP_KEEPCNT", None), self.keepcnt),
+            ):
+                if option is not None and value is not None:
+                    sock.setsockopt(socket.IPPROTO_TCP, option, value)
+
+        user_timeout = getattr(socket, "TCP_USER_TIMEOUT", None)
+        if user_timeout is not None and self.user_timeout is not None:
+            sock.setsockopt(
+                socket.IPPROTO_TCP, user_timeout, int(self.user_timeout * 1000)
+            )
@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import bisect
+from collections.abc import Iterable, Sequence
+from typing import NamedTuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Sample(NamedTuple):
+    name: str
+    labels: dict[str, str]
+    value: float
+
+
+class Metric(NamedTuple):
+    name: str
+    type: str  # "counter", "gauge" or "histogram"
+    help: str
+    samples: list[Sample]
+
+
+class _Histogram:
+    __slots__ = ("bounds", "buckets", "count", "sum")
+
+    def __init__(self, bounds: tuple[float, ...]) -> None:
+        self.bounds = bounds
+        # per bucket (non cumulative) counts, the last one is +Inf
+        self.buckets = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name: str, labels: dict[str, str]) -> Iterable[Sample]:
+        cumulative = 0
+        for bound, count in zip((*self.bounds, float("inf")), self.buckets):
+            cumulative += count
+            yield Sample(
+                f"{name}_bucket", {**labels, "le": _format_value(bound)}, cumulative
+            )
+        yield Sample(f"{name}_sum", labels, self.sum)
+        yield Sample(f"{name}_count", labels, self.count)
+
+
+class _UpstreamStats:
+    __slots__ = (
+        "active",
+        "failures",
+        "handshake",
+        "hedges_fired",
+        "hedges_won",
+        "hops",
+        "opened",
+        "queue",
+    )
+
+    def __init__(self, bounds: tuple[float, ...]) -> None:
+        self.opened = 0
+        self.active = 0
+        self.hedges_fired = 0
+        self.hedges_won = 0
+        self.failures: dict[tuple[str, str], int] = {}
+        self.handshake = _Histogram(bounds)
+        self.hops: dict[str, _Histogram] = {}
+        self.queue = _Histogram(bounds)
+
+
+class ProxyMetrics:
+    """
+    Collects proxy connection metrics of one or more connectors.
+
+    Connectors update it from the event loop they run in,
+    so no locking is done. Use collect() or export() to read the values.
+
+    buckets - upper bounds of the latency histograms in seconds.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self._buckets = tuple(sorted(buckets))
+        self._stats: dict[str, _UpstreamStats] = {}
+
+    def record_opened(self, upstream: str, handshake_time: float) -> None:
+        stats = self._get_stats(upstream)
+        stats.opened += 1
+        stats.active += 1
+        stats.handshake.observe(handshake_time)
+
+    def record_hop(self, upstream: str, hop: str, duration: float) -> None:
+        hops = self._get_stats(upstream).hops
+        histogram = hops.get(hop)
+        if histogram is None:
+            histogram = hops[hop] = _Histogram(self._buckets)
+        histogram.observe(duration)
+
+    def record_queued(self, upstream: str, queue_time: float) -> None:
+        self._get_stats(upstream).queue.observe(queue_time)
+
+    def record_closed(self, upstream: str) -> None:
+        self._get_stats(upstream).active -= 1
+
+    def record_failure(self, upstream: str, exc: BaseException) -> None:
+        error_code = getattr(exc, "error_code", None)
+        key = type(exc).__name__, "" if error_code is None else str(error_code)
+        failures = self._get_stats(upstream).failures
+        failures[key] = failures.get(key, 0) + 1
+
+    def record_hedge_fired(self, upstream: str) -> None:
+        self._get_stats(upstream).hedges_fired += 1
+
+    def record_hedge_won(self, upstream: str) -> None:
+        self._get_stats(upstream).hedges_won += 1
+
+    def collect(self) -> list[Metric]:
+        opened = Metric(
+            "aiohttp_socks_tunnels_opened_total",
+            "counter",
+            "Tunnels opened through the upstream proxy",
+            [],
+        )
+        failures = Metric(
+            "aiohttp_socks_tunnel_failures_total",
+            "counter",
+            "Failed attempts to open a tunnel through the upstream proxy",
+            [],
+        )
+        active = Metric(
+            "aiohttp_socks_active_connections",
+            "gauge",
+            "Open connections through the upstream proxy",
+            [],
+        )
+        hedges_fired = Metric(
+            "aiohttp_socks_hedges_fired_total",
+            "counter",
+            "Hedged attempts started through the upstream proxy (Failover.hedge_delay)",
+            [],
+        )
+        hedges_won = Metric(
+            "aiohttp_socks_hedges_won_total",
+            "counter",
+            "Hedged attempts through the upstream proxy that won the race",
+            [],
+        )
+        handshake = Metric(
+            "aiohttp_socks_handshake_seconds",
+            "histogram",
+            "Time to open a tunnel through the upstream proxy",
+            [],
+        )
+        hops = Metric(
+            "aiohttp_socks_hop_seconds",
+            "histogram",
+            "Time for a proxy of the upstream (chain) to get ready for CONNECT",
+            [],
+        )
+        queue = Metric(
+            "aiohttp_socks_queue_seconds",
+            "histogram",
+            "Time spent waiting for a free upstream proxy slot (limit_per_proxy)",
+            [],
+        )
+
+        for upstream, stats in self._stats.items():
+            labels = {"upstream": upstream}
+            opened.samples.append(Sample(opened.name, labels, stats.opened))
+            active.samples.append(Sample(active.name, labels, stats.active))
+            hedges_fired.samples.append(
+                Sample(hedges_fired.name, labels, stats.hedges_fired)
+            )
+            hedges_won.samples.append(Sample(hedges_won.name, labels, stats.hedges_won))
+
+            for (error, error_code), count in stats.failures.items():
+                failure_labels = {**labels, "error": error, "error_code": error_code}
+                failures.samples.append(Sample(failures.name, failure_labels, count))
+
+            handshake.samples.extend(stats.handshake.samples(handshake.name, labels))
+            for hop, histogram in stats.hops.items():
+                hop_labels = {**labels, "hop": hop}
+                hops.samples.extend(histogram.samples(hops.name, hop_labels))
+            queue.samples.extend(stats.queue.samples(queue.name, labels))
+
+        return [
+            opened,
+            failures,
+            active,
+            hedges_fired,
+            hedges_won,
+            handshake,
+            hops,
+            queue,
+        ]
+
+    def export(self, exporter: MetricsExporter) -> str:
+        return exporter.export(self.collect())
+
+    def _get_stats(self, upstream: str) -> _UpstreamStats:
+        stats = self._stats.get(upstream)
+        if stats is None:
+            stats = self._stats[upstream] = _UpstreamStats(self._buckets)
+        return stats
+
+
+class MetricsExporter:
+    """
+    Renders collected metrics
+    """
+
+    def export(self, metrics: Iterable[Metric]) -> str:
+        raise NotImplementedError
+
+
+class TextExporter(MetricsExporter):
+    """
+    Prometheus text exposition format
+    """
+
+    def export(self, metrics: Iterable[Metric]) -> str:
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for sample in metric.samples:
+                labels = ",".join(
+                    f'{key}="{_escape(value)}"' for key, value in sample.labels.items()
+                )
+                lines.append(f"{sample.name}{{{labels}}} {_format_value(sample.value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(value)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
@@ -0,0 +1,322 @@
+from __future__ import annotations
+
+import asyncio
+import bisect
+import hashlib
+import itertools
+import random
+from collections import deque
+from collections.abc import Iterable, Sequence
+from ssl import SSLContext
+from typing import TYPE_CHECKING
+
+from python_socks import ProxyType
+from python_socks.async_.asyncio.v2 import Proxy
+
+from ._handshake import HandshakeTemplate
+from ._health import UpstreamHealth
+from ._protocols import is_ip_address
+
+if TYPE_CHECKING:  # pragma: no cover
+    from aiohttp.client_proto import ResponseHandler
+
+    from ._h2 import H2Session
+    from ._warm import WarmTunnels
+    from .connector import ProxyInfo
+
+DEFAULT_LATENCY_ALPHA = 0.3
+
+
+class Upstream:
+    """
+    Runtime state of a single upstream proxy.
+
+    proxy_ssl - SSLContext for TLS to the upstream proxy, defaults to info.proxy_ssl
+    forward - proxies the upstream proxy is reached through (a proxy chain)
+    templates - the handshake template of every hop, see HandshakeTemplate
+    weight - relative share of new connections the upstream gets
+    pipelining - whether the proxy takes pipelined handshakes,
+        None until it's been tried
+    http2 - whether the proxy supports HTTP/2, None until it's been tried
+    """
+
+    def __init__(
+        self,
+        info: ProxyInfo,
+        proxy_ssl: SSLContext | None = None,
+        forward: Iterable[ProxyInfo] = (),
+        weight: float = 1.0,
+    ) -> None:
+        self.info = info
+        self.proxy_ssl = proxy_ssl if proxy_ssl is not None else info.proxy_ssl
+        self.forward = tuple(forward)
+        self.hops = (*self.forward, info)
+        self.templates = tuple(HandshakeTemplate(i) for i in self.hops)
+        self.hop_names = tuple(_upstream_name(i) for i in self.hops)
+        self.name = " -> ".join(self.hop_names)
+        self.weight = weight
+        # python-socks connects to the addresses of a host name one at a time,
+        # has no per hop timeouts and drops the bytes that come along with
+        # an HTTP CONNECT reply: the connector opens those connections itself
+        self.needs_dialer = info.proxy_type == ProxyType.HTTP or any(
+            i.timeout is not None or not is_ip_address(i.host) for i in self.hops
+        )
+        idle_timeouts = [i.idle_timeout for i in self.hops if i.idle_timeout is not None]
+        self.idle_timeout = min(idle_timeouts) if idle_timeouts else None
+        self.removed = False
+        self.connections: set[ResponseHandler] = set()
+        self.outstanding = 0
+        self.latency: float | None = None
+        self.health = UpstreamHealth()
+        self.warm_tunnels: WarmTunnels | None = None
+        self.pipelining: bool | None = None
+        self.http2: bool | None = None
+        self.h2_session: H2Session | None = None
+        self._waiters: deque[asyncio.Future[None]] = deque()
+        self._proxy: Proxy | None = None
+
+    @property
+    def proxy(self) -> Proxy:
+        """
+        python-socks Proxy of the last hop, forwarded through the others
+        """
+        # Proxy objects hold configuration only, so one chain serves
+        # every connection. It's built on first use, as Proxy takes the loop
+        if self._proxy is None:
+            last = len(self.hops) - 1
+            for index, info in enumerate(self.hops):
+                self._proxy = Proxy(
+                    proxy_type=info.proxy_type,
+                    host=info.host,
+                    port=info.port,
+                    username=info.username,
+                    password=info.password,
+                    rdns=info.rdns,
+                    proxy_ssl=self.proxy_ssl if index == last else info.proxy_ssl,
+                    forward=self._proxy,
+                )
+        assert self._proxy is not None
+        return self._proxy
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def is_full(self, limit: int) -> bool:
+        """
+        Whether acquire() would have to wait
+        """
+        return bool(limit) and (self.outstanding >= limit or bool(self._waiters))
+
+    async def acquire(self, limit: int = 0) -> bool:
+        """
+        Takes a connection slot. While `limit` slots are taken,
+        waits in FIFO order for release() to hand one over.
+        Returns True if it had to wait.
+        """
+        if not self.is_full(limit):
+            self.outstanding += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                self.release()  # the slot has already been handed over
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            raise
+
+        return True
+
+    def release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)  # the slot goes to the waiter as is
+                return
+
+        self.outstanding -= 1
+
+    def record_latency(self, value: float, alpha: float = DEFAULT_LATENCY_ALPHA) -> None:
+        if self.latency is None:
+            self.latency = value
+        else:
+            self.latency += alpha * (value - self.latency)
+
+    def __repr__(self) -> str:
+        return f"<Upstream {self.name} outstanding={self.outstanding}>"
+
+
+class SelectionStrategy:
+    """
+    Picks an upstream proxy for a new connection.
+    key is the affinity key of the connection (the destination host
+    unless set per request), it's ignored by non-sticky strategies.
+    """
+
+    sticky = False
+
+    def select(
+        self,
+        upstreams: Sequence[Upstream],
+        key: str | None = None,
+    ) -> Upstream:
+        raise NotImplementedError
+
+
+class RoundRobinStrategy(SelectionStrategy):
+    def __init__(self) -> None:
+        self._counter = itertools.count()
+        self._current: dict[Upstream, float] = {}
+
+    def select(
+        self,
+        upstreams: Sequence[Upstream],
+        key: str | None = None,  # noqa: ARG002
+    ) -> Upstream:
+        weight = upstreams[0].weight
+        if all(u.weight == weight for u in upstreams):
+            return upstreams[next(self._counter) % len(upstreams)]
+
+        # smooth weighted round robin, as in nginx
+        current = self._current
+        if len(current) > 2 * len(upstreams):
+            # forget removed upstreams
+            self._current = current = {u: current.get(u, 0.0) for u in upstreams}
+
+        total = 0.0
+        best = upstreams[0]
+        for upstream in upstreams:
+            current[upstream] = current.get(upstream, 0.0) + upstream.weight
+            total += upstream.weight
+            if current[upstream] > current[best]:
+                best = upstream
+
+        current[best] -= total
+        return best
+
+
+class RandomStrategy(SelectionStrategy):
+    def select(
+        self,
+        upstreams: Sequence[Upstream],
+        key: str | None = None,  # noqa: ARG002
+    ) -> Upstream:
+        weights = [u.weight for u in upstreams]
+        return random.choices(upstreams, weights=weights)[0]  # noqa: S311
+
+
+class LeastConnectionsStrategy(SelectionStrategy):
+    def __init__(self) -> None:
+        self._counter = itertools.count()
+
+    def select(
+        self,
+        upstreams: Sequence[Upstream],
+        key: str | None = None,  # noqa: ARG002
+    ) -> Upstream:
+        # rotate the starting point so that ties are spread evenly
+        offset = next(self._counter) % len(upstreams)
+        rotated = itertools.chain(upstreams[offset:], upstreams[:offset])
+        return min(rotated, key=lambda u: u.outstanding / u.weight)
+
+
+class LatencyWeightedStrategy(SelectionStrategy):
+    """
+    Picks upstreams at random, weighted by Upstream.weight over their
+    smoothed connection latency. Upstreams without samples yet
+    get the latency of the fastest known one so that they are explored.
+    """
+
+    def select(
+        self,
+        upstreams: Sequence[Upstream],
+        key: str | None = None,  # noqa: ARG002
+    ) -> Upstream:
+        known = [u.latency for u in upstreams if u.latency is not None]
+        best = min(known) if known else 1.0
+        weights = [
+            u.weight / max(u.latency if u.latency is not None else best, 1e-6)
+            for u in upstreams
+        ]
+        return random.choices(upstreams, weights=weights)[0]  # noqa: S311
+
+
+class ConsistentHashStrategy(SelectionStrategy):
+    """
+    Maps the affinity key to an upstream on a hash ring, so that requests
+    with the same key leave from the same upstream and adding or removing
+    upstreams only remaps the keys of the affected ones.
+
+    replicas - number of points per upstream on the ring
+        (scaled by Upstream.weight).
+    """
+
+    sticky = True
+
+    def __init__(self, replicas: int = 100) -> None:
+        self._replicas = replicas
+        self._upstreams: tuple[tuple[Upstream, float], ...] = ()
+        self._points: list[int] = []
+        self._owners: list[Upstream] = []
+        self._fallback = RoundRobinStrategy()
+
+    def select(
+        self,
+        upstreams: Sequence[Upstream],
+        key: str | None = None,
+    ) -> Upstream:
+        if key is None:
+            return self._fallback.select(upstreams)
+
+        if tuple((u, u.weight) for u in upstreams) != self._upstreams:
+            self._build(upstreams)
+
+        index = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[index]
+
+    def _build(self, upstreams: Sequence[Upstream]) -> None:
+        ring = [
+            (_hash(f"{upstream.name}#{i}"), upstream)
+            for upstream in upstreams
+            for i in range(max(1, round(self._replicas * upstream.weight)))
+        ]
+        ring.sort(key=lambda point: point[0])
+        self._upstreams = tuple((u, u.weight) for u in upstreams)
+        self._points = [point for point, _ in ring]
+        self._owners = [upstream for _, upstream in ring]
+
+
+STRATEGIES: dict[str, type[SelectionStrategy]] = {
+    "round_robin": RoundRobinStrategy,
+    "random": RandomStrategy,
+    "least_connections": LeastConnectionsStrategy,
+    "latency": LatencyWeightedStrategy,
+    "consistent_hash": ConsistentHashStrategy,
+}
+
+
+def create_strategy(strategy: str | SelectionStrategy) -> SelectionStrategy:
+    if isinstance(strategy, SelectionStrategy):
+        return strategy
+
+    try:
+        strategy_cls = STRATEGIES[strategy]
+    except KeyError:
+        raise ValueError(f"Invalid selection strategy: {strategy}") from None
+
+    return strategy_cls()
+
+
+def _hash(value: str) -> int:
+    # stable across processes, unlike hash()
+    digest = hashlib.blake2b(value.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def _upstream_name(info: ProxyInfo) -> str:
+    host = f"[{info.host}]" if ":" in info.host else info.host
+    return f"{info.proxy_type.name.lower()}://{host}:{info.port}"
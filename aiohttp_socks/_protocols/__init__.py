@@ -0,0 +1,29 @@
+"""
+Encoders and decoders of the SOCKS4, SOCKS5 and HTTP CONNECT handshakes
+the connectors run themselves (see Dialer). Adapted from python-socks,
+whose Proxy objects run the handshakes otherwise.
+"""
+
+from __future__ import annotations
+
+import ipaddress
+
+
+def is_ipv4_address(host: str) -> bool:
+    try:
+        ipaddress.IPv4Address(host)
+    except ValueError:
+        return False
+    return True
+
+
+def is_ipv6_address(host: str) -> bool:
+    try:
+        ipaddress.IPv6Address(host)
+    except ValueError:
+        return False
+    return True
+
+
+def is_ip_address(host: str) -> bool:
+    return is_ipv4_address(host) or is_ipv6_address(host)
@@ -0,0 +1,14 @@
+from __future__ import annotations
+
+from typing import Any
+
+
+class ReplyError(Exception):
+    """
+    The proxy server refused the request or replied with something
+    that isn't a valid reply to it
+    """
+
+    def __init__(self, message: Any, error_code: int | None = None) -> None:
+        super().__init__(message)
+        self.error_code = error_code
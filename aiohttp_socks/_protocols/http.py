@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import base64
+import sys
+from dataclasses import dataclass
+
+from . import is_ipv6_address
+from .errors import ReplyError
+
+DEFAULT_USER_AGENT = f"Python/{sys.version_info[0]}.{sys.version_info[1]} aiohttp-socks"
+CRLF = "\r\n"
+
+
+def basic_auth(username: str, password: str) -> str:
+    """
+    Value of a Proxy-Authorization header with the credentials
+    """
+    if ":" in username:
+        raise ValueError('A ":" is not allowed in username (RFC 1945#section-11.1)')
+    credentials = f"{username}:{password}".encode("latin1")
+    return f"Basic {base64.b64encode(credentials).decode('ascii')}"
+
+
+def authority(host: str, port: int) -> str:
+    """
+    host:port, an IPv6 address is enclosed in square brackets
+    (RFC 3986 § 3.2.2), so that the port can't be taken for a part of it
+    """
+    return f"[{host}]:{port}" if is_ipv6_address(host) else f"{host}:{port}"
+
+
+@dataclass
+class ConnectRequest:
+    host: str
+    port: int
+    username: str | None
+    password: str | None
+
+    def dumps(self) -> bytes:
+        target = authority(self.host, self.port)
+        lines = [
+            f"CONNECT {target} HTTP/1.1",
+            f"Host: {target}",
+            f"User-Agent: {DEFAULT_USER_AGENT}",
+        ]
+        if self.username and self.password:
+            auth = basic_auth(self.username, self.password)
+            lines.append(f"Proxy-Authorization: {auth}")
+        return (CRLF.join(lines) + CRLF * 2).encode()
+
+
+@dataclass
+class ConnectReply:
+    status_code: int
+    message: str
+
+    @classmethod
+    def loads(cls, data: bytes) -> ConnectReply:
+        if not data:
+            raise ReplyError("Invalid proxy response")
+
+        line = data.split(CRLF.encode(), 1)[0].decode("utf-8", "surrogateescape")
+        try:
+            _version, code, *reason = line.split()
+        except ValueError as e:
+            raise ReplyError(f"Invalid status line: {line}") from e
+
+        try:
+            status_code = int(code)
+        except ValueError as e:
+            raise ReplyError(f"Invalid status code: {code}") from e
+
+        message = " ".join(reason)
+        if status_code != 200:  # noqa: PLR2004
+            raise ReplyError(f"{status_code} {message}", error_code=status_code)
+        return cls(status_code=status_code, message=message)
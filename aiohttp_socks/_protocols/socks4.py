@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import enum
+import ipaddress
+from dataclasses import dataclass
+
+from . import is_ipv4_address
+from .errors import ReplyError
+
+RSV = NULL = 0x00
+SOCKS_VER = 0x04
+CONNECT = 0x01
+
+
+class ReplyCode(enum.IntEnum):
+    REQUEST_GRANTED = 0x5A
+    REQUEST_REJECTED_OR_FAILED = 0x5B
+    CONNECTION_FAILED = 0x5C
+    AUTHENTICATION_FAILED = 0x5D
+
+
+REPLY_MESSAGES = {
+    ReplyCode.REQUEST_GRANTED: "Request granted",
+    ReplyCode.REQUEST_REJECTED_OR_FAILED: "Request rejected or failed",
+    ReplyCode.CONNECTION_FAILED: (
+        "Request rejected because SOCKS server cannot connect to identd on the client"
+    ),
+    ReplyCode.AUTHENTICATION_FAILED: (
+        "Request rejected because the client program and identd report "
+        "different user-ids"
+    ),
+}
+
+
+@dataclass
+class ConnectRequest:
+    """
+    host - IPv4 address, a host name is passed on as in SOCKS4a
+    """
+
+    host: str
+    port: int
+    user_id: str | None
+
+    def dumps(self) -> bytes:
+        if is_ipv4_address(self.host):
+            address = ipaddress.IPv4Address(self.host).packed
+            hostname = b""
+        else:
+            address = bytes((NULL, NULL, NULL, 1))
+            hostname = self.host.encode("idna") + bytes((NULL,))
+
+        user_id = self.user_id.encode("ascii") if self.user_id else b""
+        return (
+            bytes((SOCKS_VER, CONNECT))
+            + self.port.to_bytes(2, "big")
+            + address
+            + user_id
+            + bytes((NULL,))
+            + hostname
+        )
+
+
+@dataclass
+class ConnectReply:
+    SIZE = 8
+
+    reply: ReplyCode
+
+    @classmethod
+    def loads(cls, data: bytes) -> ConnectReply:
+        if len(data) != cls.SIZE:
+            raise ReplyError("Malformed connect reply")
+        if data[0] != RSV:
+            raise ReplyError(f"Unexpected reply version: {data[0]:#02X}")
+
+        try:
+            reply = ReplyCode(data[1])
+        except ValueError as e:
+            raise ReplyError(f"Invalid reply code: {data[1]:#02X}") from e
+
+        if reply != ReplyCode.REQUEST_GRANTED:
+            raise ReplyError(REPLY_MESSAGES[reply], error_code=reply)
+        return cls(reply=reply)
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import enum
+import ipaddress
+from dataclasses import dataclass, field
+
+from . import is_ip_address
+from .errors import ReplyError
+
+RSV = AUTH_GRANTED = 0x00
+SOCKS_VER = 0x05
+AUTH_VER = 0x01
+CONNECT = 0x01
+
+
+class AuthMethod(enum.IntEnum):
+    ANONYMOUS = 0x00
+    GSSAPI = 0x01
+    USERNAME_PASSWORD = 0x02
+    NO_ACCEPTABLE = 0xFF
+
+
+class AddressType(enum.IntEnum):
+    IPV4 = 0x01
+    DOMAIN = 0x03
+    IPV6 = 0x04
+
+
+class ReplyCode(enum.IntEnum):
+    SUCCEEDED = 0x00
+    GENERAL_FAILURE = 0x01
+    CONNECTION_NOT_ALLOWED = 0x02
+    NETWORK_UNREACHABLE = 0x03
+    HOST_UNREACHABLE = 0x04
+    CONNECTION_REFUSED = 0x05
+    TTL_EXPIRED = 0x06
+    COMMAND_NOT_SUPPORTED = 0x07
+    ADDRESS_TYPE_NOT_SUPPORTED = 0x08
+
+
+REPLY_MESSAGES = {
+    ReplyCode.SUCCEEDED: "Request granted",
+    ReplyCode.GENERAL_FAILURE: "General SOCKS server failure",
+    ReplyCode.CONNECTION_NOT_ALLOWED: "Connection not allowed by ruleset",
+    ReplyCode.NETWORK_UNREACHABLE: "Network unreachable",
+    ReplyCode.HOST_UNREACHABLE: "Host unreachable",
+    ReplyCode.CONNECTION_REFUSED: "Connection refused by destination host",
+    ReplyCode.TTL_EXPIRED: "TTL expired",
+    ReplyCode.COMMAND_NOT_SUPPORTED: "Command not supported or protocol error",
+    ReplyCode.ADDRESS_TYPE_NOT_SUPPORTED: "Address type not supported",
+}
+
+
+@dataclass
+class AuthMethodsRequest:
+    username: str | None
+    password: str | None
+    methods: bytearray = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.methods = bytearray((AuthMethod.ANONYMOUS,))
+        if self.username and self.password:
+            self.methods.append(AuthMethod.USERNAME_PASSWORD)
+
+    def dumps(self) -> bytes:
+        return bytes((SOCKS_VER, len(self.methods))) + self.methods
+
+
+@dataclass
+class AuthMethodReply:
+    SIZE = 2
+
+    method: AuthMethod
+
+    def validate(self, request: AuthMethodsRequest) -> None:
+        if self.method not in request.methods:
+            raise ReplyError(f"Unexpected SOCKS authentication method: {self.method}")
+
+    @classmethod
+    def loads(cls, data: bytes) -> AuthMethodReply:
+        if len(data) != cls.SIZE:
+            raise ReplyError("Malformed authentication method reply")
+        if data[0] != SOCKS_VER:
+            raise ReplyError(f"Unexpected SOCKS version number: {data[0]}")
+
+        try:
+            method = AuthMethod(data[1])
+        except ValueError as e:
+            raise ReplyError(f"Invalid authentication method: {data[1]:#02X}") from e
+
+        if method == AuthMethod.NO_ACCEPTABLE:
+            raise ReplyError("No acceptable authentication methods were offered")
+        return cls(method=method)
+
+
+@dataclass
+class AuthRequest:
+    username: str
+    password: str
+
+    def dumps(self) -> bytes:
+        username = self.username.encode("ascii")
+        password = self.password.encode("ascii")
+        return (
+            bytes((AUTH_VER, len(username)))
+            + username
+            + bytes((len(password),))
+            + password
+        )
+
+
+@dataclass
+class AuthReply:
+    SIZE = 2
+
+    @classmethod
+    def loads(cls, data: bytes) -> AuthReply:
+        if len(data) != cls.SIZE:
+            raise ReplyError("Malformed auth reply")
+        if data[0] != AUTH_VER:
+            raise ReplyError("Invalid authentication response")
+        if data[1] != AUTH_GRANTED:
+            raise ReplyError("Username and password authentication failure")
+        return cls()
+
+
+@dataclass
+class ConnectRequest:
+    host: str  # host name or IPv4 or IPv6 address
+    port: int
+
+    def dumps(self) -> bytes:
+        port = self.port.to_bytes(2, "big")
+        if is_ip_address(self.host):
+            ip = ipaddress.ip_address(self.host)
+            address_type = AddressType.IPV4 if ip.version == 4 else AddressType.IPV6  # noqa: PLR2004
+            address = bytes((address_type,)) + ip.packed
+        else:
+            host = self.host.encode("idna")
+            address = bytes((AddressType.DOMAIN, len(host))) + host
+        return bytes((SOCKS_VER, CONNECT, RSV)) + address + port
+
+
+@dataclass
+class ConnectReply:
+    """
+    Only the status is checked, the bound address isn't of any use
+    for CONNECT requests
+    """
+
+    reply: ReplyCode
+
+    @classmethod
+    def loads(cls, data: bytes) -> ConnectReply:
+        if len(data) < 3:  # noqa: PLR2004
+            raise ReplyError("Malformed connect reply")
+        if data[0] != SOCKS_VER:
+            raise ReplyError(f"Unexpected SOCKS version number: {data[0]:#02X}")
+
+        try:
+            reply = ReplyCode(data[1])
+        except ValueError as e:
+            raise ReplyError(f"Invalid reply code: {data[1]:#02X}") from e
+
+        if reply != ReplyCode.SUCCEEDED:
+            raise ReplyError(REPLY_MESSAGES[reply], error_code=reply)
+        if data[2] != RSV:
+            raise ReplyError(f"The reserved byte must be {RSV:#02X}")
+        return cls(reply=reply)
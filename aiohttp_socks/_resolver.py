@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import asyncio
+import socket
+from typing import NamedTuple
+
+from aiohttp import DefaultResolver
+from aiohttp.abc import AbstractResolver, ResolveResult
+
+_Key = tuple[str, int, socket.AddressFamily]
+
+
+class _Entry(NamedTuple):
+    results: list[ResolveResult]
+    expires: float
+    stale_until: float
+
+
+class CachingResolver(AbstractResolver):
+    """
+    Caches the results of another resolver (DefaultResolver by default).
+
+    ttl - seconds a result is used without asking the resolver again,
+        None keeps results forever.
+    stale_ttl - seconds after ttl during which an expired result is still
+        returned while a fresh one is resolved in the background.
+    """
+
+    def __init__(
+        self,
+        resolver: AbstractResolver | None = None,
+        ttl: float | None = 10.0,
+        stale_ttl: float = 60.0,
+    ) -> None:
+        self._resolver = resolver
+        self._resolver_owner = resolver is None
+        self._ttl = ttl
+        self._stale_ttl = stale_ttl
+        self._cache: dict[_Key, _Entry] = {}
+        self._lookups: dict[_Key, asyncio.Task[list[ResolveResult]]] = {}
+
+    async def resolve(
+        self,
+        host: str,
+        port: int = 0,
+        family: socket.AddressFamily = socket.AF_INET,
+    ) -> list[ResolveResult]:
+        key = host, port, family
+        entry = self._cache.get(key)
+        if entry is not None:
+            now = asyncio.get_running_loop().time()
+            if now < entry.expires:
+                return entry.results
+            if now < entry.stale_until:
+                self._lookup(key)  # revalidate in the background
+                return entry.results
+
+        # concurrent lookups of the same name share a single query
+        return await asyncio.shield(self._lookup(key))
+
+    def clear(self, host: str | None = None, port: int | None = None) -> None:
+        if host is None and port is None:
+            self._cache.clear()
+            return
+
+        for key in list(self._cache):
+            if host in (None, key[0]) and port in (None, key[1]):
+                del self._cache[key]
+
+    async def close(self) -> None:
+        for task in self._lookups.values():
+            task.cancel()
+        self._lookups.clear()
+        self._cache.clear()
+
+        if self._resolver is not None and self._resolver_owner:
+            await self._resolver.close()
+
+    def _lookup(self, key: _Key) -> asyncio.Task[list[ResolveResult]]:
+        task = self._lookups.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._resolve(key))
+            self._lookups[key] = task
+            task.add_done_callback(lambda t: self._lookup_done(key, t))
+        return task
+
+    def _lookup_done(
+        self,
+        key: _Key,
+        task: asyncio.Task[list[ResolveResult]],
+    ) -> None:
+        if self._lookups.get(key) is task:
+            del self._lookups[key]
+        if not task.cancelled():
+            task.exception()  # failed revalidations keep the stale result
+
+    async def _resolve(self, key: _Key) -> list[ResolveResult]:
+        if self._resolver is None:
+            self._resolver = DefaultResolver()
+
+        host, port, family = key
+        results = await self._resolver.resolve(host, port, family=family)
+
+        now = asyncio.get_running_loop().time()
+        if self._ttl is None:
+            expires = stale_until = float("inf")
+        else:
+            expires = now + self._ttl
+            stale_until = expires + self._stale_ttl
+
+        self._cache[key] = _Entry(results, expires=expires, stale_until=stale_until)
+        return results
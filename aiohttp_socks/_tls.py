@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import ssl
+import sys
+from collections import OrderedDict
+from collections.abc import Hashable, Iterator
+from typing import Any
+
+_session: contextvars.ContextVar[ssl.SSLSession | None] = contextvars.ContextVar(
+    "aiohttp_socks_tls_session", default=None
+)
+
+
+class _ResumingSSLContext(ssl.SSLContext):
+    """
+    asyncio has no way to pass a session to start_tls(),
+    so the session to resume is taken from a context variable
+    (connection_made(), where wrap_bio() is called, is scheduled
+    with the context of the start_tls() caller)
+    """
+
+    def wrap_bio(  # type: ignore[override]
+        self,
+        incoming: ssl.MemoryBIO,
+        outgoing: ssl.MemoryBIO,
+        server_side: bool = False,  # noqa: FBT001, FBT002
+        server_hostname: str | None = None,
+        session: ssl.SSLSession | None = None,
+    ) -> ssl.SSLObject:
+        if session is None:
+            session = _session.get()
+        return super().wrap_bio(
+            incoming,
+            outgoing,
+            server_side=server_side,
+            server_hostname=server_hostname,
+            session=session,
+        )
+
+
+class TLSSessionCache:
+    """
+    Keeps TLS sessions to resume, per upstream proxy and TLS server
+    (the destination or an HTTPS proxy), so that reconnects take
+    an abbreviated handshake.
+
+    Sessions are only resumed with SSLContexts made for it: the default ones
+    of the connectors and those created with create_default_context().
+    Other contexts are used as they are, without resumption.
+
+    maxsize - maximum number of cached sessions, least recently used ones
+        are evicted.
+    """
+
+    def __init__(self, maxsize: int = 1024) -> None:
+        self._maxsize = maxsize
+        # the SSLObject of the last connection, as TLS 1.3 session tickets
+        # arrive after the handshake
+        self._entries: OrderedDict[Hashable, tuple[ssl.SSLContext, ssl.SSLObject]] = (
+            OrderedDict()
+        )
+        self.handshakes = 0
+        self.resumed = 0
+
+    @staticmethod
+    def create_default_context(
+        cafile: str | None = None,
+        capath: str | None = None,
+        cadata: str | bytes | None = None,
+    ) -> ssl.SSLContext:
+        """
+        ssl.create_default_context() for clients, with sessions
+        resumed by the cache
+        """
+        ssl_context = _ResumingSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        if cafile or capath or cadata:
+            ssl_context.load_verify_locations(cafile, capath, cadata)
+        else:
+            ssl_context.load_default_certs(ssl.Purpose.SERVER_AUTH)
+        if sys.version_info >= (3, 13):  # as ssl.create_default_context()
+            ssl_context.verify_flags |= (
+                ssl.VERIFY_X509_PARTIAL_CHAIN | ssl.VERIFY_X509_STRICT
+            )
+        return ssl_context
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    @contextlib.contextmanager
+    def resume(self, key: Hashable, ssl_context: ssl.SSLContext) -> Iterator[None]:
+        """
+        Wraps start_tls() to resume the session cached under the key
+        """
+        if not isinstance(ssl_context, _ResumingSSLContext):
+            yield
+            return
+
+        session = None
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] is ssl_context:
+            self._entries.move_to_end(key)
+            session = entry[1].session
+
+        token = _session.set(session)
+        try:
+            yield
+        finally:
+            _session.reset(token)
+
+    def store(self, key: Hashable, ssl_context: ssl.SSLContext, ssl_object: Any) -> None:
+        if not isinstance(ssl_context, _ResumingSSLContext) or not isinstance(
+            ssl_object, ssl.SSLObject
+        ):
+            return
+
+        self.handshakes += 1
+        if ssl_object.session_reused:
+            self.resumed += 1
+
+        self._entries[key] = ssl_context, ssl_object
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import dataclasses
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any
+
+from aiohttp import TraceConfig
+from aiosignal import Signal
+
+if TYPE_CHECKING:  # pragma: no cover
+    from typing import TypeVar
+
+    from aiohttp import ClientRequest, ClientSession
+
+    _ParamT_contra = TypeVar("_ParamT_contra", contravariant=True)
+    _TracingSignal = Signal[ClientSession, SimpleNamespace, _ParamT_contra]
+
+
+@dataclasses.dataclass(frozen=True)
+class TraceProxyConnectStartParams:
+    proxy: str
+    host: str
+    port: int
+
+
+@dataclasses.dataclass(frozen=True)
+class TraceProxyConnectEndParams:
+    proxy: str
+    host: str
+    port: int
+    duration: float
+
+
+@dataclasses.dataclass(frozen=True)
+class TraceProxyHopEndParams:
+    proxy: str
+    hop: str
+    host: str
+    port: int
+    duration: float
+
+
+@dataclasses.dataclass(frozen=True)
+class TraceProxyHandshakeEndParams:
+    proxy: str
+    host: str
+    port: int
+    duration: float
+
+
+@dataclasses.dataclass(frozen=True)
+class TraceDestTlsEndParams:
+    proxy: str
+    host: str
+    port: int
+    duration: float
+
+
+class ProxyTraceConfig(TraceConfig):
+    """
+    TraceConfig with signals for the phases of connecting through a proxy.
+
+    on_proxy_connect_start - before the TCP connection to the proxy server
+        (not sent when a warm pool connection is used).
+    on_proxy_connect_end - the TCP connection to the proxy server is established.
+    on_proxy_hop_end - a proxy of the chain (hop, also sent for single proxies)
+        is ready to take the CONNECT request: TLS and authentication for the
+        first one, the CONNECT request through the previous one, TLS
+        and authentication for the others (not sent for warm pool connections).
+    on_proxy_handshake_end - the proxy has connected to the destination
+        (TLS to the proxy, authentication and CONNECT request,
+        only the latter for warm pool connections).
+    on_dest_tls_end - the TLS handshake with the destination is done.
+
+    proxy is the name of the upstream proxy (see Upstream.name),
+    host and port are the destination, duration is the duration of the phase.
+    """
+
+    def __init__(
+        self,
+        trace_config_ctx_factory: type[SimpleNamespace] = SimpleNamespace,
+    ) -> None:
+        super().__init__(trace_config_ctx_factory)
+        self._on_proxy_connect_start: _TracingSignal[TraceProxyConnectStartParams] = (
+            Signal(self)
+        )
+        self._on_proxy_connect_end: _TracingSignal[TraceProxyConnectEndParams] = Signal(
+            self
+        )
+        self._on_proxy_hop_end: _TracingSignal[TraceProxyHopEndParams] = Signal(self)
+        self._on_proxy_handshake_end: _TracingSignal[TraceProxyHandshakeEndParams] = (
+            Signal(self)
+        )
+        self._on_dest_tls_end: _TracingSignal[TraceDestTlsEndParams] = Signal(self)
+
+    def freeze(self) -> None:
+        super().freeze()
+        self._on_proxy_connect_start.freeze()
+        self._on_proxy_connect_end.freeze()
+        self._on_proxy_hop_end.freeze()
+        self._on_proxy_handshake_end.freeze()
+        self._on_dest_tls_end.freeze()
+
+    @property
+    def on_proxy_connect_start(self) -> _TracingSignal[TraceProxyConnectStartParams]:
+        return self._on_proxy_connect_start
+
+    @property
+    def on_proxy_connect_end(self) -> _TracingSignal[TraceProxyConnectEndParams]:
+        return self._on_proxy_connect_end
+
+    @property
+    def on_proxy_hop_end(self) -> _TracingSignal[TraceProxyHopEndParams]:
+        return self._on_proxy_hop_end
+
+    @property
+    def on_proxy_handshake_end(self) -> _TracingSignal[TraceProxyHandshakeEndParams]:
+        return self._on_proxy_handshake_end
+
+    @property
+    def on_dest_tls_end(self) -> _TracingSignal[TraceDestTlsEndParams]:
+        return self._on_dest_tls_end
+
+
+class ProxyTrace:
+    """
+    Sends the proxy signals of a single ProxyTraceConfig of a request
+    """
+
+    __slots__ = ("_ctx", "_session", "_trace_config")
+
+    def __init__(
+        self,
+        session: ClientSession,
+        trace_config: ProxyTraceConfig,
+        ctx: SimpleNamespace,
+    ) -> None:
+        self._session = session
+        self._trace_config = trace_config
+        self._ctx = ctx
+
+    @classmethod
+    def from_request(cls, req: ClientRequest) -> list[ProxyTrace]:
+        traces: list[Any] = req._traces  # noqa: SLF001
+        return [
+            cls(t._session, t._trace_config, t._trace_config_ctx)  # noqa: SLF001
+            for t in traces
+            if isinstance(t._trace_config, ProxyTraceConfig)  # noqa: SLF001
+        ]
+
+    async def send_proxy_connect_start(self, proxy: str, host: str, port: int) -> None:
+        await self._trace_config.on_proxy_connect_start.send(
+            self._session,
+            self._ctx,
+            TraceProxyConnectStartParams(proxy, host, port),
+        )
+
+    async def send_proxy_connect_end(
+        self,
+        proxy: str,
+        host: str,
+        port: int,
+        duration: float,
+    ) -> None:
+        await self._trace_config.on_proxy_connect_end.send(
+            self._session,
+            self._ctx,
+            TraceProxyConnectEndParams(proxy, host, port, duration),
+        )
+
+    async def send_proxy_hop_end(
+        self,
+        proxy: str,
+        hop: str,
+        host: str,
+        port: int,
+        duration: float,
+    ) -> None:
+        await self._trace_config.on_proxy_hop_end.send(
+            self._session,
+            self._ctx,
+            TraceProxyHopEndParams(proxy, hop, host, port, duration),
+        )
+
+    async def send_proxy_handshake_end(
+        self,
+        proxy: str,
+        host: str,
+        port: int,
+        duration: float,
+    ) -> None:
+        await self._trace_config.on_proxy_handshake_end.send(
+            self._session,
+            self._ctx,
+            TraceProxyHandshakeEndParams(proxy, host, port, duration),
+        )
+
+    async def send_dest_tls_end(
+        self,
+        proxy: str,
+        host: str,
+        port: int,
+        duration: float,
+    ) -> None:
+        await self._trace_config.on_dest_tls_end.send(
+            self._session,
+            self._ctx,
+            TraceDestTlsEndParams(proxy, host, port, duration),
+        )
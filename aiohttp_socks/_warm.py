@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from typing import TYPE_CHECKING, NamedTuple
+
+import python_socks
+
+if TYPE_CHECKING:  # pragma: no cover
+    from ._dialer import Dialer, HopCallback
+    from ._handshake import Stream
+    from ._pool import Upstream
+
+
+class WarmPool(NamedTuple):
+    """
+    Pre-established proxy connection settings.
+
+    size - number of ready connections kept per upstream proxy,
+        they don't count towards limit_per_proxy.
+    idle_timeout - ready connections idle for longer are discarded,
+        it should be lower than the idle timeout of the proxy server.
+    timeout - timeout of establishing a single ready connection.
+    """
+
+    size: int = 4
+    idle_timeout: float = 30.0
+    timeout: float = 10.0
+
+
+class WarmTunnels:
+    """
+    Connections to one upstream proxy which went through everything
+    that does not depend on the destination: TCP connect, TLS to the proxy
+    and, for SOCKS5, method selection and authentication.
+    Only the CONNECT request (and TLS to the destination) is left to do.
+    For proxy chains the tunnel through the forward proxies is built as well.
+
+    on_hop - (optional) called for each hop, see Dialer.prepare().
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        dialer: Dialer,
+        upstream: Upstream,
+        config: WarmPool,
+        on_hop: HopCallback | None = None,
+    ) -> None:
+        self._loop = loop
+        self._dialer = dialer
+        self._upstream = upstream
+        self._config = config
+        self._on_hop = on_hop
+        self._ready: deque[tuple[Stream, float]] = deque()
+        self._pending: set[asyncio.Task[None]] = set()
+
+    @property
+    def ready(self) -> int:
+        return len(self._ready)
+
+    def acquire(self) -> Stream | None:
+        deadline = self._loop.time() - self._config.idle_timeout
+
+        stream = None
+        while self._ready:
+            (reader, writer), created = self._ready.popleft()
+            if created >= deadline and not reader.at_eof() and not writer.is_closing():
+                stream = reader, writer
+                break
+            writer.transport.abort()
+
+        self.fill()
+        return stream
+
+    def fill(self) -> None:
+        missing = self._config.size - len(self._ready) - len(self._pending)
+        for _ in range(missing):
+            task = self._loop.create_task(self._open())
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+
+    async def _open(self) -> None:
+        try:
+            stream = await asyncio.wait_for(
+                self._dialer.open_upstream(self._upstream, on_hop=self._on_hop),
+                timeout=self._config.timeout,
+            )
+        except Exception:  # noqa: BLE001
+            return  # the request path will report the problem
+
+        self._ready.append((stream, self._loop.time()))
+
+    async def connect(self, stream: Stream, host: str, port: int) -> Stream | None:
+        """
+        Sends the CONNECT request over a ready connection.
+        Returns None if the proxy has already closed it.
+        """
+        try:
+            return await self._dialer.request(
+                stream,
+                self._upstream,
+                host=host,
+                port=port,
+            )
+        except python_socks.ProxyError as e:
+            cause = e.__cause__
+            if isinstance(cause, asyncio.IncompleteReadError) and not cause.partial:
+                return None
+            raise
+        except ConnectionError:
+            return None
+
+    def close(self) -> None:
+        for task in self._pending:
+            task.cancel()
+
+        while self._ready:
+            (_, writer), _ = self._ready.popleft()
+            writer.transport.abort()
@@ -1,23 +1,48 @@
 from __future__ import annotations
 
 import asyncio
+import functools
 import socket
-from collections.abc import Iterable
+import threading
+from collections.abc import Iterable, Mapping, Sequence
 from ssl import SSLContext
 from typing import TYPE_CHECKING, Any, NamedTuple
 
-from aiohttp import ClientConnectorError, TCPConnector
+from aiohttp import ClientConnectorError, DefaultResolver, TCPConnector
 from aiohttp.abc import AbstractResolver, ResolveResult
 from aiohttp.client_proto import ResponseHandler
+from multidict import CIMultiDict
 
 if TYPE_CHECKING:  # pragma: no cover
     from aiohttp import AddrInfoType, ClientRequest, ClientTimeout
+    from aiohttp.connector import Connection, ConnectionKey
+    from aiohttp.tracing import Trace
 
+    from ._dialer import HopCallback, SocketFactory, SocketOption
+    from ._handshake import HandshakeProtocol, Tunnel, TunnelWriter
+    from ._providers import UpstreamProvider
+
+import aiohappyeyeballs
 import python_socks
 from python_socks import ProxyType, parse_proxy_url
-from python_socks.async_.asyncio.v2 import Proxy
 
+from ._addresses import LocalAddressPool
+from ._dialer import Dialer, configure_sockets
 from ._errors import ProxyConnectionError, ProxyError, ProxyTimeoutError
+from ._failover import Failover
+from ._h2 import ALPN_PROTOCOLS, H2Session, HTTP2Unsupported, require_h2
+from ._handshake import PipeliningRejected, ProxyStream, handshake_errors
+from ._health import HealthCheck
+from ._keepalive import TunnelKeepAlive
+from ._metrics import ProxyMetrics
+from ._pool import SelectionStrategy, Upstream, create_strategy
+from ._resolver import CachingResolver
+from ._tls import TLSSessionCache
+from ._tracing import ProxyTrace
+from ._warm import WarmPool, WarmTunnels
+
+DEFAULT_TIMEOUT = 60
+DEFAULT_TTL_DNS_CACHE = 10
 
 
 class NoResolver(AbstractResolver):
@@ -44,25 +69,266 @@ class NoResolver(AbstractResolver):
 
 class _ResponseHandler(ResponseHandler):
     """
-    To fix issue https://github.com/romis2012/aiohttp-socks/issues/27
-    In Python>=3.11.5 we need to keep a reference to the StreamWriter
-    so that the underlying transport is not closed during garbage collection.
-    See StreamWriter.__del__ method (was added in Python 3.11.5)
+    ResponseHandler of a connection through an upstream proxy,
+    which it gives back to the upstream once closed.
+
+    The stream objects of handshakes the connector runs itself are not kept:
+    the transport is handed over from them (see TunnelWriter.hand_over).
+    The StreamWriter of a connection opened by python-socks is kept,
+    to fix https://github.com/romis2012/aiohttp-socks/issues/27
+    (see StreamWriter.__del__, added in Python 3.11.5).
     """
 
+    __slots__ = ("_metrics", "_upstream", "_writer", "idle_timeout")
+
     def __init__(
-        self, loop: asyncio.AbstractEventLoop, writer: asyncio.StreamWriter
+        self,
+        loop: asyncio.AbstractEventLoop,
+        upstream: Upstream | None = None,
+        metrics: ProxyMetrics | None = None,
+        idle_timeout: float | None = None,
+        writer: asyncio.StreamWriter | None = None,
     ) -> None:
         super().__init__(loop)
+        self._upstream = upstream
+        self._metrics = metrics
         self._writer = writer
+        self.idle_timeout = idle_timeout
+
+    def connection_lost(self, exc: BaseException | None) -> None:
+        super().connection_lost(exc)
+
+        upstream, self._upstream = self._upstream, None
+        if upstream is not None:
+            upstream.connections.discard(self)
+            upstream.release()
+            if self._metrics is not None:
+                self._metrics.record_closed(upstream.name)
 
 
 class _BaseProxyConnector(TCPConnector):
+    """
+    health_check - (optional) HealthCheck, ejects upstream proxies
+        that keep failing to connect.
+    warm_pool - (optional) WarmPool, keeps connections to upstream proxies
+        ready to send the CONNECT request.
+    proxy_resolver - (optional) AbstractResolver used to resolve proxy host names.
+        Defaults to a CachingResolver honouring use_dns_cache and ttl_dns_cache.
+    metrics - (optional) ProxyMetrics, collects tunnel counters and latencies.
+        A single instance can be shared by several connectors.
+    limit_per_proxy - maximum number of simultaneous connections through
+        a single upstream proxy, further connections wait in FIFO order.
+        Idle pooled connections count too, the longest idle one is closed
+        when a connection has to wait. Connections kept by a warm pool
+        are not counted. 0 means no limit.
+    failover - (optional) Failover, retries failed proxy connections
+        through other upstreams within the sock_connect timeout.
+    tls_sessions - (optional) TLSSessionCache, resumes TLS sessions
+        to destinations and HTTPS proxies. Can be shared by several connectors.
+        The default SSLContext of requests is replaced with one made for it.
+    keepalive - (optional) TunnelKeepAlive, TCP keepalive options of sockets
+        to proxy servers. Pooled connections idle for longer than
+        keepalive_timeout (see TCPConnector) are closed, set it lower than
+        the idle timeout of the proxy servers so that tunnels silently
+        dropped by them are not handed out. ProxyInfo.idle_timeout
+        overrides it per upstream proxy.
+    socket_options - (level, option, value) tuples set with setsockopt()
+        on sockets to proxy servers before connecting,
+        e.g. (socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20).
+    local_addresses - (optional) LocalAddressPool, sockets to proxy servers
+        are bound to the least used of its addresses.
+    pipelining - send the SOCKS5 method selection, authentication and CONNECT
+        requests to a single proxy (without TLS to it and a warm pool)
+        back to back, saving up to 2 round trips. A proxy that doesn't take
+        it gets the regular handshake from then on.
+    http2 - open tunnels through a single HTTPS proxy (without a warm pool)
+        as HTTP/2 CONNECT streams multiplexed over a shared connection
+        to it (requires h2). A given proxy_ssl has to offer h2 with ALPN
+        (set_alpn_protocols(["h2", "http/1.1"])), the default one does.
+        A proxy that doesn't choose h2 gets HTTP/1.1 CONNECT requests
+        from then on.
+
+    local_addr and socket_factory (see TCPConnector) apply to connections
+    to proxy servers.
+
+    Connections are opened with python-socks (see Proxy.connect) unless
+    they need something it doesn't do: a warm pool, proxy_resolver, metrics,
+    TLS session resumption, keepalive, socket_options, local_addresses,
+    socket_factory, pipelining, HTTP/2, trace signals of the request,
+    per hop timeouts, local_addr with a proxy chain or racing the addresses
+    of a proxy host name (see happy_eyeballs_delay). Those are opened by
+    the connector itself.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        *,
+        health_check: HealthCheck | None = None,
+        warm_pool: WarmPool | None = None,
+        proxy_resolver: AbstractResolver | None = None,
+        metrics: ProxyMetrics | None = None,
+        limit_per_proxy: int = 0,
+        failover: Failover | None = None,
+        tls_sessions: TLSSessionCache | None = None,
+        keepalive: TunnelKeepAlive | None = None,
+        socket_options: Iterable[SocketOption] = (),
+        local_addresses: LocalAddressPool | None = None,
+        pipelining: bool = False,
+        http2: bool = False,
+        **kwargs: Any,
+    ) -> None:
+        if local_addresses is not None and kwargs.get("local_addr") is not None:
+            raise ValueError("local_addr and local_addresses are mutually exclusive")
+        if http2:
+            require_h2()
+
+        # only applied to connections to proxy servers, which are opened
+        # by the connector itself (aiohttp < 3.12 has no socket_factory)
+        socket_factory: SocketFactory | None = kwargs.pop("socket_factory", None)
+        super().__init__(**kwargs)
+
+        socket_options = tuple(socket_options)
+        self._local_addr: tuple[str, int] | None = kwargs.get("local_addr")
+        self._custom_dialing = (
+            warm_pool is not None
+            or proxy_resolver is not None
+            or metrics is not None
+            or tls_sessions is not None
+            or keepalive is not None
+            or bool(socket_options)
+            or local_addresses is not None
+            or socket_factory is not None
+            or pipelining
+            or http2
+        )
+
+        self._health_check = health_check
+        self._failover = failover
+        self._tls_sessions = tls_sessions
+        self._pipelining = pipelining
+        self._http2 = http2
+        self._warm_pool = warm_pool
+        self._metrics = metrics
+        self._limit_per_proxy = limit_per_proxy
+        self._upstreams: tuple[Upstream, ...] = ()
+        self._probe_task: asyncio.Task[None] | None = None
+
+        self._proxy_resolver_owner = proxy_resolver is None
+        if proxy_resolver is None:
+            if kwargs.get("use_dns_cache", True):
+                proxy_resolver = CachingResolver(
+                    ttl=kwargs.get("ttl_dns_cache", DEFAULT_TTL_DNS_CACHE)
+                )
+            else:
+                proxy_resolver = DefaultResolver()
+        self._proxy_resolver = proxy_resolver
+
+        socket_factory = configure_sockets(
+            socket_options=socket_options,
+            keepalive=keepalive,
+            socket_factory=socket_factory,
+        )
+        if local_addresses is not None:
+            socket_factory = local_addresses.socket_factory(socket_factory)
+
+        self._dialer = Dialer(
+            loop=self._loop,
+            resolver=proxy_resolver,
+            family=self._family,
+            happy_eyeballs_delay=self._happy_eyeballs_delay,
+            interleave=self._interleave,
+            tls_sessions=tls_sessions,
+            local_addr_infos=aiohappyeyeballs.addr_to_addr_infos(
+                kwargs.get("local_addr")
+            ),
+            socket_factory=socket_factory,
+        )
+
+    @property
+    def upstreams(self) -> tuple[Upstream, ...]:
+        return self._upstreams
+
+    async def close(self, **kwargs: Any) -> None:
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            self._probe_task = None
+        for upstream in self._upstreams:
+            if upstream.warm_tunnels is not None:
+                upstream.warm_tunnels.close()
+            if upstream.h2_session is not None:
+                upstream.h2_session.close()
+        if self._proxy_resolver_owner:
+            await self._proxy_resolver.close()
+        await super().close(**kwargs)
+
+    def _release(
+        self,
+        key: ConnectionKey,
+        protocol: ResponseHandler,
+        *,
+        should_close: bool = False,
+    ) -> None:
+        super()._release(key, protocol, should_close=should_close)
+
+        keepalive_timeout = self._keepalive_timeout
+        if (
+            not isinstance(protocol, _ResponseHandler)
+            or protocol.idle_timeout is None
+            or keepalive_timeout is None
+        ):
+            return
+
+        conns = self._conns.get(key)
+        if conns and conns[-1][0] is protocol:  # pooled
+            # shift the release time, so that the keepalive_timeout checks
+            # of TCPConnector expire the connection after idle_timeout
+            released = conns[-1][1] + protocol.idle_timeout - keepalive_timeout
+            conns[-1] = (protocol, released)
+
+    def _close_idle(self, upstream: Upstream) -> None:
+        """
+        Closes the pooled connection through the upstream
+        that has been idle for the longest time, if there is one
+        """
+        oldest: tuple[float, ConnectionKey, ResponseHandler] | None = None
+        for key, conns in self._conns.items():
+            for protocol, released in conns:
+                if protocol in upstream.connections and (
+                    oldest is None or released < oldest[0]
+                ):
+                    oldest = released, key, protocol
+
+        if oldest is not None:
+            self._close_pooled(oldest[1], oldest[2])
+
+    def _close_pooled(self, key: ConnectionKey, protocol: ResponseHandler) -> None:
+        conns = self._conns.get(key)
+        if not conns:
+            return
+
+        for conn in conns:
+            if conn[0] is protocol:
+                conns.remove(conn)
+                if not conns:
+                    del self._conns[key]
+                transport = protocol.transport
+                protocol.close()
+                # as TCPConnector does, the SSL transports are aborted
+                # if they don't close in time
+                if key.is_ssl and not self._cleanup_closed_disabled:
+                    self._cleanup_closed_transports.append(transport)
+                return
+
+    def clear_dns_cache(self, host: str | None = None, port: int | None = None) -> None:
+        super().clear_dns_cache(host, port)
+        if isinstance(self._proxy_resolver, CachingResolver):
+            self._proxy_resolver.clear(host, port)
+
     async def _wrap_create_connection(
         self,
         *args: Any,  # noqa: ARG002
         addr_infos: list[AddrInfoType],
-        req: ClientRequest,  # noqa: ARG002
+        req: ClientRequest,
         timeout: ClientTimeout,
         client_error: type[Exception] = ClientConnectorError,  # noqa: ARG002
         **kwargs: Any,
@@ -73,13 +339,26 @@ class _BaseProxyConnector(TCPConnector):
         except IndexError as e:  # pragma: no cover
             raise ValueError("Invalid arg: `addr_infos`") from e
 
+        self._start_probing()
+        self._start_warm_up()
+
         ssl: SSLContext | None = kwargs.get("ssl")
+        if (
+            self._tls_sessions is not None
+            and ssl is not None
+            and req.ssl is True
+            and self._ssl is True
+        ):
+            # aiohttp's default context is shared by the whole process
+            ssl = _DEFAULT_DEST_SSL
         try:
             return await self._connect_via_proxy(
                 host=host,
                 port=port,
                 ssl=ssl,
                 timeout=timeout.sock_connect,
+                traces=ProxyTrace.from_request(req),
+                key=self._affinity_key(req),
             )
         except python_socks.ProxyConnectionError as e:
             raise ProxyConnectionError(str(e)) from e
@@ -94,8 +373,563 @@ class _BaseProxyConnector(TCPConnector):
         port: int,
         ssl: SSLContext | None = None,
         timeout: float | None = None,
+        traces: Sequence[ProxyTrace] = (),
+        key: str | None = None,
     ) -> tuple[asyncio.Transport, ResponseHandler]:
-        raise NotImplementedError
+        upstreams = self._available_upstreams()
+        if not upstreams:
+            if len(self._upstreams) == 1:
+                raise ProxyConnectionError(
+                    f"Proxy {self._upstreams[0].name} is temporarily unavailable"
+                )
+            raise ProxyConnectionError(
+                "All upstream proxies are temporarily unavailable"
+            )
+
+        if self._failover is not None:
+            return await self._connect_with_failover(
+                self._failover,
+                upstreams,
+                key=key or host,
+                host=host,
+                port=port,
+                ssl=ssl,
+                timeout=timeout,
+                traces=traces,
+            )
+
+        return await self._connect_upstream(
+            self._select_upstream(upstreams, key=key or host),
+            host=host,
+            port=port,
+            ssl=ssl,
+            timeout=timeout,
+            traces=traces,
+        )
+
+    async def _connect_with_failover(
+        self,
+        failover: Failover,
+        upstreams: list[Upstream],
+        key: str,
+        host: str,
+        port: int,
+        ssl: SSLContext | None = None,
+        timeout: float | None = None,
+        traces: Sequence[ProxyTrace] = (),
+    ) -> tuple[asyncio.Transport, ResponseHandler]:
+        deadline = self._loop.time() + (DEFAULT_TIMEOUT if timeout is None else timeout)
+        tried: list[Upstream] = []
+        attempts: set[asyncio.Task[tuple[asyncio.Transport, ResponseHandler]]] = set()
+        hedges: dict[asyncio.Task[Any], Upstream] = {}
+        hedging = False
+        error: BaseException | None = None
+
+        try:
+            while True:
+                remaining = deadline - self._loop.time()
+                if len(tried) < failover.max_attempts and remaining > 0:
+                    upstream = self._next_attempt_upstream(
+                        upstreams, tried, key=key, hedging=hedging
+                    )
+                    if upstream is not None:
+                        tried.append(upstream)
+                        attempt = self._loop.create_task(
+                            self._connect_upstream(
+                                upstream,
+                                host=host,
+                                port=port,
+                                ssl=ssl,
+                                timeout=remaining,
+                                traces=traces,
+                            )
+                        )
+                        attempts.add(attempt)
+                        if hedging:
+                            hedges[attempt] = upstream
+                            if self._metrics is not None:
+                                self._metrics.record_hedge_fired(upstream.name)
+
+                if not attempts:
+                    assert error is not None
+                    raise error
+
+                done, attempts = await asyncio.wait(
+                    attempts,
+                    timeout=(
+                        failover.hedge_delay
+                        if len(tried) < failover.max_attempts
+                        else None
+                    ),
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                hedging = not done
+                winner, error = _attempts_outcome(done, failover, error)
+                if winner is not None:
+                    if winner in hedges and self._metrics is not None:
+                        self._metrics.record_hedge_won(hedges[winner].name)
+                    return winner.result()
+                if error is not None and not failover.should_retry(error):
+                    raise error
+        finally:
+            await self._cancel_attempts(attempts)
+
+    def _next_attempt_upstream(
+        self,
+        upstreams: list[Upstream],
+        tried: list[Upstream],
+        key: str,
+        hedging: bool,  # noqa: FBT001
+    ) -> Upstream | None:
+        if tried:
+            # upstreams might have been ejected meanwhile
+            upstreams = self._available_upstreams()
+
+        # prefer the ones not tried yet, hedge only to those
+        candidates = [u for u in upstreams if u not in tried]
+        if not candidates and not hedging:
+            candidates = upstreams
+        if not candidates:
+            return None
+        return self._select_upstream(candidates, key=key)
+
+    async def _cancel_attempts(
+        self,
+        attempts: set[asyncio.Task[tuple[asyncio.Transport, ResponseHandler]]],
+    ) -> None:
+        if not attempts:
+            return
+
+        for task in attempts:
+            task.cancel()
+        await asyncio.wait(attempts)
+
+        for task in attempts:
+            if not task.cancelled() and task.exception() is None:
+                task.result()[0].close()  # established before it was cancelled
+
+    def _select_upstream(self, upstreams: list[Upstream], key: str) -> Upstream:  # noqa: ARG002
+        return upstreams[0]
+
+    def _affinity_key(self, req: ClientRequest) -> str | None:  # noqa: ARG002
+        return None
+
+    def _available_upstreams(self) -> list[Upstream]:
+        if self._health_check is None:
+            return list(self._upstreams)
+
+        now = self._loop.time()
+        return [u for u in self._upstreams if u.health.is_available(now)]
+
+    async def _connect_upstream(
+        self,
+        upstream: Upstream,
+        host: str,
+        port: int,
+        ssl: SSLContext | None = None,
+        timeout: float | None = None,
+        traces: Sequence[ProxyTrace] = (),
+    ) -> tuple[asyncio.Transport, ResponseHandler]:
+        if timeout is None:
+            timeout = DEFAULT_TIMEOUT
+
+        metrics = self._metrics
+
+        queued_at = self._loop.time()
+        if upstream.is_full(self._limit_per_proxy):
+            self._close_idle(upstream)  # its slot goes to the queue
+        if await upstream.acquire(self._limit_per_proxy) and metrics is not None:
+            metrics.record_queued(upstream.name, self._loop.time() - queued_at)
+
+        started = self._loop.time()
+        try:
+            tunnel = await self._open_tunnel(
+                upstream,
+                host=host,
+                port=port,
+                ssl=ssl,
+                timeout=timeout,
+                traces=traces,
+            )
+        except Exception as e:
+            upstream.release()
+            self._record_failure(upstream, e)
+            raise
+        except BaseException:
+            upstream.release()
+            raise
+
+        latency = self._loop.time() - started
+        upstream.health.record_success()
+        upstream.record_latency(latency)
+
+        if metrics is not None:
+            metrics.record_opened(upstream.name, latency)
+
+        protocol = _ResponseHandler(
+            loop=self._loop,
+            upstream=upstream,
+            metrics=metrics,
+            idle_timeout=upstream.idle_timeout,
+            writer=tunnel.writer if isinstance(tunnel, ProxyStream) else None,
+        )
+
+        transport = tunnel.hand_over(protocol)
+
+        upstream.connections.add(protocol)
+        if upstream.removed:
+            protocol.force_close()  # the upstream was removed while connecting
+
+        return transport, protocol
+
+    async def _open_tunnel(
+        self,
+        upstream: Upstream,
+        host: str,
+        port: int,
+        ssl: SSLContext | None,
+        timeout: float,
+        traces: Sequence[ProxyTrace] = (),
+    ) -> Tunnel:
+        if not self._uses_dialer(upstream, traces):
+            return await self._connect_proxy(upstream, host, port, ssl, timeout)
+
+        try:
+            return await asyncio.wait_for(
+                self._dial(upstream, host=host, port=port, ssl=ssl, traces=traces),
+                timeout=timeout,
+            )
+        except python_socks.ProxyTimeoutError:
+            raise  # a TimeoutError too, e.g. the timeout of a hop
+        except asyncio.TimeoutError as e:
+            raise python_socks.ProxyTimeoutError(
+                f"Proxy connection timed out: {timeout}"
+            ) from e
+
+    def _uses_dialer(
+        self,
+        upstream: Upstream,
+        traces: Sequence[ProxyTrace] = (),
+    ) -> bool:
+        """
+        Whether the connection needs something python-socks doesn't do,
+        see _BaseProxyConnector
+        """
+        return (
+            self._custom_dialing
+            or bool(traces)
+            or upstream.needs_dialer
+            or (bool(upstream.forward) and self._local_addr is not None)
+        )
+
+    async def _connect_proxy(
+        self,
+        upstream: Upstream,
+        host: str,
+        port: int,
+        ssl: SSLContext | None = None,
+        timeout: float | None = None,
+    ) -> ProxyStream:
+        """
+        Opens the tunnel with python-socks
+        """
+        kwargs = {} if self._local_addr is None else {"local_addr": self._local_addr}
+        with handshake_errors():
+            stream = await upstream.proxy.connect(
+                dest_host=host,
+                dest_port=port,
+                dest_ssl=ssl,
+                timeout=timeout,
+                **kwargs,
+            )
+        return ProxyStream(stream.reader, stream.writer)
+
+    async def _dial(
+        self,
+        upstream: Upstream,
+        host: str,
+        port: int,
+        ssl: SSLContext | None,
+        traces: Sequence[ProxyTrace] = (),
+    ) -> Tunnel:
+        if (
+            self._http2
+            and upstream.http2 is not False
+            and upstream.warm_tunnels is None
+            and not upstream.forward
+            and upstream.proxy_ssl is not None
+            and upstream.info.proxy_type == ProxyType.HTTP
+        ):
+            try:
+                h2_tunnel = await self._dial_h2(upstream, host, port, ssl, traces)
+            except HTTP2Unsupported:
+                upstream.http2 = False
+            else:
+                upstream.http2 = True
+                return h2_tunnel
+
+        plain = (
+            upstream.warm_tunnels is None
+            and not upstream.forward
+            and upstream.proxy_ssl is None
+        )
+        pipelined = (
+            plain
+            and self._pipelining
+            and upstream.pipelining is not False
+            and upstream.info.proxy_type == ProxyType.SOCKS5
+        )
+
+        try:
+            tunnel = await self._dial_stream(
+                upstream, host, port, ssl, traces, pipelined=pipelined
+            )
+        except PipeliningRejected:
+            upstream.pipelining = False
+            return await self._dial_stream(upstream, host, port, ssl, traces)
+
+        if pipelined:
+            upstream.pipelining = True
+        return tunnel
+
+    async def _dial_stream(
+        self,
+        upstream: Upstream,
+        host: str,
+        port: int,
+        ssl: SSLContext | None,
+        traces: Sequence[ProxyTrace] = (),
+        *,
+        pipelined: bool = False,
+    ) -> TunnelWriter:
+        started = self._loop.time()
+
+        stream = None
+        warm_tunnels = upstream.warm_tunnels
+        if warm_tunnels is not None:
+            stream = warm_tunnels.acquire()
+            if stream is not None:
+                # None if the proxy has closed the idle connection
+                stream = await warm_tunnels.connect(stream, host=host, port=port)
+
+        if stream is None:
+            for trace in traces:
+                await trace.send_proxy_connect_start(upstream.name, host, port)
+
+            stream = await self._dialer.connect_first_hop(upstream)
+            connected = self._loop.time()
+            rtt = connected - started
+            for trace in traces:
+                await trace.send_proxy_connect_end(upstream.name, host, port, rtt)
+            started = connected
+
+            on_hop = self._hop_callback(upstream, host=host, port=port, traces=traces)
+            if pipelined:
+                stream = await self._dialer.pipeline(
+                    stream, upstream, host=host, port=port, rtt=rtt
+                )
+                await on_hop(0, self._loop.time() - started)
+            else:
+                stream = await self._dialer.prepare(stream, upstream, on_hop=on_hop)
+                stream = await self._dialer.request(
+                    stream, upstream, host=host, port=port
+                )
+
+        finished = self._loop.time()
+        for trace in traces:
+            await trace.send_proxy_handshake_end(
+                upstream.name, host, port, finished - started
+            )
+
+        if ssl is not None:
+            stream = await self._dialer.start_tls(
+                stream,
+                host=host,
+                ssl_context=ssl,
+                session_key=("dest", upstream.name, host, port),
+            )
+            for trace in traces:
+                await trace.send_dest_tls_end(
+                    upstream.name, host, port, self._loop.time() - finished
+                )
+
+        return stream[1]
+
+    async def _dial_h2(
+        self,
+        upstream: Upstream,
+        host: str,
+        port: int,
+        ssl: SSLContext | None,
+        traces: Sequence[ProxyTrace] = (),
+    ) -> HandshakeProtocol:
+        session = upstream.h2_session
+        if session is None:
+            assert upstream.proxy_ssl is not None
+            session = upstream.h2_session = H2Session(
+                functools.partial(
+                    self._dialer.connect_h2,
+                    upstream,
+                    proxy_ssl=_h2_proxy_ssl(upstream.proxy_ssl),
+                )
+            )
+
+        started = self._loop.time()
+        for trace in traces:
+            await trace.send_proxy_connect_start(upstream.name, host, port)
+
+        connection = await session.acquire()  # an open one, if there is
+        connected = self._loop.time()
+        for trace in traces:
+            await trace.send_proxy_connect_end(
+                upstream.name, host, port, connected - started
+            )
+
+        tunnel = await self._dialer.request_h2(connection, upstream, host, port)
+        finished = self._loop.time()
+        await self._hop_callback(upstream, host=host, port=port, traces=traces)(
+            0, finished - connected
+        )
+        for trace in traces:
+            await trace.send_proxy_handshake_end(
+                upstream.name, host, port, finished - connected
+            )
+
+        if ssl is not None:
+            await self._dialer.upgrade(
+                tunnel,
+                host=host,
+                ssl_context=ssl,
+                session_key=("dest", upstream.name, host, port),
+            )
+            for trace in traces:
+                await trace.send_dest_tls_end(
+                    upstream.name, host, port, self._loop.time() - finished
+                )
+        return tunnel
+
+    def _hop_callback(
+        self,
+        upstream: Upstream,
+        host: str,
+        port: int,
+        traces: Sequence[ProxyTrace] = (),
+    ) -> HopCallback:
+        async def on_hop(index: int, duration: float) -> None:
+            hop = upstream.hop_names[index]
+            for trace in traces:
+                await trace.send_proxy_hop_end(upstream.name, hop, host, port, duration)
+            await self._record_hop(upstream, index, duration)
+
+        return on_hop
+
+    def _start_warm_up(self) -> None:
+        if self._warm_pool is None:
+            return
+
+        for upstream in self._upstreams:
+            if upstream.warm_tunnels is None:
+                upstream.warm_tunnels = WarmTunnels(
+                    loop=self._loop,
+                    dialer=self._dialer,
+                    upstream=upstream,
+                    config=self._warm_pool,
+                    on_hop=functools.partial(self._record_hop, upstream),
+                )
+                upstream.warm_tunnels.fill()
+
+    async def _record_hop(self, upstream: Upstream, index: int, duration: float) -> None:
+        if self._metrics is not None:
+            self._metrics.record_hop(upstream.name, upstream.hop_names[index], duration)
+
+    def _record_failure(self, upstream: Upstream, exc: Exception) -> None:
+        if self._metrics is not None:
+            self._metrics.record_failure(upstream.name, exc)
+
+        if self._health_check is not None and isinstance(
+            exc,
+            (python_socks.ProxyConnectionError, python_socks.ProxyTimeoutError),
+        ):
+            upstream.health.record_failure(self._loop.time(), self._health_check)
+
+    def _start_probing(self) -> None:
+        if (
+            self._probe_task is not None
+            or self._health_check is None
+            or self._health_check.probe_target is None
+        ):
+            return
+
+        self._probe_task = self._loop.create_task(
+            self._probe_upstreams(self._health_check)
+        )
+
+    async def _probe_upstreams(self, health_check: HealthCheck) -> None:
+        while True:
+            await asyncio.sleep(health_check.probe_interval)
+            await asyncio.gather(
+                *(self._probe_upstream(u, health_check) for u in self._upstreams)
+            )
+
+    async def _probe_upstream(
+        self,
+        upstream: Upstream,
+        health_check: HealthCheck,
+    ) -> None:
+        assert health_check.probe_target is not None
+        host, port = health_check.probe_target
+
+        try:
+            if self._uses_dialer(upstream):
+                writer = await asyncio.wait_for(
+                    self._dialer.connect(upstream, host=host, port=port),
+                    timeout=health_check.probe_timeout,
+                )
+            else:
+                stream = await self._connect_proxy(
+                    upstream, host=host, port=port, timeout=health_check.probe_timeout
+                )
+                writer = stream.writer
+        except (
+            asyncio.TimeoutError,
+            python_socks.ProxyConnectionError,
+            python_socks.ProxyTimeoutError,
+        ):
+            upstream.health.record_failure(self._loop.time(), health_check)
+        except python_socks.ProxyError:
+            pass  # the proxy is alive, but refused to reach the probe target
+        except Exception:  # noqa: BLE001
+            # anything else counts as a failure, the probing goes on
+            upstream.health.record_failure(self._loop.time(), health_check)
+        else:
+            writer.transport.close()
+            upstream.health.record_success()
+
+
+def _attempts_outcome(
+    done: set[asyncio.Task[tuple[asyncio.Transport, ResponseHandler]]],
+    failover: Failover,
+    error: BaseException | None,
+) -> tuple[
+    asyncio.Task[tuple[asyncio.Transport, ResponseHandler]] | None,
+    BaseException | None,
+]:
+    """
+    Returns the first successful one of the finished attempts
+    and the error to report if there's none: the first one that
+    is not to be retried or the last one.
+    """
+    winner = None
+    for task in done:
+        exc = task.exception()
+        if exc is None:
+            if winner is None:
+                winner = task
+            else:
+                task.result()[0].close()  # a tie, only one can win
+        elif error is None or failover.should_retry(error):
+            error = exc
+    return winner, error
 
 
 class ProxyConnector(_BaseProxyConnector):
@@ -121,43 +955,73 @@ class ProxyConnector(_BaseProxyConnector):
         self._rdns = rdns
         self._proxy_ssl = proxy_ssl
 
-    async def _connect_via_proxy(
-        self,
-        host: str,
-        port: int,
-        ssl: SSLContext | None = None,
-        timeout: float | None = None,
-    ) -> tuple[asyncio.Transport, ResponseHandler]:
-        proxy = Proxy(
-            proxy_type=self._proxy_type,
-            host=self._proxy_host,
-            port=self._proxy_port,
-            username=self._proxy_username,
-            password=self._proxy_password,
-            rdns=self._rdns,
-            proxy_ssl=self._proxy_ssl,
+        self._upstream = Upstream(
+            ProxyInfo(
+                proxy_type=proxy_type,
+                host=host,
+                port=port,
+                username=username,
+                password=password,
+                rdns=rdns,
+            ),
+            proxy_ssl=proxy_ssl,
         )
+        self._upstreams = (self._upstream,)
 
-        stream = await proxy.connect(
-            dest_host=host,
-            dest_port=port,
-            dest_ssl=ssl,
-            timeout=timeout,
+    @classmethod
+    def from_url(cls, url: str, **kwargs: Any) -> ProxyConnector:
+        info = ProxyInfo.from_url(url, proxy_ssl=kwargs.pop("proxy_ssl", None))
+        return cls(
+            proxy_type=info.proxy_type,
+            host=info.host,
+            port=info.port,
+            username=info.username,
+            password=info.password,
+            proxy_ssl=info.proxy_ssl,
+            **kwargs,
         )
 
-        transport = stream.writer.transport
-        protocol: ResponseHandler = _ResponseHandler(
-            loop=self._loop,
-            writer=stream.writer,
-        )
 
-        transport.set_protocol(protocol)
-        protocol.connection_made(transport)
+class ProxyInfo(NamedTuple):
+    """
+    An upstream proxy or a hop of a proxy chain.
 
-        return transport, protocol  # type:ignore[return-value]
+    proxy_ssl - (optional) SSLContext for TLS to the proxy (HTTPS proxies).
+    timeout - (optional) timeout of getting through this proxy in seconds
+        (connecting to it, TLS and authentication), on top of the
+        sock_connect timeout of the whole connection.
+    idle_timeout - (optional) keepalive_timeout of the connector (see TCPConnector)
+        for pooled connections through this proxy. Expired connections are not
+        reused, they are closed by the next keepalive cleanup of the connector.
+    """
+
+    proxy_type: ProxyType
+    host: str
+    port: int
+    username: str | None = None
+    password: str | None = None
+    rdns: bool | None = None
+    proxy_ssl: SSLContext | None = None
+    timeout: float | None = None
+    idle_timeout: float | None = None
 
     @classmethod
-    def from_url(cls, url: str, **kwargs: Any) -> ProxyConnector:
+    def from_url(
+        cls,
+        url: str,
+        proxy_ssl: SSLContext | None = None,
+        timeout: float | None = None,
+    ) -> ProxyInfo:
+        """
+        https:// URLs stand for HTTP proxies with TLS, proxy_ssl
+        defaults to an SSLContext shared by all of them.
+        A given proxy_ssl is used with any other URL too.
+        """
+        if _is_https(url):
+            url = f"http://{url.partition('://')[2]}"
+            if proxy_ssl is None:
+                proxy_ssl = _DEFAULT_PROXY_SSL
+
         proxy_type, host, port, username, password = parse_proxy_url(url)
         return cls(
             proxy_type=proxy_type,
@@ -165,79 +1029,295 @@ class ProxyConnector(_BaseProxyConnector):
             port=port,
             username=username,
             password=password,
-            **kwargs,
+            proxy_ssl=proxy_ssl,
+            timeout=timeout,
         )
 
 
-class ProxyInfo(NamedTuple):
-    proxy_type: ProxyType
-    host: str
-    port: int
-    username: str | None = None
-    password: str | None = None
-    rdns: bool | None = None
+def _is_https(url: str) -> bool:
+    scheme, sep, _ = url.partition("://")
+    return bool(sep) and scheme.lower() == "https"
+
+
+def _make_default_ssl(alpn_protocols: Sequence[str] = ()) -> SSLContext:
+    ssl_context = TLSSessionCache.create_default_context()
+    if alpn_protocols:
+        ssl_context.set_alpn_protocols(alpn_protocols)
+    return ssl_context
+
+
+# The default contexts are made for TLSSessionCache, unlike aiohttp's ones.
+# Like those, they are built at import time: loading the CA certificates
+# takes tens of milliseconds, which mustn't block the loop at the first request
+_DEFAULT_DEST_SSL = _make_default_ssl(("http/1.1",))  # as aiohttp's default one
+_DEFAULT_PROXY_SSL = _make_default_ssl()
+_DEFAULT_H2_PROXY_SSL = _make_default_ssl(ALPN_PROTOCOLS)
+
+
+def _h2_proxy_ssl(proxy_ssl: SSLContext) -> SSLContext:
+    """
+    SSLContext for HTTP/2 connections to a proxy. A given proxy_ssl
+    is used as is, it has to offer h2 with ALPN itself.
+    """
+    if proxy_ssl is _DEFAULT_PROXY_SSL:
+        return _DEFAULT_H2_PROXY_SSL
+    return proxy_ssl
+
+
+def _validate_proxy_info(info: ProxyInfo) -> ProxyInfo:
+    if not isinstance(info, ProxyInfo):
+        raise TypeError(f"ProxyInfo expected, got {type(info).__name__}")
+    if not isinstance(info.proxy_type, ProxyType):
+        raise TypeError(f"Invalid proxy type: {info.proxy_type!r}")
+    if not info.host:
+        raise ValueError("Proxy host must not be empty")
+    if not 0 < info.port < 65536:  # noqa: PLR2004
+        raise ValueError(f"Invalid proxy port: {info.port}")
+    if info.timeout is not None and info.timeout <= 0:
+        raise ValueError(f"Invalid proxy timeout: {info.timeout}")
+    if info.idle_timeout is not None and info.idle_timeout <= 0:
+        raise ValueError(f"Invalid proxy idle timeout: {info.idle_timeout}")
+    return info
 
 
 class ChainProxyConnector(_BaseProxyConnector):
+    """
+    Connects through a chain of proxies, the first one is connected to directly.
+
+    The chain is validated and frozen when the connector is created.
+    Each hop can have its own proxy_ssl (HTTPS proxies) and timeout,
+    see ProxyInfo.
+    """
+
     def __init__(self, proxy_infos: Iterable[ProxyInfo], **kwargs: Any) -> None:
+        proxy_infos = tuple(_validate_proxy_info(info) for info in proxy_infos)
+        if not proxy_infos:
+            raise ValueError("At least one proxy must be specified")
+
         kwargs["resolver"] = NoResolver()
         super().__init__(**kwargs)
 
         self._proxy_infos = proxy_infos
+        *forward, last = proxy_infos
+        self._upstreams = (Upstream(last, forward=forward),)
 
-    async def _connect_via_proxy(
-        self,
-        host: str,
-        port: int,
-        ssl: SSLContext | None = None,
-        timeout: float | None = None,
-    ) -> tuple[asyncio.Transport, ResponseHandler]:
-        forward = None
-        proxy = None
-        for info in self._proxy_infos:
-            proxy = Proxy(
-                proxy_type=info.proxy_type,
-                host=info.host,
-                port=info.port,
-                username=info.username,
-                password=info.password,
-                rdns=info.rdns,
-                forward=forward,
-            )
-            forward = proxy
+    @classmethod
+    def from_urls(
+        cls,
+        urls: Iterable[str],
+        proxy_ssl: SSLContext | None = None,
+        **kwargs: Any,
+    ) -> ChainProxyConnector:
+        """
+        proxy_ssl - (optional) SSLContext for the https:// hops
+        """
+        infos = [
+            ProxyInfo.from_url(url, proxy_ssl=proxy_ssl if _is_https(url) else None)
+            for url in urls
+        ]
+        return cls(infos, **kwargs)
 
-        assert proxy is not None
 
-        stream = await proxy.connect(
-            dest_host=host,
-            dest_port=port,
-            dest_ssl=ssl,
-            timeout=timeout,
-        )
+class ProxyPoolConnector(_BaseProxyConnector):
+    """
+    Spreads new connections over a set of upstream proxies.
 
-        transport = stream.writer.transport
-        protocol: ResponseHandler = _ResponseHandler(
-            loop=self._loop,
-            writer=stream.writer,
+    strategy - "round_robin", "random", "least_connections", "latency",
+        "consistent_hash" or a SelectionStrategy instance.
+    affinity_header - (optional) name of a request header holding the affinity
+        key of the request (the destination host is used by default).
+        The header is removed from the request before it is sent.
+
+    The set of upstreams can be changed at any time (also from other threads)
+    with set_upstreams(), add_upstream(), remove_upstream() and set_weight(),
+    or kept in sync with an UpstreamProvider by watch().
+    Upstreams that stay keep their state, pooled connections and warm pool.
+    Connections through removed ones are drained: idle pooled connections
+    are closed at once, the ones in use are closed when released.
+    """
+
+    def __init__(
+        self,
+        proxy_infos: Iterable[ProxyInfo],
+        strategy: str | SelectionStrategy = "round_robin",
+        affinity_header: str | None = None,
+        **kwargs: Any,
+    ) -> None:
+        upstreams = tuple(
+            Upstream(_validate_proxy_info(info)) for info in dict.fromkeys(proxy_infos)
         )
+        if not upstreams:
+            raise ValueError("At least one proxy must be specified")
 
-        transport.set_protocol(protocol)
-        protocol.connection_made(transport)
+        kwargs["resolver"] = NoResolver()
+        super().__init__(**kwargs)
 
-        return transport, protocol  # type:ignore[return-value]
+        self._upstreams = upstreams
+        self._upstreams_lock = threading.Lock()
+        self._watch_task: asyncio.Task[None] | None = None
+        self._strategy = create_strategy(strategy)
+        self._affinity_header = affinity_header
 
-    @classmethod
-    def from_urls(cls, urls: Iterable[str], **kwargs: Any) -> ChainProxyConnector:
-        infos = []
-        for url in urls:
-            proxy_type, host, port, username, password = parse_proxy_url(url)
-            proxy_info = ProxyInfo(
-                proxy_type=proxy_type,
-                host=host,
-                port=port,
-                username=username,
-                password=password,
+    async def close(self, **kwargs: Any) -> None:
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            self._watch_task = None
+        await super().close(**kwargs)
+
+    def set_upstreams(
+        self,
+        proxy_infos: Iterable[ProxyInfo],
+        weights: Mapping[ProxyInfo, float] | None = None,
+    ) -> None:
+        """
+        Atomically replaces the set of upstream proxies.
+
+        weights - (optional) weights of the upstreams, 1.0 by default.
+        """
+        weights = weights or {}
+        with self._upstreams_lock:
+            self._replace_upstreams(
+                {info: weights.get(info, 1.0) for info in proxy_infos}
             )
-            infos.append(proxy_info)
 
+    def add_upstream(self, proxy_info: ProxyInfo, weight: float = 1.0) -> None:
+        with self._upstreams_lock:
+            entries = {u.info: u.weight for u in self._upstreams}
+            entries[proxy_info] = weight
+            self._replace_upstreams(entries)
+
+    def remove_upstream(self, proxy_info: ProxyInfo) -> None:
+        with self._upstreams_lock:
+            entries = {u.info: u.weight for u in self._upstreams}
+            if entries.pop(proxy_info, None) is None:
+                raise ValueError(f"Unknown upstream proxy: {proxy_info}")
+            self._replace_upstreams(entries)
+
+    def set_weight(self, proxy_info: ProxyInfo, weight: float) -> None:
+        with self._upstreams_lock:
+            entries = {u.info: u.weight for u in self._upstreams}
+            if proxy_info not in entries:
+                raise ValueError(f"Unknown upstream proxy: {proxy_info}")
+            entries[proxy_info] = weight
+            self._replace_upstreams(entries)
+
+    def watch(self, provider: UpstreamProvider, interval: float = 30.0) -> None:
+        """
+        Polls the provider every `interval` seconds and applies the upstream
+        list it returns. Failed or empty fetches keep the current list.
+        Stopped by close().
+        """
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+        self._watch_task = self._loop.create_task(self._watch(provider, interval))
+
+    async def _watch(self, provider: UpstreamProvider, interval: float) -> None:
+        while True:
+            try:
+                upstreams = await provider.fetch()
+                if upstreams:
+                    self.set_upstreams(upstreams, weights=upstreams)
+            except Exception:  # noqa: BLE001, S110
+                pass  # keep serving from the current list
+            await asyncio.sleep(interval)
+
+    def _replace_upstreams(self, entries: dict[ProxyInfo, float]) -> None:
+        # called with self._upstreams_lock held, readers only ever see
+        # the old or the new tuple
+        if not entries:
+            raise ValueError("At least one proxy must be specified")
+        for info, weight in entries.items():
+            _validate_proxy_info(info)
+            if weight <= 0:
+                raise ValueError(f"Invalid weight of {info}: {weight}")
+
+        current = {u.info: u for u in self._upstreams}
+        upstreams = []
+        for info, weight in entries.items():
+            upstream = current.pop(info, None) or Upstream(info)
+            upstream.weight = weight
+            upstreams.append(upstream)
+
+        self._upstreams = tuple(upstreams)
+
+        removed = list(current.values())
+        if removed and not self.closed:
+            try:
+                in_loop = asyncio.get_running_loop() is self._loop
+            except RuntimeError:
+                in_loop = False
+
+            if in_loop:
+                self._drain_upstreams(removed)
+            else:
+                self._loop.call_soon_threadsafe(self._drain_upstreams, removed)
+
+    def _drain_upstreams(self, upstreams: list[Upstream]) -> None:
+        drained: set[ResponseHandler] = set()
+        for upstream in upstreams:
+            upstream.removed = True
+            if upstream.warm_tunnels is not None:
+                upstream.warm_tunnels.close()
+                upstream.warm_tunnels = None
+            if upstream.h2_session is not None:
+                upstream.h2_session.drain()
+                upstream.h2_session = None
+            for protocol in upstream.connections:
+                protocol.force_close()  # closed instead of pooled when released
+            drained.update(upstream.connections)
+
+        # idle pooled connections are not going to be released again
+        pooled = [
+            (key, protocol)
+            for key, conns in self._conns.items()
+            for protocol, _ in conns
+            if protocol in drained
+        ]
+        for key, protocol in pooled:
+            self._close_pooled(key, protocol)
+
+    async def connect(
+        self,
+        req: ClientRequest,
+        traces: list[Trace],
+        timeout: ClientTimeout,
+    ) -> Connection:
+        header = self._affinity_header
+        if header is not None and req.proxy is None:
+            key = req.headers.pop(header, None)
+            if key is not None:
+                # aiohttp only sends proxy_headers to an HTTP proxy of its own,
+                # but they are a part of the connection key, so pooled
+                # connections are only reused by requests with the same key
+                req.proxy_headers = CIMultiDict({header: key})
+
+        return await super().connect(req, traces, timeout)
+
+    def _affinity_key(self, req: ClientRequest) -> str | None:
+        if self._affinity_header is None or not req.proxy_headers:
+            return None
+        return req.proxy_headers.get(self._affinity_header)
+
+    def _select_upstream(self, upstreams: list[Upstream], key: str) -> Upstream:
+        limit = self._limit_per_proxy
+        if limit and not self._strategy.sticky:
+            # prefer upstreams with free slots, queue only when all are busy
+            upstreams = [u for u in upstreams if u.outstanding < limit] or upstreams
+
+        return self._strategy.select(upstreams, key=key)
+
+    @classmethod
+    def from_urls(
+        cls,
+        urls: Iterable[str],
+        proxy_ssl: SSLContext | None = None,
+        **kwargs: Any,
+    ) -> ProxyPoolConnector:
+        """
+        proxy_ssl - (optional) SSLContext for the https:// upstreams
+        """
+        infos = [
+            ProxyInfo.from_url(url, proxy_ssl=proxy_ssl if _is_https(url) else None)
+            for url in urls
+        ]
         return cls(infos, **kwargs)
@@ -0,0 +1,315 @@
+"""
+Throughput, handshake latency and memory per open tunnel of the proxy
+connectors, against a plain TCPConnector as the baseline.
+The proxy and the target are local stand-ins (see standins.py).
+
+    python benchmarks/bench_connector.py
+    python benchmarks/bench_connector.py --https --output results.json
+    python benchmarks/bench_connector.py --compare results.json
+    python benchmarks/bench_connector.py --scenario socks5 --scenario socks5-pipe \
+        --repeat 10
+
+Metrics per scenario:
+
+- requests_per_second - keep-alive requests over pooled connections;
+- connections_per_second - requests over new connections (force_close);
+- handshake_p50_ms, handshake_p99_ms - time to get a new connection
+  (TCP connect, proxy handshakes and TLS with --https);
+- memory_per_tunnel_bytes - Python memory allocated per open connection.
+
+With --repeat the scenarios are run in turn the given number of times,
+the medians are reported along with the standard deviations.
+
+With --compare the results are checked against a previous run and the exit
+status is 1 if any metric got worse by more than --threshold.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gc
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable
+from typing import Any
+
+import aiohttp
+from standins import StandIns, raise_fd_limit, stand_ins
+
+import aiohttp_socks
+from aiohttp_socks import ChainProxyConnector, ProxyConnector
+
+USER = "user"
+PASSWORD = "password"
+
+ConnectorFactory = Callable[..., aiohttp.BaseConnector]
+
+# metric -> whether higher values are better
+METRICS = {
+    "requests_per_second": True,
+    "connections_per_second": True,
+    "handshake_p50_ms": False,
+    "handshake_p99_ms": False,
+    "memory_per_tunnel_bytes": False,
+}
+
+
+def scenarios(stand: StandIns) -> dict[str, ConnectorFactory]:
+    proxy = f"127.0.0.1:{stand.proxy_port}"
+    socks5 = f"socks5://{USER}:{PASSWORD}@{proxy}"
+    socks4 = f"socks4://{USER}@{proxy}"
+    http = f"http://{USER}:{PASSWORD}@{proxy}"
+
+    return {
+        "direct": aiohttp.TCPConnector,
+        "socks5": lambda **kw: ProxyConnector.from_url(socks5, **kw),
+        "socks5-pipe": lambda **kw: ProxyConnector.from_url(
+            socks5, pipelining=True, **kw
+        ),
+        "socks4": lambda **kw: ProxyConnector.from_url(socks4, **kw),
+        "http": lambda **kw: ProxyConnector.from_url(http, **kw),
+        "chain": lambda **kw: ChainProxyConnector.from_urls([socks5, http], **kw),
+    }
+
+
+def handshake_trace(durations: list[float]) -> aiohttp.TraceConfig:
+    async def on_start(_: Any, ctx: Any, __: Any) -> None:
+        ctx.started = time.perf_counter()
+
+    async def on_end(_: Any, ctx: Any, __: Any) -> None:
+        durations.append(time.perf_counter() - ctx.started)
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_connection_create_start.append(on_start)
+    trace_config.on_connection_create_end.append(on_end)
+    return trace_config
+
+
+async def run_requests(
+    connector: aiohttp.BaseConnector,
+    url: str,
+    ssl: Any,
+    number: int,
+    concurrency: int,
+    trace_configs: list[aiohttp.TraceConfig] | None = None,
+) -> float:
+    """
+    Runs the requests, returns the elapsed time
+    """
+    remaining = number
+
+    async def worker(session: aiohttp.ClientSession) -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            async with session.get(url, ssl=ssl) as resp:
+                await resp.read()
+
+    async with aiohttp.ClientSession(
+        connector=connector,
+        trace_configs=trace_configs,
+    ) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+        return time.perf_counter() - started
+
+
+async def measure(
+    factory: ConnectorFactory,
+    url: str,
+    ssl: Any,
+    args: argparse.Namespace,
+) -> dict[str, float]:
+    # warm-up
+    await run_requests(factory(), url, ssl, args.concurrency, args.concurrency)
+
+    # keep-alive: a connection per worker, reused
+    elapsed = await run_requests(
+        factory(limit=args.concurrency),
+        url,
+        ssl,
+        args.requests,
+        args.concurrency,
+    )
+    requests_per_second = args.requests / elapsed
+
+    # a new connection per request
+    durations: list[float] = []
+    elapsed = await run_requests(
+        factory(force_close=True),
+        url,
+        ssl,
+        args.connections,
+        args.concurrency,
+        trace_configs=[handshake_trace(durations)],
+    )
+    connections_per_second = args.connections / elapsed
+    percentiles = statistics.quantiles(durations, n=100, method="inclusive")
+
+    return {
+        "requests_per_second": round(requests_per_second, 1),
+        "connections_per_second": round(connections_per_second, 1),
+        "handshake_p50_ms": round(percentiles[49] * 1000, 3),
+        "handshake_p99_ms": round(percentiles[98] * 1000, 3),
+        "memory_per_tunnel_bytes": round(
+            await memory_per_tunnel(factory, url, ssl, args.tunnels)
+        ),
+    }
+
+
+async def memory_per_tunnel(
+    factory: ConnectorFactory,
+    url: str,
+    ssl: Any,
+    tunnels: int,
+) -> float:
+    """
+    Opens the given number of connections at once and keeps them pooled
+    """
+    connector = factory(limit=0)
+
+    async def fetch(session: aiohttp.ClientSession) -> None:
+        async with session.get(url, ssl=ssl) as resp:
+            await resp.read()
+
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await fetch(session)  # lazily created state isn't per tunnel
+        gc.collect()
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            await asyncio.gather(*(fetch(session) for _ in range(tunnels - 1)))
+            gc.collect()
+            after = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+
+    return (after - before) / (tunnels - 1)
+
+
+def compare(
+    results: dict[str, dict[str, float]],
+    previous: dict[str, dict[str, float]],
+    threshold: float,
+) -> list[str]:
+    regressions = []
+    for name, metrics in results.items():
+        for metric, higher_is_better in METRICS.items():
+            old = previous.get(name, {}).get(metric)
+            new = metrics[metric]
+            if not old:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            print(f"  {name:11} {metric:24} {old:>12} -> {new:>12} ({change:+.1%})")
+            if worse > threshold:
+                regressions.append(f"{name} {metric}: {change:+.1%}")
+    return regressions
+
+
+async def main(args: argparse.Namespace) -> dict[str, Any]:
+    with stand_ins(body_size=args.body_size) as stand:
+        if args.https:
+            url = f"https://127.0.0.1:{stand.https_port}/"
+            ssl: Any = stand.ssl_context()
+        else:
+            url = f"http://127.0.0.1:{stand.http_port}/"
+            ssl = True
+
+        selected = {
+            name: factory
+            for name, factory in scenarios(stand).items()
+            if not args.scenario or name in args.scenario
+        }
+        # rounds of every scenario in turn, so that drift affects them alike
+        runs: dict[str, list[dict[str, float]]] = {name: [] for name in selected}
+        for _ in range(args.repeat):
+            for name, factory in selected.items():
+                runs[name].append(await measure(factory, url, ssl, args))
+
+        results = {}
+        stdev = {}
+        for name, samples in runs.items():
+            results[name] = {
+                metric: round(statistics.median(s[metric] for s in samples), 3)
+                for metric in METRICS
+            }
+            stdev[name] = {
+                metric: round(statistics.stdev(s[metric] for s in samples), 3)
+                if len(samples) > 1
+                else 0.0
+                for metric in METRICS
+            }
+            print(
+                f"{name:11}",
+                "  ".join(
+                    f"{metric}={value}±{stdev[name][metric]}"
+                    for metric, value in results[name].items()
+                ),
+            )
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "aiohttp": aiohttp.__version__,
+            "aiohttp_socks": aiohttp_socks.__version__,
+            "https": args.https,
+            "requests": args.requests,
+            "connections": args.connections,
+            "concurrency": args.concurrency,
+            "tunnels": args.tunnels,
+            "body_size": args.body_size,
+            "repeat": args.repeat,
+        },
+        "results": results,
+        "stdev": stdev,
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--connections", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--tunnels", type=int, default=500)
+    parser.add_argument("--body-size", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--https", action="store_true", help="HTTPS target")
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        help="run only the given scenario (can be repeated)",
+    )
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--compare", help="JSON results of a previous run")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    raise_fd_limit()
+    report = asyncio.run(main(args))
+
+    if args.output:
+        with open(args.output, "w") as f:  # noqa: PTH123
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:  # noqa: PTH123
+            previous = json.load(f)
+        print(f"compared to {args.compare}:")
+        for key, value in report["meta"].items():
+            if previous["meta"].get(key) != value:
+                print(f"  warning: {key} differs ({previous['meta'].get(key)})")
+        regressions = compare(report["results"], previous["results"], args.threshold)
+        if regressions:
+            print("regressions:", *regressions, sep="\n  ")
+            sys.exit(1)
@@ -0,0 +1,139 @@
+"""
+Memory kept alive per idle pooled connection, through the proxy connectors
+and a plain TCPConnector as the baseline (local stand-ins, see standins.py).
+
+    python benchmarks/bench_memory.py [--tunnels 2000] [--https] [--output mem.json]
+
+Metrics per scenario:
+
+- bytes_per_tunnel - Python memory retained per pooled connection
+  (tracemalloc, after garbage collection);
+- stream_objects_per_tunnel - StreamReader, StreamWriter and
+  StreamReaderProtocol objects of the handshake still alive per connection
+  (0 once the transport is detached from them);
+- top - allocation sites retaining the most memory, with --top.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gc
+import json
+import platform
+import tracemalloc
+from typing import Any
+
+import aiohttp
+from bench_connector import ConnectorFactory, scenarios
+from standins import raise_fd_limit, stand_ins
+
+import aiohttp_socks
+
+STREAM_TYPES = (asyncio.StreamReader, asyncio.StreamWriter, asyncio.StreamReaderProtocol)
+
+
+def count_stream_objects() -> int:
+    return sum(isinstance(obj, STREAM_TYPES) for obj in gc.get_objects())
+
+
+async def measure(
+    factory: ConnectorFactory,
+    url: str,
+    ssl: Any,
+    args: argparse.Namespace,
+) -> dict[str, Any]:
+    connector = factory(limit=0)
+
+    async def fetch(session: aiohttp.ClientSession) -> None:
+        async with session.get(url, ssl=ssl) as resp:
+            await resp.read()
+
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await fetch(session)  # lazily created state isn't per tunnel
+        tunnels = args.tunnels - 1
+
+        gc.collect()
+        streams_before = count_stream_objects()
+        tracemalloc.start(args.frames)
+        try:
+            before = tracemalloc.take_snapshot()
+            await asyncio.gather(*(fetch(session) for _ in range(tunnels)))
+            gc.collect()
+            after = tracemalloc.take_snapshot()
+        finally:
+            tracemalloc.stop()
+        streams = count_stream_objects() - streams_before
+
+    stats = after.compare_to(before, "traceback" if args.frames > 1 else "lineno")
+    return {
+        "bytes_per_tunnel": round(sum(s.size_diff for s in stats) / tunnels),
+        "stream_objects_per_tunnel": round(streams / tunnels, 2),
+        "top": [
+            {
+                "bytes_per_tunnel": round(stat.size_diff / tunnels),
+                "traceback": stat.traceback.format(),
+            }
+            for stat in stats[: args.top]
+        ],
+    }
+
+
+async def main(args: argparse.Namespace) -> dict[str, Any]:
+    with stand_ins() as stand:
+        if args.https:
+            url = f"https://127.0.0.1:{stand.https_port}/"
+            ssl: Any = stand.ssl_context()
+        else:
+            url = f"http://127.0.0.1:{stand.http_port}/"
+            ssl = True
+
+        results = {}
+        for name, factory in scenarios(stand).items():
+            if args.scenario and name not in args.scenario:
+                continue
+            result = results[name] = await measure(factory, url, ssl, args)
+            print(
+                f"{name:11} bytes_per_tunnel={result['bytes_per_tunnel']}"
+                f"  stream_objects_per_tunnel={result['stream_objects_per_tunnel']}"
+            )
+            for stat in result["top"]:
+                print(f"    {stat['bytes_per_tunnel']:>8}", *stat["traceback"])
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "aiohttp": aiohttp.__version__,
+            "aiohttp_socks": aiohttp_socks.__version__,
+            "https": args.https,
+            "tunnels": args.tunnels,
+        },
+        "results": results,
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--tunnels", type=int, default=2000)
+    parser.add_argument("--https", action="store_true", help="HTTPS target")
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        help="run only the given scenario (can be repeated)",
+    )
+    parser.add_argument("--top", type=int, default=0, help="show top allocation sites")
+    parser.add_argument("--frames", type=int, default=1, help="traceback depth")
+    parser.add_argument("--output", help="write the results as JSON")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    raise_fd_limit()
+    report = asyncio.run(main(args))
+
+    if args.output:
+        with open(args.output, "w") as f:  # noqa: PTH123
+            json.dump(report, f, indent=2)
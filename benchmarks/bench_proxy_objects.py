@@ -0,0 +1,95 @@
+"""
+Per-connection setup cost of building what a tunnel needs from scratch
+versus reusing what the upstream holds:
+
+- the python-socks Proxy chain (see Upstream.proxy)
+- the destination independent SOCKS5 requests, method selection and
+  authentication (see HandshakeTemplate)
+
+    python benchmarks/bench_proxy_objects.py
+"""
+
+from __future__ import annotations
+
+import asyncio
+import statistics
+import timeit
+from collections.abc import Callable
+
+from python_socks.async_.asyncio.v2 import Proxy
+
+from aiohttp_socks import ProxyInfo, ProxyType, Upstream
+from aiohttp_socks._protocols import socks5
+
+NUMBER = 100_000
+REPEAT = 7
+
+INFO = ProxyInfo(ProxyType.SOCKS5, "127.0.0.1", 1080, "user", "password")
+CHAIN = (
+    ProxyInfo(ProxyType.SOCKS5, "127.0.0.1", 1080, "user", "password"),
+    ProxyInfo(ProxyType.SOCKS4, "127.0.0.1", 1081, "user"),
+    ProxyInfo(ProxyType.HTTP, "127.0.0.1", 3128, "user", "password"),
+)
+
+
+def build_chain(infos: tuple[ProxyInfo, ...]) -> Proxy:
+    # what the connectors did for every connection before Upstream.proxy
+    proxy = None
+    for info in infos:
+        proxy = Proxy(
+            proxy_type=info.proxy_type,
+            host=info.host,
+            port=info.port,
+            username=info.username,
+            password=info.password,
+            rdns=info.rdns,
+            proxy_ssl=info.proxy_ssl,
+            forward=proxy,
+        )
+    assert proxy is not None
+    return proxy
+
+
+def encode_per_connection() -> bytes:
+    # what negotiate_steps and pipelined_steps did before HandshakeTemplate
+    request = socks5.AuthMethodsRequest(username=INFO.username, password=INFO.password)
+    request.methods = bytearray((socks5.AuthMethod.USERNAME_PASSWORD,))
+    auth = socks5.AuthRequest(username=INFO.username, password=INFO.password)
+    return request.dumps() + auth.dumps()
+
+
+def report(name: str, func: Callable[[], object]) -> None:
+    runs = [
+        seconds / NUMBER * 1e9
+        for seconds in timeit.repeat(func, number=NUMBER, repeat=REPEAT)
+    ]
+    print(
+        f"{name:<28} {statistics.median(runs):8.1f} ns/connection"
+        f" (min {min(runs):.1f}, max {max(runs):.1f}, {REPEAT} runs)"
+    )
+
+
+async def main() -> None:
+    # Proxy objects take the running loop
+    single = Upstream(INFO)
+    chain = Upstream(CHAIN[-1], forward=CHAIN[:-1])
+    (template,) = single.templates
+
+    def reuse_template() -> bytes:
+        return template.pipelined_greeting + template.auth
+
+    assert encode_per_connection() == reuse_template()
+
+    for name, func in (
+        ("proxy per connection", lambda: build_chain((INFO,))),
+        ("cached proxy", lambda: single.proxy),
+        ("3-hop chain per connection", lambda: build_chain(CHAIN)),
+        ("cached 3-hop chain", lambda: chain.proxy),
+        ("encode per connection", encode_per_connection),
+        ("handshake template", reuse_template),
+    ):
+        report(name, func)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,201 @@
+"""
+Local stand-ins for the benchmarks, run in a separate process
+so that they don't share the event loop with the client:
+
+- a proxy speaking SOCKS4, SOCKS5 (no auth or username/password) and
+  HTTP CONNECT on the same port (told apart by the first byte);
+- an HTTP and an HTTPS target answering every request with a small
+  keep-alive response.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import multiprocessing
+import socket
+import ssl
+from collections.abc import Iterator
+from multiprocessing.connection import Connection
+from typing import NamedTuple
+
+import trustme
+
+SOCKS4 = 4
+SOCKS5 = 5
+BUFFER_SIZE = 65536
+
+
+class StandIns(NamedTuple):
+    proxy_port: int
+    http_port: int
+    https_port: int
+    ca_pem: bytes
+
+    def ssl_context(self) -> ssl.SSLContext:
+        return ssl.create_default_context(cadata=self.ca_pem.decode())
+
+
+class Target(asyncio.Protocol):
+    def __init__(self, response: bytes) -> None:
+        self._response = response
+        self._transport: asyncio.Transport | None = None
+        self._buffer = b""
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self._transport = transport  # type: ignore[assignment]
+
+    def data_received(self, data: bytes) -> None:
+        assert self._transport is not None
+        self._buffer += data
+        # GET requests without a body, possibly pipelined
+        while (end := self._buffer.find(b"\r\n\r\n")) != -1:
+            self._buffer = self._buffer[end + 4 :]
+            self._transport.write(self._response)
+
+
+async def _pipe(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        while data := await reader.read(BUFFER_SIZE):
+            writer.write(data)
+            await writer.drain()
+    except OSError:
+        pass
+    finally:
+        writer.close()
+
+
+async def _socks5(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> tuple:
+    n_methods = (await reader.readexactly(1))[0]
+    methods = await reader.readexactly(n_methods)
+    if 0 in methods:
+        writer.write(b"\x05\x00")
+    else:
+        writer.write(b"\x05\x02")
+        await reader.readexactly(1)  # version of the subnegotiation
+        await reader.readexactly((await reader.readexactly(1))[0])  # username
+        await reader.readexactly((await reader.readexactly(1))[0])  # password
+        writer.write(b"\x01\x00")
+
+    _, _, _, atyp = await reader.readexactly(4)
+    if atyp == 1:
+        host = socket.inet_ntop(socket.AF_INET, await reader.readexactly(4))
+    elif atyp == 4:  # noqa: PLR2004
+        host = socket.inet_ntop(socket.AF_INET6, await reader.readexactly(16))
+    else:
+        host = (await reader.readexactly((await reader.readexactly(1))[0])).decode()
+    port = int.from_bytes(await reader.readexactly(2), "big")
+    return host, port, b"\x05\x00\x00\x01" + bytes(6)
+
+
+async def _socks4(reader: asyncio.StreamReader, _: asyncio.StreamWriter) -> tuple:
+    await reader.readexactly(1)  # command
+    port_bytes = await reader.readexactly(2)
+    ip = await reader.readexactly(4)
+    await reader.readuntil(b"\x00")  # user id
+    host = socket.inet_ntop(socket.AF_INET, ip)
+    if ip[:3] == b"\x00\x00\x00":  # SOCKS4a
+        host = (await reader.readuntil(b"\x00"))[:-1].decode()
+    return host, int.from_bytes(port_bytes, "big"), b"\x00\x5a" + bytes(6)
+
+
+async def _http(reader: asyncio.StreamReader, first: bytes) -> tuple:
+    head = first + await reader.readuntil(b"\r\n\r\n")
+    target = head.split(b" ", 2)[1].decode()
+    host, _, port = target.rpartition(":")
+    reply = b"HTTP/1.1 200 Connection established\r\n\r\n"
+    return host.strip("[]"), int(port), reply
+
+
+async def _proxy(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        version = await reader.readexactly(1)
+        if version[0] == SOCKS5:
+            host, port, reply = await _socks5(reader, writer)
+        elif version[0] == SOCKS4:
+            host, port, reply = await _socks4(reader, writer)
+        else:
+            host, port, reply = await _http(reader, version)
+
+        remote_reader, remote_writer = await asyncio.open_connection(host, port)
+    except (OSError, asyncio.IncompleteReadError, ValueError):
+        writer.close()
+        return
+
+    writer.write(reply)
+    await asyncio.gather(
+        _pipe(reader, remote_writer),
+        _pipe(remote_reader, writer),
+    )
+
+
+async def _serve(conn: Connection, body_size: int) -> None:
+    ca = trustme.CA()
+    server_ssl = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    ca.issue_cert("127.0.0.1", "localhost").configure_cert(server_ssl)
+
+    body = b"x" * body_size
+    response = (
+        b"HTTP/1.1 200 OK\r\n"
+        b"Content-Type: text/plain\r\n"
+        b"Content-Length: %d\r\n\r\n%s" % (len(body), body)
+    )
+
+    loop = asyncio.get_running_loop()
+    proxy = await asyncio.start_server(_proxy, "127.0.0.1", 0, backlog=4096)
+    http = await loop.create_server(
+        lambda: Target(response), "127.0.0.1", 0, backlog=4096
+    )
+    https = await loop.create_server(
+        lambda: Target(response), "127.0.0.1", 0, backlog=4096, ssl=server_ssl
+    )
+
+    conn.send(
+        StandIns(
+            proxy_port=proxy.sockets[0].getsockname()[1],
+            http_port=http.sockets[0].getsockname()[1],
+            https_port=https.sockets[0].getsockname()[1],
+            ca_pem=ca.cert_pem.bytes(),
+        )
+    )
+    # serve until the parent says stop (or goes away)
+    await loop.run_in_executor(None, _wait_stop, conn)
+    loop.set_exception_handler(lambda *_: None)  # tunnels cancelled on shutdown
+
+
+def _wait_stop(conn: Connection) -> None:
+    with contextlib.suppress(EOFError, OSError):
+        conn.recv()
+
+
+def _run(conn: Connection, body_size: int) -> None:
+    raise_fd_limit()
+    asyncio.run(_serve(conn, body_size))
+
+
+def raise_fd_limit() -> None:
+    with contextlib.suppress(ImportError, ValueError, OSError):
+        import resource  # noqa: PLC0415
+
+        _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+@contextlib.contextmanager
+def stand_ins(body_size: int = 2) -> Iterator[StandIns]:
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.Process(
+        target=_run,
+        args=(child, body_size),
+        daemon=True,
+    )
+    process.start()
+    try:
+        yield parent.recv()
+    finally:
+        with contextlib.suppress(OSError):
+            parent.send(None)
+        parent.close()
+        process.join(5)
+        if process.is_alive():
+            process.kill()
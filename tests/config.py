@@ -1,5 +1,8 @@
 import os
 
+import aiohttp
+import python_socks
+
 LOGIN = "admin"
 PASSWORD = "admin"  # noqa: S105
 
@@ -18,6 +21,8 @@ SOCKS4_PORT_NO_AUTH = 7783
 HTTP_PROXY_PORT = 7784
 
 SKIP_IPV6_TESTS = "SKIP_IPV6_TESTS" in os.environ
+AIOHTTP_VERSION = tuple(map(int, aiohttp.__version__.split(".")[:3]))
+PYTHON_SOCKS_VERSION = tuple(map(int, python_socks.__version__.split(".")[:2]))
 
 SOCKS5_IPV4_URL = f"socks5://{LOGIN}:{PASSWORD}@{PROXY_HOST_IPV4}:{SOCKS5_PROXY_PORT}"
 
@@ -53,6 +58,8 @@ TEST_URL_IPV4 = f"http://{TEST_HOST_NAME_IPV4}:{TEST_PORT_IPV4}/ip"
 
 TEST_URL_IPv6 = f"http://{TEST_HOST_NAME_IPV6}:{TEST_PORT_IPV6}/ip"
 
+TEST_URL_IPV4_HEADERS = f"http://{TEST_HOST_NAME_IPV4}:{TEST_PORT_IPV4}/headers"
+
 TEST_URL_IPV4_DELAY = f"http://{TEST_HOST_NAME_IPV4}:{TEST_PORT_IPV4}/delay/2"
 
 TEST_URL_IPV4_HTTPS = f"https://{TEST_HOST_NAME_IPV4}:{TEST_PORT_IPV4_HTTPS}/ip"
@@ -8,6 +8,7 @@ import pytest
 import trustme
 from python_socks.async_.asyncio._resolver import Resolver as AsyncioResolver
 
+from aiohttp_socks._handshake import Resolver
 from tests.config import (
     HTTP_PROXY_PORT,
     LOGIN,
@@ -72,10 +73,17 @@ def target_ssl_context(target_ssl_ca: trustme.CA) -> ssl.SSLContext:
 
 @pytest.fixture(scope="session", autouse=True)
 def patch_resolvers() -> Iterator[None]:
-    with mock.patch.object(
-        AsyncioResolver,
-        attribute="resolve",
-        new=async_resolve_factory(AsyncioResolver),
+    with (
+        mock.patch.object(
+            AsyncioResolver,
+            attribute="resolve",
+            new=async_resolve_factory(AsyncioResolver),
+        ),
+        mock.patch.object(
+            Resolver,
+            attribute="resolve",
+            new=async_resolve_factory(Resolver),
+        ),
     ):
         yield None
 
@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import ssl
+from collections.abc import AsyncIterator
+from dataclasses import dataclass, field
+
+import h2.config
+import h2.connection
+import h2.events
+import h2.exceptions
+import trustme
+
+from aiohttp_socks._protocols.http import basic_auth
+from tests.config import HTTP_PROXY_PORT, PROXY_HOST_IPV4
+from tests.mocks import getaddrinfo_async_mock
+
+BUFFER_SIZE = 65536
+
+
+@dataclass
+class H2ProxyStats:
+    port: int = 0
+    connections: int = 0
+    streams: int = 0
+    open_streams: set[int] = field(default_factory=set)
+
+
+class H2ProxyProtocol(asyncio.Protocol):
+    """
+    Server side of an HTTP/2 connection, CONNECT streams are relayed
+    to the destinations
+    """
+
+    def __init__(self, stats: H2ProxyStats, auth: str | None) -> None:
+        self._stats = stats
+        self._auth = auth
+        self._conn = h2.connection.H2Connection(
+            config=h2.config.H2Configuration(client_side=False, header_encoding="utf-8")
+        )
+        self._transport: asyncio.Transport | None = None
+        self._writers: dict[int, asyncio.StreamWriter] = {}
+        self._ended: dict[int, int] = {}
+        self._tasks: set[asyncio.Task[None]] = set()
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self._transport = transport  # type: ignore[assignment]
+        self._stats.connections += 1
+        self._conn.initiate_connection()
+        self._flush()
+
+    def data_received(self, data: bytes) -> None:
+        for event in self._conn.receive_data(data):
+            if isinstance(event, h2.events.RequestReceived):
+                self._connect(event.stream_id, dict(event.headers))  # type: ignore[arg-type]
+            elif isinstance(event, h2.events.DataReceived):
+                writer = self._writers.get(event.stream_id)  # type: ignore[arg-type]
+                if writer is not None:
+                    writer.write(event.data)  # type: ignore[arg-type]
+                self._conn.acknowledge_received_data(
+                    event.flow_controlled_length,  # type: ignore[arg-type]
+                    event.stream_id,  # type: ignore[arg-type]
+                )
+            elif isinstance(event, h2.events.StreamEnded):
+                writer = self._writers.get(event.stream_id)  # type: ignore[arg-type]
+                if writer is not None and writer.can_write_eof():
+                    writer.write_eof()
+                self._end(event.stream_id)  # type: ignore[arg-type]
+            elif isinstance(event, h2.events.StreamReset):
+                self._close_stream(event.stream_id)  # type: ignore[arg-type]
+        self._flush()
+
+    def connection_lost(self, exc: Exception | None) -> None:  # noqa: ARG002
+        for stream_id in list(self._writers):
+            self._close_stream(stream_id)
+        for task in self._tasks:
+            task.cancel()
+
+    def _connect(self, stream_id: int, headers: dict[str, str]) -> None:
+        self._stats.streams += 1
+        if headers.get(":method") != "CONNECT":
+            self._respond(stream_id, 405)
+        elif self._auth is not None and headers.get("proxy-authorization") != self._auth:
+            self._respond(stream_id, 407)
+        else:
+            task = asyncio.ensure_future(self._relay(stream_id, headers[":authority"]))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _relay(self, stream_id: int, authority: str) -> None:
+        host, _, port = authority.rpartition(":")
+        getaddrinfo = getaddrinfo_async_mock(asyncio.get_running_loop().getaddrinfo)
+        try:
+            (*_, addr), *_ = await getaddrinfo(host.strip("[]"), int(port))
+            reader, writer = await asyncio.open_connection(addr[0], addr[1])
+        except OSError:
+            self._respond(stream_id, 502)
+            return
+
+        self._writers[stream_id] = writer
+        self._stats.open_streams.add(stream_id)
+        self._conn.send_headers(stream_id, [(":status", "200")])
+        self._flush()
+        try:
+            while data := await reader.read(self._conn.max_outbound_frame_size):
+                self._conn.send_data(stream_id, data)
+                self._flush()
+            self._conn.end_stream(stream_id)
+            self._flush()
+            self._end(stream_id)
+        except (OSError, h2.exceptions.StreamClosedError):
+            pass
+
+    def _respond(self, stream_id: int, status: int) -> None:
+        self._conn.send_headers(stream_id, [(":status", str(status))], end_stream=True)
+        self._flush()
+
+    def _end(self, stream_id: int) -> None:
+        # closed once both sides have ended it
+        self._ended[stream_id] = self._ended.get(stream_id, 0) + 1
+        if self._ended[stream_id] == 2:
+            self._close_stream(stream_id)
+
+    def _close_stream(self, stream_id: int) -> None:
+        self._stats.open_streams.discard(stream_id)
+        writer = self._writers.pop(stream_id, None)
+        if writer is not None:
+            writer.close()
+
+    def _flush(self) -> None:
+        assert self._transport is not None
+        with contextlib.suppress(h2.exceptions.ProtocolError):
+            self._transport.write(self._conn.data_to_send())
+
+
+@contextlib.asynccontextmanager
+async def h2_proxy(
+    cert: trustme.LeafCert,
+    username: str | None = None,
+    password: str | None = None,
+    alpn: tuple[str, ...] = ("h2", "http/1.1"),
+) -> AsyncIterator[H2ProxyStats]:
+    """
+    HTTPS proxy speaking HTTP/2, connections which don't negotiate h2
+    are relayed to the HTTP/1.1 proxy
+    """
+    stats = H2ProxyStats()
+    auth = None
+    if username is not None and password is not None:
+        auth = basic_auth(username, password)
+
+    server_ssl = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    cert.configure_cert(server_ssl)
+    server_ssl.set_alpn_protocols(list(alpn))
+
+    loop = asyncio.get_running_loop()
+
+    def factory() -> asyncio.Protocol:
+        return _Negotiator(stats, auth)
+
+    server = await loop.create_server(factory, PROXY_HOST_IPV4, 0, ssl=server_ssl)
+    stats.port = server.sockets[0].getsockname()[1]
+    try:
+        yield stats
+    finally:
+        server.close()
+        await server.wait_closed()
+
+
+class _Negotiator(asyncio.Protocol):
+    """
+    Picks the protocol by the result of ALPN
+    """
+
+    def __init__(self, stats: H2ProxyStats, auth: str | None) -> None:
+        self._stats = stats
+        self._auth = auth
+        self._protocol: asyncio.Protocol | None = None
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        ssl_object = transport.get_extra_info("ssl_object")
+        if ssl_object.selected_alpn_protocol() == "h2":
+            self._protocol = H2ProxyProtocol(self._stats, self._auth)
+        else:
+            self._protocol = _Relay(HTTP_PROXY_PORT)
+        transport.set_protocol(self._protocol)
+        self._protocol.connection_made(transport)
+
+
+class _Relay(asyncio.Protocol):
+    def __init__(self, port: int) -> None:
+        self._port = port
+        self._transport: asyncio.Transport | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._pending: list[bytes] = []
+        self._task: asyncio.Task[None] | None = None
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self._transport = transport  # type: ignore[assignment]
+        self._task = asyncio.ensure_future(self._relay())
+
+    def data_received(self, data: bytes) -> None:
+        if self._writer is None:
+            self._pending.append(data)
+        else:
+            self._writer.write(data)
+
+    def connection_lost(self, exc: Exception | None) -> None:  # noqa: ARG002
+        if self._writer is not None:
+            self._writer.close()
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _relay(self) -> None:
+        assert self._transport is not None
+        reader, writer = await asyncio.open_connection(PROXY_HOST_IPV4, self._port)
+        for data in self._pending:
+            writer.write(data)
+        self._writer = writer
+        while data := await reader.read(BUFFER_SIZE):
+            self._transport.write(data)
+        self._transport.close()
@@ -2,7 +2,7 @@ import asyncio
 
 from starlette.applications import Starlette
 from starlette.requests import Request
-from starlette.responses import PlainTextResponse
+from starlette.responses import JSONResponse, PlainTextResponse
 from starlette.routing import Route
 
 
@@ -10,6 +10,10 @@ async def ip(request: Request) -> PlainTextResponse:
     return PlainTextResponse(content=request.client.host)  # type:ignore[union-attr]
 
 
+async def headers(request: Request) -> JSONResponse:
+    return JSONResponse(content=dict(request.headers))
+
+
 async def delay(request: Request) -> PlainTextResponse:
     seconds = request.path_params["seconds"]
     await asyncio.sleep(seconds)
@@ -20,6 +24,7 @@ app = Starlette(
     debug=True,
     routes=[
         Route("/ip", ip),
+        Route("/headers", headers),
         Route("/delay/{seconds:int}", delay),
     ],
 )
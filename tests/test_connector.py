@@ -1,11 +1,16 @@
 from __future__ import annotations
 
 import asyncio
+import gc
+import socket
 import ssl
+import time
+import weakref
+from typing import Any
+from unittest import mock
 
 import aiohttp
 import pytest
-from aiohttp import ClientResponse, TCPConnector
 from yarl import URL
 
 from aiohttp_socks import (
@@ -19,44 +24,30 @@ from aiohttp_socks import (
     create_connection,
     open_connection,
 )
+from aiohttp_socks._dialer import Dialer
+from aiohttp_socks._handshake import TunnelWriter
 from tests.config import (
+    AIOHTTP_VERSION,
     HTTP_PROXY_PORT,
     HTTP_PROXY_URL,
     LOGIN,
     PASSWORD,
     PROXY_HOST_IPV4,
+    PYTHON_SOCKS_VERSION,
     SKIP_IPV6_TESTS,
     SOCKS4_PROXY_PORT,
     SOCKS4_URL,
+    SOCKS5_IPV4_HOSTNAME_URL,
     SOCKS5_IPV4_URL,
+    SOCKS5_IPV4_URL_WO_AUTH,
     SOCKS5_IPV6_URL,
     SOCKS5_PROXY_PORT,
     TEST_URL_IPV4,
     TEST_URL_IPV4_DELAY,
     TEST_URL_IPV4_HTTPS,
 )
-
-
-async def fetch(
-    connector: TCPConnector,
-    url: str | URL,
-    timeout: float | aiohttp.ClientTimeout | None = None,
-    ssl_context: ssl.SSLContext | None = None,
-) -> ClientResponse:
-    url = URL(url)
-
-    dest_ssl = ssl_context if url.scheme == "https" else None
-
-    if isinstance(timeout, (int, float)):
-        timeout = aiohttp.ClientTimeout(total=timeout)
-
-    async with aiohttp.ClientSession(connector=connector) as session:  # noqa: SIM117
-        async with session.get(
-            url,
-            ssl=dest_ssl,  # type:ignore[arg-type]
-            timeout=timeout,
-        ) as resp:
-            return resp
+from tests.mocks import getaddrinfo_async_mock
+from tests.utils import fake_proxy, fetch
 
 
 @pytest.mark.parametrize("url", (TEST_URL_IPV4, TEST_URL_IPV4_HTTPS))
@@ -161,6 +152,50 @@ async def test_socks5_proxy_ipv6(url: str, target_ssl_context: ssl.SSLContext) -
     assert res.status == 200
 
 
+@pytest.mark.asyncio
+async def test_socks5_proxy_hostname() -> None:
+    loop = asyncio.get_running_loop()
+    getaddrinfo = mock.AsyncMock(wraps=getaddrinfo_async_mock(loop.getaddrinfo))
+    with mock.patch.object(loop, "getaddrinfo", new=getaddrinfo):
+        connector = ProxyConnector.from_url(SOCKS5_IPV4_HOSTNAME_URL, force_close=True)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            for _ in range(3):
+                async with session.get(TEST_URL_IPV4) as resp:
+                    assert resp.status == 200
+
+    # the proxy host name is resolved once and then served from the cache
+    assert getaddrinfo.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_socks5_proxy_happy_eyeballs(
+    unused_tcp_port: int,
+    target_ssl_context: ssl.SSLContext,
+) -> None:
+    async def getaddrinfo(_host: str, port: int, **_kwargs: Any) -> Any:
+        return [
+            # unroutable (TEST-NET-1), the attempt hangs or fails
+            (socket.AF_INET, socket.SOCK_STREAM, 6, "", ("192.0.2.1", port)),
+            # nothing is listening, the attempt is refused
+            (socket.AF_INET, socket.SOCK_STREAM, 6, "", ("127.0.0.1", unused_tcp_port)),
+            (socket.AF_INET, socket.SOCK_STREAM, 6, "", ("127.0.0.1", port)),
+        ]
+
+    loop = asyncio.get_running_loop()
+    with mock.patch.object(loop, "getaddrinfo", new=getaddrinfo):
+        connector = ProxyConnector.from_url(
+            SOCKS5_IPV4_HOSTNAME_URL,
+            happy_eyeballs_delay=0.1,
+        )
+        res = await fetch(
+            connector=connector,
+            url=TEST_URL_IPV4,
+            timeout=aiohttp.ClientTimeout(total=10, sock_connect=2),
+            ssl_context=target_ssl_context,
+        )
+    assert res.status == 200
+
+
 @pytest.mark.parametrize("url", (TEST_URL_IPV4, TEST_URL_IPV4_HTTPS))
 @pytest.mark.parametrize("rdns", (True, False))
 @pytest.mark.asyncio
@@ -327,3 +362,198 @@ async def test_socks5_http_create_connection(
     writer.write(request.encode())
     response = await reader.read(-1)
     assert b"200 OK" in response
+
+
+@pytest.mark.asyncio
+async def test_handshake_streams_not_kept() -> None:
+    writers: weakref.WeakSet[TunnelWriter] = weakref.WeakSet()
+    detached = 0
+    detach = TunnelWriter.detach
+
+    def tracking_detach(self: TunnelWriter) -> asyncio.Transport:
+        nonlocal detached
+        detached += 1
+        writers.add(self)
+        return detach(self)
+
+    # the connector runs HTTP CONNECT handshakes itself
+    connector = ProxyConnector.from_url(HTTP_PROXY_URL)
+    with mock.patch.object(TunnelWriter, "detach", tracking_detach):
+        async with aiohttp.ClientSession(connector=connector) as session:
+            for _ in range(2):
+                async with session.get(TEST_URL_IPV4) as resp:
+                    assert resp.status == 200
+                    await resp.read()
+
+                gc.collect()
+                assert not writers  # the pooled connection lives on its own
+                (protocol,) = connector.upstreams[0].connections
+                assert protocol.transport is not None
+                assert not protocol.transport.is_closing()
+
+    assert detached == 1  # the connection was reused
+
+
+@pytest.mark.asyncio
+async def test_python_socks_writer_kept() -> None:
+    connector = ProxyConnector.from_url(SOCKS5_IPV4_URL)
+    with mock.patch.object(Dialer, "connect_first_hop") as connect_first_hop:
+        async with aiohttp.ClientSession(connector=connector) as session:
+            for _ in range(2):
+                async with session.get(TEST_URL_IPV4) as resp:
+                    assert resp.status == 200
+                    await resp.read()
+
+                gc.collect()  # StreamWriter.__del__ would close the transport
+                (protocol,) = connector.upstreams[0].connections
+                assert protocol.transport is not None
+                assert not protocol.transport.is_closing()
+
+    connect_first_hop.assert_not_called()
+
+
+@pytest.mark.parametrize("proxy_url", (SOCKS5_IPV4_URL, SOCKS5_IPV4_URL_WO_AUTH))
+@pytest.mark.asyncio
+async def test_pipelining(
+    proxy_url: str,
+    target_ssl_context: ssl.SSLContext,
+) -> None:
+    connector = ProxyConnector.from_url(
+        proxy_url,
+        pipelining=True,
+        force_close=True,
+    )
+    async with aiohttp.ClientSession(connector=connector) as session:
+        for url in (TEST_URL_IPV4, TEST_URL_IPV4_HTTPS):
+            async with session.get(url, ssl=target_ssl_context) as resp:
+                assert resp.status == 200
+
+    assert connector.upstreams[0].pipelining is True
+
+
+@pytest.mark.asyncio
+async def test_pipelining_rejected() -> None:
+    connections = 0
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        nonlocal connections
+        connections += 1
+        if len(await reader.read(1024)) > 3:
+            writer.close()  # more than the greeting
+            return
+        writer.write(b"\x05\x00")
+        await reader.read(1024)
+        writer.write(b"\x05\x00\x00\x01" + bytes(6))
+        await reader.read(1024)
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n")
+        await reader.read()
+
+    async with fake_proxy(handle) as url:
+        connector = ProxyConnector.from_url(url, pipelining=True, force_close=True)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            for expected in (2, 3):
+                async with session.get(TEST_URL_IPV4) as resp:
+                    assert resp.status == 200
+                assert connections == expected  # retried once, then not pipelined
+
+    assert connector.upstreams[0].pipelining is False
+
+
+@pytest.mark.asyncio
+async def test_pipelining_stalled() -> None:
+    connections = 0
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        nonlocal connections
+        connections += 1
+        greeting = await reader.read(1024)
+        writer.write(b"\x05\x02")
+        if len(greeting) > 4:
+            await reader.read()  # the rest is dropped, waits for the auth request
+            return
+        await reader.read(1024)
+        writer.write(b"\x01\x00")
+        await reader.read(1024)
+        writer.write(b"\x05\x00\x00\x01" + bytes(6))
+        await reader.read(1024)
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n")
+        await reader.read()
+
+    timeout = aiohttp.ClientTimeout(sock_connect=10)
+    async with fake_proxy(handle) as url:
+        connector = ProxyConnector.from_url(
+            str(URL(url).with_user(LOGIN).with_password(PASSWORD)),
+            pipelining=True,
+            force_close=True,
+        )
+        async with aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout,
+        ) as session:
+            started = time.monotonic()
+            async with session.get(TEST_URL_IPV4) as resp:
+                assert resp.status == 200
+            assert time.monotonic() - started < 5  # not the connect timeout
+            assert connections == 2
+
+    assert connector.upstreams[0].pipelining is False
+
+
+@pytest.mark.asyncio
+async def test_pipelining_with_invalid_credentials() -> None:
+    connector = ProxyConnector(
+        host=PROXY_HOST_IPV4,
+        port=SOCKS5_PROXY_PORT,
+        username=LOGIN,
+        password=PASSWORD + "aaa",
+        pipelining=True,
+    )
+    with pytest.raises(ProxyError):
+        await fetch(connector=connector, url=TEST_URL_IPV4)
+
+    assert connector.upstreams[0].pipelining is None  # a reply to the requests
+
+
+@pytest.mark.parametrize(
+    "proxy_type",
+    [
+        pytest.param(
+            ProxyType.SOCKS5,
+            marks=pytest.mark.skipif(
+                PYTHON_SOCKS_VERSION < (2, 5),
+                reason="python-socks < 2.5 reads the SOCKS5 reply past its end",
+            ),
+        ),
+        ProxyType.HTTP,
+    ],
+)
+@pytest.mark.skipif(
+    AIOHTTP_VERSION < (3, 10, 6),
+    reason="aiohttp < 3.10.6 fails on a response that comes before the request",
+)
+@pytest.mark.asyncio
+async def test_bytes_coalesced_with_reply(proxy_type: ProxyType) -> None:
+    response = b"HTTP/1.1 200 OK\r\nContent-Length: 5\r\n\r\nearly"
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        # the destination speaks first, its bytes arrive along with the reply
+        if proxy_type == ProxyType.SOCKS5:
+            await reader.readexactly(3)
+            writer.write(b"\x05\x00")
+            await reader.readexactly(4)
+            await reader.read(1024)
+            writer.write(b"\x05\x00\x00\x01" + bytes(6) + response)
+        else:
+            await reader.readuntil(b"\r\n\r\n")
+            writer.write(b"HTTP/1.1 200 Connection established\r\n\r\n" + response)
+        await reader.read()
+
+    timeout = aiohttp.ClientTimeout(total=5)
+    async with fake_proxy(handle, scheme=proxy_type.name.lower()) as url:
+        connector = ProxyConnector.from_url(url)
+        async with (
+            aiohttp.ClientSession(connector=connector, timeout=timeout) as session,
+            session.get(TEST_URL_IPV4) as resp,
+        ):
+            assert resp.status == 200
+            assert await resp.read() == b"early"
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+import aiohttp
+import pytest
+
+from aiohttp_socks import (
+    Failover,
+    ProxyConnector,
+    ProxyError,
+    ProxyMetrics,
+    ProxyPoolConnector,
+    ProxyTimeoutError,
+)
+from tests.config import SOCKS5_IPV4_URL_WO_AUTH, TEST_URL_IPV4
+from tests.utils import Handler, fake_proxy, fetch
+
+TIMEOUT = aiohttp.ClientTimeout(sock_connect=5)
+SHORT_TIMEOUT = aiohttp.ClientTimeout(sock_connect=0.3)
+
+
+def socks5_reply(code: int) -> Handler:
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        await reader.readexactly(3)  # greeting, no auth
+        writer.write(b"\x05\x00")
+        await reader.readexactly(4)
+        await reader.read(1024)  # the rest of the CONNECT request
+        writer.write(b"\x05" + bytes([code]) + b"\x00\x01" + bytes(6))
+        await writer.drain()
+        writer.close()
+
+    return handle
+
+
+async def silent(reader: asyncio.StreamReader, _writer: asyncio.StreamWriter) -> None:
+    await reader.read()
+
+
+def counters(metrics: ProxyMetrics, name: str) -> dict[str, float]:
+    return {
+        sample.labels["upstream"]: sample.value
+        for metric in metrics.collect()
+        for sample in metric.samples
+        if sample.name == name
+    }
+
+
+@pytest.mark.asyncio
+async def test_failover_general_failure() -> None:
+    async with fake_proxy(socks5_reply(1)) as url:
+        connector = ProxyPoolConnector.from_urls([url, SOCKS5_IPV4_URL_WO_AUTH])
+        with pytest.raises(ProxyError) as excinfo:
+            await fetch(connector, TEST_URL_IPV4, timeout=TIMEOUT)
+        assert excinfo.value.error_code == 1
+
+        connector = ProxyPoolConnector.from_urls(
+            [url, SOCKS5_IPV4_URL_WO_AUTH],
+            failover=Failover(),
+        )
+        res = await fetch(connector, TEST_URL_IPV4, timeout=TIMEOUT)
+        assert res.status == 200
+
+
+@pytest.mark.asyncio
+async def test_failover_not_retried() -> None:
+    async with fake_proxy(socks5_reply(2)) as url:  # not allowed by ruleset
+        connector = ProxyPoolConnector.from_urls(
+            [url, SOCKS5_IPV4_URL_WO_AUTH],
+            failover=Failover(),
+        )
+        with pytest.raises(ProxyError) as excinfo:
+            await fetch(connector, TEST_URL_IPV4, timeout=TIMEOUT)
+
+        assert excinfo.value.error_code == 2
+        assert connector.upstreams[1].latency is None  # never tried
+
+
+@pytest.mark.asyncio
+async def test_failover_hedging() -> None:
+    metrics = ProxyMetrics()
+    async with fake_proxy(silent) as url:
+        connector = ProxyPoolConnector.from_urls(
+            [url, SOCKS5_IPV4_URL_WO_AUTH],
+            failover=Failover(hedge_delay=0.05),
+            metrics=metrics,
+        )
+        slow, fast = connector.upstreams
+
+        started = time.monotonic()
+        res = await fetch(connector, TEST_URL_IPV4, timeout=TIMEOUT)
+        assert res.status == 200
+        assert time.monotonic() - started < 1
+        assert slow.outstanding == 0  # the losing attempt was cancelled
+
+    fired = counters(metrics, "aiohttp_socks_hedges_fired_total")
+    won = counters(metrics, "aiohttp_socks_hedges_won_total")
+    assert fired == won == {fast.name: 1}
+
+
+@pytest.mark.asyncio
+async def test_failover_hedging_single_upstream() -> None:
+    metrics = ProxyMetrics()
+    async with fake_proxy(silent) as url:
+        connector = ProxyConnector.from_url(
+            url,
+            failover=Failover(hedge_delay=0.05),
+            metrics=metrics,
+        )
+        with pytest.raises(ProxyTimeoutError):
+            await fetch(connector, TEST_URL_IPV4, timeout=SHORT_TIMEOUT)
+
+    # there's no other upstream to hedge to
+    assert counters(metrics, "aiohttp_socks_hedges_fired_total") == {
+        connector.upstreams[0].name: 0
+    }
+
+
+@pytest.mark.asyncio
+async def test_failover_connect_budget() -> None:
+    async with fake_proxy(silent) as url1, fake_proxy(silent) as url2:
+        connector = ProxyPoolConnector.from_urls([url1, url2], failover=Failover())
+
+        started = time.monotonic()
+        with pytest.raises(ProxyTimeoutError):
+            await fetch(connector, TEST_URL_IPV4, timeout=SHORT_TIMEOUT)
+        assert time.monotonic() - started < 1
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import asyncio
+import ssl
+from unittest import mock
+
+import aiohttp
+import pytest
+import trustme
+
+from aiohttp_socks import ProxyConnector, ProxyError, TLSSessionCache
+from tests.config import (
+    LOGIN,
+    PASSWORD,
+    PROXY_HOST_IPV4,
+    TEST_URL_IPV4,
+    TEST_URL_IPV4_HTTPS,
+)
+from tests.h2_proxy import h2_proxy
+from tests.utils import get
+
+
+@pytest.fixture
+def proxy_ssl(target_ssl_ca: trustme.CA) -> ssl.SSLContext:
+    ssl_ctx = ssl.create_default_context()
+    target_ssl_ca.configure_trust(ssl_ctx)
+    ssl_ctx.set_alpn_protocols(["h2", "http/1.1"])
+    return ssl_ctx
+
+
+@pytest.mark.asyncio
+async def test_h2_proxy(
+    target_ssl_cert: trustme.LeafCert,
+    target_ssl_context: ssl.SSLContext,
+    proxy_ssl: ssl.SSLContext,
+) -> None:
+    async with h2_proxy(target_ssl_cert, LOGIN, PASSWORD) as proxy:
+        connector = ProxyConnector.from_url(
+            f"https://{LOGIN}:{PASSWORD}@{PROXY_HOST_IPV4}:{proxy.port}",
+            proxy_ssl=proxy_ssl,
+            http2=True,
+        )
+
+        # the given proxy_ssl is used, no default context is built on the loop
+        with mock.patch.object(
+            TLSSessionCache, "create_default_context", side_effect=AssertionError
+        ):
+            async with aiohttp.ClientSession(connector=connector) as session:
+                urls = [TEST_URL_IPV4, TEST_URL_IPV4_HTTPS] * 5
+                await asyncio.gather(
+                    *(get(session, url, ssl_context=target_ssl_context) for url in urls)
+                )
+
+                (upstream,) = connector.upstreams
+                assert upstream.http2 is True
+                assert len(upstream.connections) == 10
+
+    # the tunnels were multiplexed over a single connection
+    assert proxy.connections == 1
+    assert proxy.streams == 10
+
+
+@pytest.mark.asyncio
+async def test_h2_proxy_closed_tunnels(
+    target_ssl_cert: trustme.LeafCert,
+    proxy_ssl: ssl.SSLContext,
+) -> None:
+    async with h2_proxy(target_ssl_cert) as proxy:
+        connector = ProxyConnector.from_url(
+            f"https://{PROXY_HOST_IPV4}:{proxy.port}",
+            proxy_ssl=proxy_ssl,
+            http2=True,
+            force_close=True,
+        )
+        async with aiohttp.ClientSession(connector=connector) as session:
+            for _ in range(3):
+                async with session.get(TEST_URL_IPV4) as resp:
+                    assert resp.status == 200
+                    await resp.read()
+
+            for _ in range(50):
+                if not proxy.open_streams:
+                    break
+                await asyncio.sleep(0.01)
+            assert not proxy.open_streams
+
+            (upstream,) = connector.upstreams
+            assert upstream.h2_session is not None
+            assert upstream.h2_session.connections == 1
+
+    assert proxy.connections == 1
+    assert proxy.streams == 3
+
+
+@pytest.mark.asyncio
+async def test_h2_proxy_with_invalid_credentials(
+    target_ssl_cert: trustme.LeafCert,
+    proxy_ssl: ssl.SSLContext,
+) -> None:
+    async with h2_proxy(target_ssl_cert, LOGIN, PASSWORD) as proxy:
+        connector = ProxyConnector.from_url(
+            f"https://{LOGIN}:{PASSWORD}aaa@{PROXY_HOST_IPV4}:{proxy.port}",
+            proxy_ssl=proxy_ssl,
+            http2=True,
+        )
+        async with aiohttp.ClientSession(connector=connector) as session:
+            with pytest.raises(ProxyError) as exc_info:
+                await session.get(TEST_URL_IPV4)
+
+    assert exc_info.value.error_code == 407
+
+
+@pytest.mark.asyncio
+async def test_h2_unsupported(
+    target_ssl_cert: trustme.LeafCert,
+    proxy_ssl: ssl.SSLContext,
+) -> None:
+    async with h2_proxy(target_ssl_cert, alpn=("http/1.1",)) as proxy:
+        connector = ProxyConnector.from_url(
+            f"https://{LOGIN}:{PASSWORD}@{PROXY_HOST_IPV4}:{proxy.port}",
+            proxy_ssl=proxy_ssl,
+            http2=True,
+            force_close=True,
+        )
+        async with aiohttp.ClientSession(connector=connector) as session:
+            for _ in range(2):
+                async with session.get(TEST_URL_IPV4) as resp:
+                    assert resp.status == 200
+                    await resp.read()
+
+        assert connector.upstreams[0].http2 is False
+
+    # HTTP/2 was only tried once
+    assert proxy.connections == 0
+
+
+@pytest.mark.asyncio
+async def test_h2_proxy_ssl_without_alpn(
+    target_ssl_cert: trustme.LeafCert,
+    target_ssl_context: ssl.SSLContext,
+) -> None:
+    async with h2_proxy(target_ssl_cert) as proxy:
+        url = f"https://{LOGIN}:{PASSWORD}@{PROXY_HOST_IPV4}:{proxy.port}"
+        for http2 in (True, False):
+            connector = ProxyConnector.from_url(
+                url, proxy_ssl=target_ssl_context, http2=http2
+            )
+            async with (
+                aiohttp.ClientSession(connector=connector) as session,
+                session.get(TEST_URL_IPV4) as resp,
+            ):
+                assert resp.status == 200
+
+            # the context is not changed to offer h2
+            assert connector.upstreams[0].http2 is (False if http2 else None)
+
+    assert proxy.connections == 0
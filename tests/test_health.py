@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import asyncio
+import socket
+import struct
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+import aiohttp
+import pytest
+
+from aiohttp_socks import (
+    HealthCheck,
+    ProxyConnectionError,
+    ProxyConnector,
+    ProxyPoolConnector,
+)
+from aiohttp_socks._health import UpstreamHealth
+from tests.config import (
+    PROXY_HOST_IPV4,
+    SOCKS5_IPV4_URL,
+    TEST_HOST_IPV4,
+    TEST_PORT_IPV4,
+    TEST_URL_IPV4,
+)
+from tests.utils import fake_proxy, fetch
+
+
+@asynccontextmanager
+async def resetting_proxy() -> AsyncIterator[str]:
+    """
+    Resets connections once it gets the greeting
+    """
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        await reader.read(1024)
+        sock = writer.get_extra_info("socket")
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+        writer.transport.abort()
+
+    async with fake_proxy(handle) as url:
+        yield url
+
+
+def test_upstream_health_backoff() -> None:
+    policy = HealthCheck(failure_threshold=2, ejection_time=1, max_ejection_time=3)
+    health = UpstreamHealth()
+
+    health.record_failure(0, policy)
+    assert health.is_available(0)
+
+    health.record_failure(0, policy)
+    assert not health.is_available(0.5)
+    assert health.is_available(1)
+
+    health.record_failure(1, policy)
+    assert health.ejected_until == 3
+
+    health.record_failure(3, policy)
+    assert health.ejected_until == 6  # capped by max_ejection_time
+
+    health.record_success()
+    assert health.is_available(3)
+    assert health.failures == 0
+
+
+@pytest.mark.asyncio
+async def test_proxy_fails_fast_when_ejected(unused_tcp_port: int) -> None:
+    connector = ProxyConnector.from_url(
+        f"socks5://{PROXY_HOST_IPV4}:{unused_tcp_port}",
+        health_check=HealthCheck(failure_threshold=1, ejection_time=60),
+    )
+    async with aiohttp.ClientSession(connector=connector) as session:
+        with pytest.raises(ProxyConnectionError, match="Couldn't connect"):
+            await session.get(TEST_URL_IPV4)
+
+        with pytest.raises(ProxyConnectionError, match="temporarily unavailable"):
+            await session.get(TEST_URL_IPV4)
+
+
+@pytest.mark.asyncio
+async def test_pool_skips_ejected_upstream(unused_tcp_port: int) -> None:
+    connector = ProxyPoolConnector.from_urls(
+        [f"socks5://{PROXY_HOST_IPV4}:{unused_tcp_port}", SOCKS5_IPV4_URL],
+        health_check=HealthCheck(failure_threshold=1, ejection_time=60),
+        force_close=True,
+    )
+    dead, alive = connector.upstreams
+
+    failures = 0
+    async with aiohttp.ClientSession(connector=connector) as session:
+        for _ in range(4):
+            try:
+                async with session.get(TEST_URL_IPV4) as resp:
+                    assert resp.status == 200
+            except ProxyConnectionError:  # noqa: PERF203
+                failures += 1
+
+    assert failures == 1
+    assert dead.health.ejections == 1
+    assert alive.health.failures == 0
+
+
+@pytest.mark.asyncio
+async def test_probe_restores_upstream() -> None:
+    health_check = HealthCheck(
+        failure_threshold=1,
+        ejection_time=60,
+        probe_target=(TEST_HOST_IPV4, TEST_PORT_IPV4),
+        probe_interval=0.05,
+    )
+    connector = ProxyPoolConnector.from_urls(
+        [SOCKS5_IPV4_URL],
+        health_check=health_check,
+    )
+    (upstream,) = connector.upstreams
+    upstream.health.record_failure(asyncio.get_running_loop().time(), health_check)
+
+    async with aiohttp.ClientSession(connector=connector) as session:
+        with pytest.raises(ProxyConnectionError):
+            await session.get(TEST_URL_IPV4)
+
+        for _ in range(50):
+            if upstream.health.ejections == 0:
+                break
+            await asyncio.sleep(0.05)
+
+        async with session.get(TEST_URL_IPV4) as resp:
+            assert resp.status == 200
+
+
+@pytest.mark.asyncio
+async def test_health_check_does_not_affect_healthy_proxy() -> None:
+    connector = ProxyConnector.from_url(SOCKS5_IPV4_URL, health_check=HealthCheck())
+    res = await fetch(connector=connector, url=TEST_URL_IPV4)
+    assert res.status == 200
+
+
+@pytest.mark.asyncio
+async def test_proxy_reset_counts_as_failure() -> None:
+    async with resetting_proxy() as url:
+        connector = ProxyConnector.from_url(
+            url,
+            health_check=HealthCheck(failure_threshold=1, ejection_time=60),
+        )
+        async with aiohttp.ClientSession(connector=connector) as session:
+            with pytest.raises(ProxyConnectionError, match="lost"):
+                await session.get(TEST_URL_IPV4)
+
+            with pytest.raises(ProxyConnectionError, match="temporarily unavailable"):
+                await session.get(TEST_URL_IPV4)
+
+
+@pytest.mark.asyncio
+async def test_probe_survives_proxy_reset() -> None:
+    async with resetting_proxy() as url:
+        connector = ProxyConnector.from_url(
+            url,
+            health_check=HealthCheck(
+                failure_threshold=2,
+                ejection_time=60,
+                probe_target=(TEST_HOST_IPV4, TEST_PORT_IPV4),
+                probe_interval=0.02,
+            ),
+        )
+        (upstream,) = connector.upstreams
+        async with aiohttp.ClientSession(connector=connector) as session:
+            with pytest.raises(ProxyConnectionError):
+                await session.get(TEST_URL_IPV4)
+
+            for _ in range(50):
+                if upstream.health.failures >= 3:
+                    break
+                await asyncio.sleep(0.02)
+
+            assert upstream.health.failures >= 3
+            task = connector._probe_task  # noqa: SLF001
+            assert task is not None
+            assert not task.done()
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import asyncio
+import socket
+
+import aiohttp
+import pytest
+
+from aiohttp_socks import (
+    ChainProxyConnector,
+    ProxyConnector,
+    ProxyInfo,
+    TunnelKeepAlive,
+)
+from tests.config import SOCKS5_IPV4_URL, TEST_URL_IPV4
+from tests.utils import get
+
+
+@pytest.mark.asyncio
+async def test_idle_tunnels_evicted() -> None:
+    connector = ProxyConnector.from_url(SOCKS5_IPV4_URL, keepalive_timeout=0.2)
+    upstream = connector.upstreams[0]
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await get(session, TEST_URL_IPV4)
+        assert len(upstream.connections) == 1
+        await asyncio.sleep(0.5)
+        assert not upstream.connections
+
+        await get(session, TEST_URL_IPV4)
+        assert len(upstream.connections) == 1
+
+
+@pytest.mark.asyncio
+async def test_idle_timeout_per_upstream() -> None:
+    info = ProxyInfo.from_url(SOCKS5_IPV4_URL)
+    with pytest.raises(ValueError, match="Invalid proxy idle timeout"):
+        ChainProxyConnector([info._replace(idle_timeout=0)])
+
+    connector = ChainProxyConnector(
+        [info._replace(idle_timeout=0.2)],
+        keepalive_timeout=30,
+    )
+    upstream = connector.upstreams[0]
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await get(session, TEST_URL_IPV4)
+        (first,) = upstream.connections
+        await asyncio.sleep(0.1)
+        await get(session, TEST_URL_IPV4)  # reused, the idle time restarts
+        assert upstream.connections == {first}
+
+        await asyncio.sleep(0.3)
+        await get(session, TEST_URL_IPV4)  # expired, closed instead of reused
+        (second,) = upstream.connections
+        assert second is not first
+        assert not first.is_connected()
+
+
+def test_keepalive_socket_options() -> None:
+    keepalive = TunnelKeepAlive(keepidle=30, keepintvl=5, keepcnt=3, user_timeout=10)
+    with socket.socket() as sock:
+        keepalive.apply(sock)
+        assert sock.getsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE)
+        if hasattr(socket, "TCP_KEEPINTVL"):
+            assert sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL) == 5
+        if hasattr(socket, "TCP_USER_TIMEOUT"):
+            assert sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_USER_TIMEOUT) == 10000
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import asyncio
+import ssl
+
+import aiohttp
+import pytest
+
+from aiohttp_socks import (
+    ProxyInfo,
+    ProxyMetrics,
+    ProxyPoolConnector,
+    ProxyType,
+    Upstream,
+)
+from tests.config import (
+    SOCKS4_URL,
+    SOCKS5_IPV4_URL,
+    TEST_URL_IPV4,
+    TEST_URL_IPV4_HTTPS,
+)
+
+
+def make_upstream() -> Upstream:
+    return Upstream(ProxyInfo(proxy_type=ProxyType.SOCKS5, host="127.0.0.1", port=1080))
+
+
+@pytest.mark.asyncio
+async def test_upstream_slots_fifo() -> None:
+    upstream = make_upstream()
+    assert not await upstream.acquire(limit=1)
+
+    order: list[int] = []
+
+    async def wait(i: int) -> None:
+        assert await upstream.acquire(limit=1)
+        order.append(i)
+
+    tasks = [asyncio.create_task(wait(i)) for i in range(3)]
+    await asyncio.sleep(0)
+    assert upstream.queued == 3
+
+    for _ in range(3):
+        upstream.release()
+        await asyncio.sleep(0)
+
+    await asyncio.gather(*tasks)
+    assert order == [0, 1, 2]
+    assert upstream.outstanding == 1
+
+
+@pytest.mark.asyncio
+async def test_upstream_slots_cancelled_waiter() -> None:
+    upstream = make_upstream()
+    await upstream.acquire(limit=1)
+
+    cancelled = asyncio.create_task(upstream.acquire(limit=1))
+    waiting = asyncio.create_task(upstream.acquire(limit=1))
+    await asyncio.sleep(0)
+
+    upstream.release()  # handed over to `cancelled`
+    cancelled.cancel()  # ... which passes it on
+    await asyncio.sleep(0)
+
+    assert await waiting
+    assert upstream.outstanding == 1
+    assert upstream.queued == 0
+
+
+@pytest.mark.asyncio
+async def test_limit_per_proxy() -> None:
+    metrics = ProxyMetrics()
+    connector = ProxyPoolConnector.from_urls(
+        [SOCKS5_IPV4_URL, SOCKS4_URL],
+        limit_per_proxy=1,
+        metrics=metrics,
+        force_close=True,
+    )
+    peak = 0
+
+    async def fetch(session: aiohttp.ClientSession) -> None:
+        nonlocal peak
+        async with session.get(TEST_URL_IPV4) as resp:
+            peak = max(peak, *(u.outstanding for u in connector.upstreams))
+            assert resp.status == 200
+
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*(fetch(session) for _ in range(6)))
+
+    assert peak == 1
+    queued = [
+        sample.value
+        for metric in metrics.collect()
+        for sample in metric.samples
+        if sample.name == "aiohttp_socks_queue_seconds_count"
+    ]
+    assert sum(queued) > 0
+
+
+@pytest.mark.asyncio
+async def test_limit_per_proxy_closes_idle(target_ssl_context: ssl.SSLContext) -> None:
+    connector = ProxyPoolConnector.from_urls([SOCKS5_IPV4_URL], limit_per_proxy=1)
+    timeout = aiohttp.ClientTimeout(total=2)  # below the keep-alive timeouts
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        async with session.get(TEST_URL_IPV4) as resp:
+            assert resp.status == 200
+            await resp.read()
+
+        # the idle connection to another host gives its slot away
+        (upstream,) = connector.upstreams
+        async with session.get(TEST_URL_IPV4_HTTPS, ssl=target_ssl_context) as resp:
+            assert resp.status == 200
+            assert upstream.outstanding == 1
+            assert len(upstream.connections) == 1
+
+
+@pytest.mark.asyncio
+async def test_limit_per_proxy_closes_idle_ssl(
+    target_ssl_context: ssl.SSLContext,
+) -> None:
+    connector = ProxyPoolConnector.from_urls(
+        [SOCKS5_IPV4_URL],
+        limit_per_proxy=1,
+        enable_cleanup_closed=True,
+    )
+    timeout = aiohttp.ClientTimeout(total=2)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        async with session.get(TEST_URL_IPV4_HTTPS, ssl=target_ssl_context) as resp:
+            assert resp.status == 200
+            await resp.read()
+
+        (upstream,) = connector.upstreams
+        (protocol,) = upstream.connections
+        transport = protocol.transport
+        assert transport is not None
+        async with session.get(TEST_URL_IPV4) as resp:
+            assert resp.status == 200
+
+        # the closed SSL transport is aborted if it doesn't close in time
+        assert transport in connector._cleanup_closed_transports  # noqa: SLF001
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import aiohttp
+import pytest
+
+from aiohttp_socks import (
+    ProxyConnectionError,
+    ProxyConnector,
+    ProxyError,
+    ProxyMetrics,
+    ProxyType,
+    TextExporter,
+)
+from tests.config import (
+    LOGIN,
+    PASSWORD,
+    PROXY_HOST_IPV4,
+    SOCKS5_IPV4_URL,
+    SOCKS5_PROXY_PORT,
+    TEST_URL_IPV4,
+)
+from tests.utils import fetch
+
+
+def test_text_exporter() -> None:
+    metrics = ProxyMetrics(buckets=(0.1, 1.0))
+    metrics.record_opened("socks5://127.0.0.1:1080", 0.05)
+    metrics.record_opened("socks5://127.0.0.1:1080", 0.5)
+    metrics.record_closed("socks5://127.0.0.1:1080")
+    metrics.record_failure(
+        "socks5://127.0.0.1:1080",
+        ProxyError("Connection refused", error_code=5),
+    )
+
+    text = metrics.export(TextExporter())
+    labels = 'upstream="socks5://127.0.0.1:1080"'
+    assert "# TYPE aiohttp_socks_tunnels_opened_total counter" in text
+    assert f"aiohttp_socks_tunnels_opened_total{{{labels}}} 2" in text
+    assert f"aiohttp_socks_active_connections{{{labels}}} 1" in text
+    assert (
+        f'aiohttp_socks_tunnel_failures_total{{{labels},error="ProxyError",'
+        f'error_code="5"}} 1'
+    ) in text
+    assert f'aiohttp_socks_handshake_seconds_bucket{{{labels},le="0.1"}} 1' in text
+    assert f'aiohttp_socks_handshake_seconds_bucket{{{labels},le="1.0"}} 2' in text
+    assert f'aiohttp_socks_handshake_seconds_bucket{{{labels},le="+Inf"}} 2' in text
+    assert f"aiohttp_socks_handshake_seconds_count{{{labels}}} 2" in text
+
+
+@pytest.mark.asyncio
+async def test_connector_metrics(unused_tcp_port: int) -> None:
+    metrics = ProxyMetrics()
+
+    connector = ProxyConnector.from_url(
+        SOCKS5_IPV4_URL,
+        metrics=metrics,
+        force_close=True,
+    )
+    async with aiohttp.ClientSession(connector=connector) as session:
+        for _ in range(2):
+            async with session.get(TEST_URL_IPV4) as resp:
+                assert resp.status == 200
+
+    connector = ProxyConnector(
+        proxy_type=ProxyType.SOCKS5,
+        host=PROXY_HOST_IPV4,
+        port=SOCKS5_PROXY_PORT,
+        username=LOGIN,
+        password=PASSWORD + "aaa",
+        metrics=metrics,
+    )
+    with pytest.raises(ProxyError):
+        await fetch(connector=connector, url=TEST_URL_IPV4)
+
+    connector = ProxyConnector.from_url(
+        f"socks5://{PROXY_HOST_IPV4}:{unused_tcp_port}",
+        metrics=metrics,
+    )
+    with pytest.raises(ProxyConnectionError):
+        await fetch(connector=connector, url=TEST_URL_IPV4)
+
+    samples = {
+        (sample.name, tuple(sample.labels.values())): sample.value
+        for metric in metrics.collect()
+        for sample in metric.samples
+    }
+    upstream = f"socks5://{PROXY_HOST_IPV4}:{SOCKS5_PROXY_PORT}"
+    assert samples["aiohttp_socks_tunnels_opened_total", (upstream,)] == 2
+    assert samples["aiohttp_socks_active_connections", (upstream,)] == 0
+    assert samples["aiohttp_socks_handshake_seconds_count", (upstream,)] == 2
+    failures = [
+        labels
+        for name, labels in samples
+        if name == "aiohttp_socks_tunnel_failures_total"
+    ]
+    assert (upstream, "ProxyError") in [labels[:2] for labels in failures]
+    unused = f"socks5://{PROXY_HOST_IPV4}:{unused_tcp_port}"
+    assert (unused, "ProxyConnectionError") in [labels[:2] for labels in failures]
@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import ssl
+from typing import Any
+
+import aiohttp
+import pytest
+
+from aiohttp_socks import (
+    ConsistentHashStrategy,
+    LatencyWeightedStrategy,
+    LeastConnectionsStrategy,
+    ProxyInfo,
+    ProxyPoolConnector,
+    ProxyTraceConfig,
+    ProxyType,
+    RoundRobinStrategy,
+    Upstream,
+)
+from tests.config import (
+    HTTP_PROXY_URL,
+    LOGIN,
+    PASSWORD,
+    SOCKS4_URL,
+    SOCKS5_IPV4_URL,
+    TEST_URL_IPV4,
+    TEST_URL_IPV4_HEADERS,
+    TEST_URL_IPV4_HTTPS,
+)
+from tests.utils import fetch
+
+
+def make_upstreams(count: int) -> list[Upstream]:
+    return [
+        Upstream(ProxyInfo(proxy_type=ProxyType.SOCKS5, host="127.0.0.1", port=port))
+        for port in range(1080, 1080 + count)
+    ]
+
+
+def test_round_robin_strategy() -> None:
+    upstreams = make_upstreams(3)
+    strategy = RoundRobinStrategy()
+    selected = [strategy.select(upstreams) for _ in range(6)]
+    assert selected == upstreams + upstreams
+
+
+def test_least_connections_strategy() -> None:
+    upstreams = make_upstreams(3)
+    upstreams[0].outstanding = 2
+    upstreams[2].outstanding = 1
+    strategy = LeastConnectionsStrategy()
+    assert strategy.select(upstreams) is upstreams[1]
+
+
+def test_latency_weighted_strategy() -> None:
+    upstreams = make_upstreams(2)
+    upstreams[0].record_latency(10.0)
+    upstreams[1].record_latency(0.001)
+    strategy = LatencyWeightedStrategy()
+    selected = [strategy.select(upstreams) for _ in range(100)]
+    assert selected.count(upstreams[1]) > 90
+
+
+def test_consistent_hash_strategy() -> None:
+    upstreams = make_upstreams(4)
+    strategy = ConsistentHashStrategy()
+    keys = [f"host{i}.example.com" for i in range(1000)]
+
+    before = {key: strategy.select(upstreams, key=key) for key in keys}
+    assert before == {key: strategy.select(upstreams, key=key) for key in keys}
+    assert all(list(before.values()).count(u) > 100 for u in upstreams)
+
+    removed = upstreams.pop(1)
+    after = {key: strategy.select(upstreams, key=key) for key in keys}
+    # only the keys of the removed upstream are remapped
+    assert all(after[key] is before[key] for key in keys if before[key] is not removed)
+
+
+def test_upstream_name() -> None:
+    info = ProxyInfo(proxy_type=ProxyType.SOCKS5, host="::1", port=1080)
+    assert Upstream(info).name == "socks5://[::1]:1080"
+
+
+def test_upstream_handshake_templates() -> None:
+    forward = ProxyInfo(proxy_type=ProxyType.SOCKS5, host="127.0.0.1", port=1080)
+    info = ProxyInfo(
+        proxy_type=ProxyType.SOCKS5,
+        host="127.0.0.1",
+        port=1081,
+        username=LOGIN,
+        password=PASSWORD,
+    )
+    first, last = Upstream(info, forward=[forward]).templates
+
+    assert first.info is forward
+    assert first.greeting == first.pipelined_greeting == b"\x05\x01\x00"
+    assert first.auth == b""
+
+    assert last.info is info
+    assert last.greeting == b"\x05\x02\x00\x02"
+    assert last.pipelined_greeting == b"\x05\x01\x02"
+    assert last.auth == b"\x01\x05admin\x05admin"
+
+
+@pytest.mark.asyncio
+async def test_upstream_proxy() -> None:
+    forward = ProxyInfo(proxy_type=ProxyType.SOCKS5, host="127.0.0.1", port=1080)
+    info = ProxyInfo(proxy_type=ProxyType.HTTP, host="127.0.0.1", port=3128)
+    upstream = Upstream(info, forward=[forward])
+
+    # built once, every connection shares it
+    assert upstream.proxy is upstream.proxy
+
+
+@pytest.mark.asyncio
+async def test_invalid_strategy() -> None:
+    with pytest.raises(ValueError):
+        ProxyPoolConnector.from_urls([SOCKS5_IPV4_URL], strategy="unknown")
+
+
+@pytest.mark.parametrize("url", (TEST_URL_IPV4, TEST_URL_IPV4_HTTPS))
+@pytest.mark.parametrize(
+    "strategy", ("round_robin", "random", "least_connections", "latency")
+)
+@pytest.mark.asyncio
+async def test_pool_proxy(
+    url: str,
+    strategy: str,
+    target_ssl_context: ssl.SSLContext,
+) -> None:
+    connector = ProxyPoolConnector.from_urls(
+        [SOCKS5_IPV4_URL, SOCKS4_URL, HTTP_PROXY_URL],
+        strategy=strategy,
+    )
+    res = await fetch(
+        connector=connector,
+        url=url,
+        ssl_context=target_ssl_context,
+    )
+    assert res.status == 200
+
+
+@pytest.mark.asyncio
+async def test_pool_proxy_spreads_connections() -> None:
+    connector = ProxyPoolConnector.from_urls(
+        [SOCKS5_IPV4_URL, SOCKS4_URL, HTTP_PROXY_URL],
+        force_close=True,
+    )
+    async with aiohttp.ClientSession(connector=connector) as session:
+        for _ in range(3):
+            async with session.get(TEST_URL_IPV4) as resp:
+                assert resp.status == 200
+
+    assert all(u.latency is not None for u in connector.upstreams)
+    assert all(u.outstanding == 0 for u in connector.upstreams)
+
+
+@pytest.mark.asyncio
+async def test_pool_proxy_affinity_header() -> None:
+    proxies = []
+
+    async def on_proxy_connect_start(*args: Any) -> None:
+        proxies.append(args[-1].proxy)
+
+    trace_config = ProxyTraceConfig()
+    trace_config.on_proxy_connect_start.append(on_proxy_connect_start)
+
+    connector = ProxyPoolConnector.from_urls(
+        [SOCKS5_IPV4_URL, SOCKS4_URL, HTTP_PROXY_URL],
+        strategy="consistent_hash",
+        affinity_header="X-Proxy-Session",
+        force_close=True,
+    )
+    async with aiohttp.ClientSession(
+        connector=connector,
+        trace_configs=[trace_config],
+    ) as session:
+        for _ in range(3):
+            async with session.get(
+                TEST_URL_IPV4_HEADERS,
+                headers={"X-Proxy-Session": "session-1"},
+            ) as resp:
+                assert resp.status == 200
+                headers = await resp.json()
+                assert "x-proxy-session" not in headers
+
+    assert len(proxies) == 3
+    assert len(set(proxies)) == 1
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import pytest
+
+from aiohttp_socks._protocols import http, socks4, socks5
+from aiohttp_socks._protocols.errors import ReplyError
+from tests.config import LOGIN, PASSWORD
+
+
+def test_socks5_requests() -> None:
+    methods = socks5.AuthMethodsRequest(username=LOGIN, password=PASSWORD)
+    assert methods.dumps() == b"\x05\x02\x00\x02"
+    assert socks5.AuthMethodsRequest(username=None, password=None).dumps() == (
+        b"\x05\x01\x00"
+    )
+    assert socks5.AuthRequest(username=LOGIN, password=PASSWORD).dumps() == (
+        b"\x01\x05admin\x05admin"
+    )
+    assert socks5.ConnectRequest(host="127.0.0.1", port=80).dumps() == (
+        b"\x05\x01\x00\x01\x7f\x00\x00\x01\x00\x50"
+    )
+    assert socks5.ConnectRequest(host="::1", port=443).dumps() == (
+        b"\x05\x01\x00\x04" + bytes(15) + b"\x01\x01\xbb"
+    )
+    assert socks5.ConnectRequest(host="example.com", port=80).dumps() == (
+        b"\x05\x01\x00\x03\x0bexample.com\x00\x50"
+    )
+
+
+def test_socks5_replies() -> None:
+    methods = socks5.AuthMethodsRequest(username=None, password=None)
+    reply = socks5.AuthMethodReply.loads(b"\x05\x00")
+    reply.validate(methods)
+    with pytest.raises(ReplyError):
+        socks5.AuthMethodReply.loads(b"\x05\x02").validate(methods)
+    with pytest.raises(ReplyError):
+        socks5.AuthMethodReply.loads(b"\x05\xff")
+
+    socks5.AuthReply.loads(b"\x01\x00")
+    with pytest.raises(ReplyError, match="authentication failure"):
+        socks5.AuthReply.loads(b"\x01\x01")
+
+    socks5.ConnectReply.loads(b"\x05\x00\x00\x01" + bytes(6))
+    with pytest.raises(ReplyError, match="not allowed by ruleset") as exc_info:
+        socks5.ConnectReply.loads(b"\x05\x02\x00")
+    assert exc_info.value.error_code == socks5.ReplyCode.CONNECTION_NOT_ALLOWED
+
+
+def test_socks4() -> None:
+    assert socks4.ConnectRequest(host="127.0.0.1", port=80, user_id=LOGIN).dumps() == (
+        b"\x04\x01\x00\x50\x7f\x00\x00\x01admin\x00"
+    )
+    # SOCKS4a
+    assert socks4.ConnectRequest(host="example.com", port=80, user_id=None).dumps() == (
+        b"\x04\x01\x00\x50\x00\x00\x00\x01\x00example.com\x00"
+    )
+
+    socks4.ConnectReply.loads(b"\x00\x5a" + bytes(6))
+    with pytest.raises(ReplyError) as exc_info:
+        socks4.ConnectReply.loads(b"\x00\x5b" + bytes(6))
+    assert exc_info.value.error_code == socks4.ReplyCode.REQUEST_REJECTED_OR_FAILED
+
+
+def test_http() -> None:
+    request = http.ConnectRequest(
+        host="::1",
+        port=443,
+        username=LOGIN,
+        password=PASSWORD,
+    ).dumps()
+    assert request.startswith(b"CONNECT [::1]:443 HTTP/1.1\r\nHost: [::1]:443\r\n")
+    assert b"\r\nProxy-Authorization: Basic YWRtaW46YWRtaW4=\r\n" in request
+    assert request.endswith(b"\r\n\r\n")
+
+    http.ConnectReply.loads(b"HTTP/1.1 200 Connection established\r\n\r\n")
+    with pytest.raises(ReplyError, match="407 Proxy Authentication Required") as e:
+        http.ConnectReply.loads(b"HTTP/1.1 407 Proxy Authentication Required\r\n\r\n")
+    assert e.value.error_code == 407
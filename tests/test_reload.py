@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import asyncio
+from collections import Counter
+from pathlib import Path
+
+import aiohttp
+import pytest
+from python_socks import parse_proxy_url
+
+from aiohttp_socks import (
+    FileProvider,
+    ProxyInfo,
+    ProxyMetrics,
+    ProxyPoolConnector,
+    ProxyType,
+    RoundRobinStrategy,
+    Upstream,
+)
+from aiohttp_socks._providers import parse_upstreams
+from tests.config import (
+    SOCKS4_URL,
+    SOCKS5_IPV4_URL,
+    TEST_HOST_IPV4,
+    TEST_PORT_IPV4,
+    TEST_URL_IPV4,
+)
+
+TEST_URL_IPV4_LITERAL = f"http://{TEST_HOST_IPV4}:{TEST_PORT_IPV4}/ip"
+
+
+def make_info(url: str) -> ProxyInfo:
+    return ProxyInfo(*parse_proxy_url(url))
+
+
+def test_weighted_round_robin() -> None:
+    heavy = Upstream(make_info(SOCKS5_IPV4_URL), weight=2.0)
+    light = Upstream(make_info(SOCKS4_URL))
+    strategy = RoundRobinStrategy()
+
+    picks = [strategy.select([heavy, light]) for _ in range(30)]
+    assert Counter(picks) == {heavy: 20, light: 10}
+    # smooth: the light upstream is not starved for long
+    assert light in picks[:3]
+
+
+def test_parse_upstreams() -> None:
+    upstreams = parse_upstreams(
+        f"# upstreams\n\n{SOCKS5_IPV4_URL} 2.5\n  {SOCKS4_URL}\n"
+    )
+    assert upstreams == {
+        make_info(SOCKS5_IPV4_URL): 2.5,
+        make_info(SOCKS4_URL): 1.0,
+    }
+
+
+@pytest.mark.asyncio
+async def test_set_upstreams_validation() -> None:
+    connector = ProxyPoolConnector.from_urls([SOCKS5_IPV4_URL])
+    info = make_info(SOCKS5_IPV4_URL)
+
+    with pytest.raises(ValueError, match="At least one proxy"):
+        connector.set_upstreams([])
+    with pytest.raises(ValueError, match="Invalid weight"):
+        connector.set_weight(info, 0)
+    with pytest.raises(ValueError, match="Unknown upstream proxy"):
+        connector.remove_upstream(make_info(SOCKS4_URL))
+    with pytest.raises(ValueError, match="At least one proxy"):
+        connector.remove_upstream(info)
+
+    assert [u.info for u in connector.upstreams] == [info]
+
+
+@pytest.mark.asyncio
+async def test_remove_upstream_drains_connections() -> None:
+    metrics = ProxyMetrics()
+    connector = ProxyPoolConnector.from_urls(
+        [SOCKS5_IPV4_URL, SOCKS4_URL],
+        metrics=metrics,
+    )
+    removed, kept = connector.upstreams
+
+    async with aiohttp.ClientSession(connector=connector) as session:
+        for url in (TEST_URL_IPV4, TEST_URL_IPV4_LITERAL):
+            async with session.get(url) as resp:
+                assert resp.status == 200
+                await resp.read()
+
+        assert len(removed.connections) == 1
+        assert len(kept.connections) == 1
+
+        # from another thread
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, connector.remove_upstream, removed.info)
+        await asyncio.sleep(0.1)
+
+        assert connector.upstreams == (kept,)
+        assert removed.removed
+        assert not removed.connections
+        assert removed.outstanding == 0
+        assert len(kept.connections) == 1
+
+        # the pooled connection through the surviving upstream is reused
+        async with session.get(TEST_URL_IPV4_LITERAL) as resp:
+            assert resp.status == 200
+            await resp.read()
+        # the destination of the drained connection gets a new one
+        async with session.get(TEST_URL_IPV4) as resp:
+            assert resp.status == 200
+
+    opened = {
+        sample.labels["upstream"]: sample.value
+        for metric in metrics.collect()
+        for sample in metric.samples
+        if sample.name == "aiohttp_socks_tunnels_opened_total"
+    }
+    assert opened == {removed.name: 1, kept.name: 2}
+
+
+@pytest.mark.asyncio
+async def test_remove_upstream_in_use() -> None:
+    connector = ProxyPoolConnector.from_urls([SOCKS5_IPV4_URL, SOCKS4_URL])
+    removed, kept = connector.upstreams
+
+    async with aiohttp.ClientSession(connector=connector) as session:
+        async with session.get(TEST_URL_IPV4) as resp:
+            connector.set_upstreams([kept.info], weights={kept.info: 3.0})
+            # the response is still readable
+            assert resp.status == 200
+            assert await resp.text()
+            (protocol,) = removed.connections
+            assert protocol.should_close
+
+        await asyncio.sleep(0.1)
+        assert not removed.connections
+        assert kept.weight == 3.0
+
+
+@pytest.mark.asyncio
+async def test_watch_file_provider(tmp_path: Path) -> None:
+    path = tmp_path / "proxies.txt"
+    path.write_text(f"{SOCKS5_IPV4_URL}\n")
+
+    connector = ProxyPoolConnector.from_urls([SOCKS4_URL])
+    connector.watch(FileProvider(path), interval=0.05)
+
+    async def wait_for(urls: list[str]) -> None:
+        infos = [make_info(url) for url in urls]
+        while [u.info for u in connector.upstreams] != infos:  # noqa: ASYNC110
+            await asyncio.sleep(0.01)
+
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.wait_for(wait_for([SOCKS5_IPV4_URL]), 1)
+
+        path.write_text(f"{SOCKS5_IPV4_URL}\n{SOCKS4_URL} 2\n")
+        await asyncio.wait_for(wait_for([SOCKS5_IPV4_URL, SOCKS4_URL]), 1)
+        assert connector.upstreams[1].weight == 2.0
+
+        path.unlink()  # failed fetches keep the current list
+        await asyncio.sleep(0.1)
+        assert len(connector.upstreams) == 2
+
+        async with session.get(TEST_URL_IPV4) as resp:
+            assert resp.status == 200
+
+    assert connector.upstreams[0].info.proxy_type == ProxyType.SOCKS5
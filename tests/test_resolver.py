@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import asyncio
+import socket
+
+import pytest
+from aiohttp.abc import AbstractResolver, ResolveResult
+
+from aiohttp_socks import CachingResolver
+
+
+class CountingResolver(AbstractResolver):
+    def __init__(self) -> None:
+        self.calls = 0
+        self.fail = False
+
+    async def resolve(
+        self,
+        host: str,
+        port: int = 0,
+        family: socket.AddressFamily = socket.AF_INET,
+    ) -> list[ResolveResult]:
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        if self.fail:
+            raise OSError("Lookup failed")
+        return [
+            {
+                "hostname": host,
+                "host": f"10.0.0.{self.calls}",
+                "port": port,
+                "family": family,
+                "proto": 0,
+                "flags": 0,
+            }
+        ]
+
+    async def close(self) -> None:
+        pass
+
+
+@pytest.mark.asyncio
+async def test_caching_resolver_caches() -> None:
+    inner = CountingResolver()
+    resolver = CachingResolver(inner, ttl=60)
+
+    first = await resolver.resolve("proxy.example.com", 1080)
+    second = await resolver.resolve("proxy.example.com", 1080)
+    assert first == second
+    assert inner.calls == 1
+
+    await resolver.resolve("proxy.example.com", 1081)
+    assert inner.calls == 2
+
+    resolver.clear("proxy.example.com", 1080)
+    await resolver.resolve("proxy.example.com", 1080)
+    assert inner.calls == 3
+
+
+@pytest.mark.asyncio
+async def test_caching_resolver_coalesces_lookups() -> None:
+    inner = CountingResolver()
+    resolver = CachingResolver(inner)
+
+    results = await asyncio.gather(
+        *(resolver.resolve("proxy.example.com", 1080) for _ in range(10))
+    )
+    assert inner.calls == 1
+    assert all(r == results[0] for r in results)
+
+
+@pytest.mark.asyncio
+async def test_caching_resolver_stale_while_revalidate() -> None:
+    inner = CountingResolver()
+    resolver = CachingResolver(inner, ttl=0, stale_ttl=60)
+
+    first = await resolver.resolve("proxy.example.com", 1080)
+    # expired: the stale result is returned at once and refreshed in the background
+    assert await resolver.resolve("proxy.example.com", 1080) == first
+    await asyncio.sleep(0.05)
+    assert inner.calls == 2
+
+    inner.fail = True
+    stale = await resolver.resolve("proxy.example.com", 1080)
+    assert stale != first
+    await asyncio.sleep(0.05)
+    # the failed refresh keeps the stale result
+    assert await resolver.resolve("proxy.example.com", 1080) == stale
+
+    await resolver.close()
+
+
+@pytest.mark.asyncio
+async def test_caching_resolver_expired() -> None:
+    inner = CountingResolver()
+    resolver = CachingResolver(inner, ttl=0, stale_ttl=0)
+
+    await resolver.resolve("proxy.example.com", 1080)
+    inner.fail = True
+    with pytest.raises(OSError):
+        await resolver.resolve("proxy.example.com", 1080)
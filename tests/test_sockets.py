@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import asyncio
+import socket
+import sys
+
+import aiohttp
+import pytest
+
+from aiohttp_socks import (
+    ChainProxyConnector,
+    LocalAddressPool,
+    ProxyConnectionError,
+    ProxyConnector,
+    ProxyInfo,
+)
+from tests.config import SOCKS4_URL, SOCKS5_IPV4_URL, TEST_URL_IPV4
+from tests.utils import get
+
+
+def tunnel_socket(connector: ProxyConnector | ChainProxyConnector) -> socket.socket:
+    (protocol,) = connector.upstreams[0].connections
+    assert protocol.transport is not None
+    return protocol.transport.get_extra_info("socket")
+
+
+@pytest.mark.asyncio
+async def test_socket_options() -> None:
+    created = []
+
+    def socket_factory(addr_info: aiohttp.AddrInfoType) -> socket.socket:
+        family, type_, proto, _, _ = addr_info
+        sock = socket.socket(family=family, type=type_, proto=proto)
+        created.append(sock)
+        return sock
+
+    connector = ProxyConnector.from_url(
+        SOCKS5_IPV4_URL,
+        socket_options=[(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)],
+        socket_factory=socket_factory,
+    )
+    async with (
+        aiohttp.ClientSession(connector=connector) as session,
+        session.get(TEST_URL_IPV4) as resp,
+    ):
+        assert resp.status == 200
+        sock = tunnel_socket(connector)
+        assert sock.getsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE)
+        assert len(created) == 1
+        assert created[0].fileno() == sock.fileno()
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="127.0.0.2 needs Linux loopback")
+@pytest.mark.asyncio
+async def test_local_addr() -> None:
+    connector = ChainProxyConnector(
+        [ProxyInfo.from_url(SOCKS5_IPV4_URL), ProxyInfo.from_url(SOCKS4_URL)],
+        local_addr=("127.0.0.2", 0),
+    )
+    async with (
+        aiohttp.ClientSession(connector=connector) as session,
+        session.get(TEST_URL_IPV4) as resp,
+    ):
+        assert resp.status == 200
+        assert tunnel_socket(connector).getsockname()[0] == "127.0.0.2"
+
+
+def test_local_address_pool_validation() -> None:
+    with pytest.raises(ValueError, match="At least one"):
+        LocalAddressPool([])
+    with pytest.raises(ValueError):
+        LocalAddressPool(["localhost"])
+    with pytest.raises(ValueError, match="max_per_address"):
+        LocalAddressPool(["127.0.0.1"], max_per_address=0)
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="127.0.0.x needs Linux loopback")
+@pytest.mark.asyncio
+async def test_local_address_pool() -> None:
+    pool = LocalAddressPool(["127.0.0.2", "127.0.0.3"], max_per_address=2)
+    connector = ProxyConnector.from_url(SOCKS5_IPV4_URL, local_addresses=pool)
+
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*(get(session, TEST_URL_IPV4) for _ in range(4)))
+        assert pool.in_use() == {"127.0.0.2": 2, "127.0.0.3": 2}
+
+        # 4 pooled connections are reused, the fifth one can't be opened
+        results = await asyncio.gather(
+            *(get(session, TEST_URL_IPV4) for _ in range(5)),
+            return_exceptions=True,
+        )
+        (error,) = [r for r in results if isinstance(r, BaseException)]
+        assert isinstance(error, ProxyConnectionError)
+        assert "used up" in str(error)
+
+    assert pool.in_use() == {"127.0.0.2": 0, "127.0.0.3": 0}
+
+    with pytest.raises(ValueError, match="mutually exclusive"):
+        ProxyConnector.from_url(
+            SOCKS5_IPV4_URL,
+            local_addr=("127.0.0.2", 0),
+            local_addresses=pool,
+        )
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import ssl
+
+import aiohttp
+import pytest
+import trustme
+
+from aiohttp_socks import ProxyConnector, TLSSessionCache
+from tests.config import SOCKS5_IPV4_URL, TEST_URL_IPV4_HTTPS
+
+
+@pytest.fixture
+def resuming_ssl_context(target_ssl_ca: trustme.CA) -> ssl.SSLContext:
+    ssl_context = TLSSessionCache.create_default_context()
+    target_ssl_ca.configure_trust(ssl_context)
+    return ssl_context
+
+
+@pytest.mark.asyncio
+async def test_tls_session_resumption(resuming_ssl_context: ssl.SSLContext) -> None:
+    tls_sessions = TLSSessionCache()
+    connector = ProxyConnector.from_url(
+        SOCKS5_IPV4_URL,
+        tls_sessions=tls_sessions,
+        force_close=True,
+    )
+
+    async with aiohttp.ClientSession(connector=connector) as session:
+        for _ in range(3):
+            async with session.get(
+                TEST_URL_IPV4_HTTPS, ssl=resuming_ssl_context
+            ) as resp:
+                assert resp.status == 200
+                await resp.read()
+
+    assert tls_sessions.handshakes == 3
+    assert tls_sessions.resumed == 2
+    assert len(tls_sessions) == 1
+
+
+@pytest.mark.asyncio
+async def test_tls_session_other_context(target_ssl_context: ssl.SSLContext) -> None:
+    tls_sessions = TLSSessionCache()
+    connector = ProxyConnector.from_url(
+        SOCKS5_IPV4_URL,
+        tls_sessions=tls_sessions,
+        force_close=True,
+    )
+
+    async with aiohttp.ClientSession(connector=connector) as session:
+        for _ in range(2):
+            async with session.get(TEST_URL_IPV4_HTTPS, ssl=target_ssl_context) as resp:
+                assert resp.status == 200
+                await resp.read()
+
+    # used as it is, not changed
+    assert target_ssl_context.sslobject_class is ssl.SSLObject
+    assert tls_sessions.handshakes == 0
+    assert len(tls_sessions) == 0
+
+
+def test_tls_session_cache_eviction() -> None:
+    tls_sessions = TLSSessionCache(maxsize=2)
+    ssl_context = TLSSessionCache.create_default_context()
+    ssl_object = ssl_context.wrap_bio(ssl.MemoryBIO(), ssl.MemoryBIO())
+
+    for key in ("a", "b", "c"):
+        tls_sessions.store(key, ssl_context, ssl_object)
+
+    assert len(tls_sessions) == 2
+    assert tls_sessions.handshakes == 3
+    assert tls_sessions.resumed == 0
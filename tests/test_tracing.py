@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import ssl
+from types import SimpleNamespace
+from typing import Any
+
+import aiohttp
+import pytest
+
+from aiohttp_socks import ChainProxyConnector, ProxyConnector, ProxyTraceConfig
+from tests.config import (
+    HTTP_PROXY_URL,
+    SOCKS4_URL,
+    SOCKS5_IPV4_URL,
+    TEST_URL_IPV4,
+    TEST_URL_IPV4_HTTPS,
+)
+
+
+def create_trace_config(events: list[tuple[str, Any]]) -> ProxyTraceConfig:
+    trace_config = ProxyTraceConfig()
+
+    def record(name: str) -> Any:
+        async def on_signal(
+            _session: aiohttp.ClientSession,
+            _ctx: SimpleNamespace,
+            params: Any,
+        ) -> None:
+            events.append((name, params))
+
+        return on_signal
+
+    trace_config.on_proxy_connect_start.append(record("connect_start"))
+    trace_config.on_proxy_connect_end.append(record("connect_end"))
+    trace_config.on_proxy_hop_end.append(record("hop_end"))
+    trace_config.on_proxy_handshake_end.append(record("handshake_end"))
+    trace_config.on_dest_tls_end.append(record("dest_tls_end"))
+    return trace_config
+
+
+@pytest.mark.parametrize(
+    ("url", "expected"),
+    (
+        (TEST_URL_IPV4, ["connect_start", "connect_end", "hop_end", "handshake_end"]),
+        (
+            TEST_URL_IPV4_HTTPS,
+            [
+                "connect_start",
+                "connect_end",
+                "hop_end",
+                "handshake_end",
+                "dest_tls_end",
+            ],
+        ),
+    ),
+)
+@pytest.mark.asyncio
+async def test_proxy_trace_signals(
+    url: str,
+    expected: list[str],
+    target_ssl_context: ssl.SSLContext,
+) -> None:
+    events: list[tuple[str, Any]] = []
+    connector = ProxyConnector.from_url(SOCKS5_IPV4_URL)
+    async with (
+        aiohttp.ClientSession(
+            connector=connector,
+            trace_configs=[create_trace_config(events)],
+        ) as session,
+        session.get(url, ssl=target_ssl_context) as resp,
+    ):
+        assert resp.status == 200
+
+    assert [name for name, _ in events] == expected
+    for _, params in events:
+        assert params.proxy == "socks5://127.0.0.1:7780"
+        assert params.host == "ip4.target.example.com"
+    assert all(params.duration >= 0 for _, params in events[1:])
+
+
+@pytest.mark.asyncio
+async def test_chain_proxy_trace_signals() -> None:
+    events: list[tuple[str, Any]] = []
+    connector = ChainProxyConnector.from_urls(
+        [SOCKS5_IPV4_URL, SOCKS4_URL, HTTP_PROXY_URL]
+    )
+    async with (
+        aiohttp.ClientSession(
+            connector=connector,
+            trace_configs=[create_trace_config(events), aiohttp.TraceConfig()],
+        ) as session,
+        session.get(TEST_URL_IPV4) as resp,
+    ):
+        assert resp.status == 200
+
+    assert [name for name, _ in events] == [
+        "connect_start",
+        "connect_end",
+        "hop_end",
+        "hop_end",
+        "hop_end",
+        "handshake_end",
+    ]
+    assert events[0][1].proxy == (
+        "socks5://127.0.0.1:7780 -> socks4://127.0.0.1:7782 -> http://127.0.0.1:7784"
+    )
+    assert [params.hop for name, params in events if name == "hop_end"] == [
+        "socks5://127.0.0.1:7780",
+        "socks4://127.0.0.1:7782",
+        "http://127.0.0.1:7784",
+    ]
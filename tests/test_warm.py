@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import asyncio
+import ssl
+
+import aiohttp
+import pytest
+
+from aiohttp_socks import (
+    ChainProxyConnector,
+    ProxyConnector,
+    ProxyInfo,
+    ProxyMetrics,
+    ProxyTraceConfig,
+    Upstream,
+    WarmPool,
+)
+from aiohttp_socks._dialer import Dialer
+from aiohttp_socks._warm import WarmTunnels
+from tests.config import (
+    HTTP_PROXY_URL,
+    SOCKS4_URL,
+    SOCKS5_IPV4_URL,
+    SOCKS5_IPV4_URL_WO_AUTH,
+    TEST_URL_IPV4,
+    TEST_URL_IPV4_HTTPS,
+)
+from tests.utils import fake_proxy
+
+
+async def wait_ready(tunnels: WarmTunnels | None, count: int) -> None:
+    assert tunnels is not None
+    for _ in range(100):
+        if tunnels.ready >= count:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("Warm tunnels are not ready")
+
+
+@pytest.mark.parametrize("url", (TEST_URL_IPV4, TEST_URL_IPV4_HTTPS))
+@pytest.mark.parametrize(
+    "proxy_url",
+    (SOCKS5_IPV4_URL, SOCKS5_IPV4_URL_WO_AUTH, SOCKS4_URL, HTTP_PROXY_URL),
+)
+@pytest.mark.asyncio
+async def test_warm_pool(
+    url: str,
+    proxy_url: str,
+    target_ssl_context: ssl.SSLContext,
+) -> None:
+    connector = ProxyConnector.from_url(
+        proxy_url,
+        warm_pool=WarmPool(size=2),
+        force_close=True,
+    )
+    (upstream,) = connector.upstreams
+
+    async with aiohttp.ClientSession(connector=connector) as session:
+        for _ in range(3):
+            async with session.get(url, ssl=target_ssl_context) as resp:
+                assert resp.status == 200
+            await wait_ready(upstream.warm_tunnels, 2)
+
+    assert upstream.warm_tunnels is not None
+    assert upstream.warm_tunnels.ready == 0
+
+
+@pytest.mark.asyncio
+async def test_chain_warm_pool() -> None:
+    metrics = ProxyMetrics()
+    connector = ChainProxyConnector.from_urls(
+        [SOCKS5_IPV4_URL, SOCKS4_URL, HTTP_PROXY_URL],
+        warm_pool=WarmPool(size=1),
+        metrics=metrics,
+        force_close=True,
+    )
+    (upstream,) = connector.upstreams
+
+    connects = 0
+
+    async def on_connect_start(*_: object) -> None:
+        nonlocal connects
+        connects += 1
+
+    trace_config = ProxyTraceConfig()
+    trace_config.on_proxy_connect_start.append(on_connect_start)
+
+    async with aiohttp.ClientSession(
+        connector=connector,
+        trace_configs=[trace_config],
+    ) as session:
+        async with session.get(TEST_URL_IPV4) as resp:
+            assert resp.status == 200
+        await wait_ready(upstream.warm_tunnels, 1)
+
+        # only the final CONNECT is left to do
+        async with session.get(TEST_URL_IPV4) as resp:
+            assert resp.status == 200
+
+    assert connects == 1
+
+    hops = {
+        sample.labels["hop"]: sample.value
+        for metric in metrics.collect()
+        for sample in metric.samples
+        if sample.name == "aiohttp_socks_hop_seconds_count"
+    }
+    # the first request and the warm pool
+    assert list(hops) == list(upstream.hop_names)
+    assert min(hops.values()) >= 2
+
+
+@pytest.mark.asyncio
+async def test_warm_tunnel_closed_by_proxy() -> None:
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        await reader.read(1)
+        writer.close()
+
+    loop = asyncio.get_running_loop()
+    async with fake_proxy(handle, scheme="http") as url:
+        tunnels = WarmTunnels(
+            loop=loop,
+            dialer=Dialer(loop=loop, resolver=aiohttp.DefaultResolver()),
+            upstream=Upstream(ProxyInfo.from_url(url)),
+            config=WarmPool(size=1),
+        )
+        tunnels.fill()
+        await wait_ready(tunnels, 1)
+
+        stream = tunnels.acquire()
+        assert stream is not None
+        assert await tunnels.connect(stream, host="example.com", port=80) is None
+
+        tunnels.close()
@@ -1,5 +1,17 @@
+from __future__ import annotations
+
+import asyncio
 import socket
+import ssl
 import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+
+import aiohttp
+from aiohttp import ClientResponse, TCPConnector
+from yarl import URL
+
+Handler = Callable[[asyncio.StreamReader, asyncio.StreamWriter], Awaitable[None]]
 
 
 def is_connectable(host: str, port: int) -> bool:
@@ -23,3 +35,62 @@ def wait_until_connectable(host: str, port: int, timeout: int = 10) -> bool:
         count += 1
         time.sleep(1)
     return True
+
+
+async def fetch(
+    connector: TCPConnector,
+    url: str | URL,
+    timeout: float | aiohttp.ClientTimeout | None = None,
+    ssl_context: ssl.SSLContext | None = None,
+) -> ClientResponse:
+    async with aiohttp.ClientSession(connector=connector) as session:
+        return await get(session, url, timeout=timeout, ssl_context=ssl_context)
+
+
+async def get(
+    session: aiohttp.ClientSession,
+    url: str | URL,
+    timeout: float | aiohttp.ClientTimeout | None = None,
+    ssl_context: ssl.SSLContext | None = None,
+) -> ClientResponse:
+    """
+    The response is read, so that the connection can be reused
+    """
+    url = URL(url)
+
+    dest_ssl = ssl_context if url.scheme == "https" else None
+
+    if isinstance(timeout, (int, float)):
+        timeout = aiohttp.ClientTimeout(total=timeout)
+
+    async with session.get(
+        url,
+        ssl=dest_ssl,  # type:ignore[arg-type]
+        timeout=timeout,
+    ) as resp:
+        await resp.read()
+        return resp
+
+
+@asynccontextmanager
+async def fake_proxy(
+    handle: Handler,
+    scheme: str = "socks5",
+    ssl_context: ssl.SSLContext | None = None,
+) -> AsyncIterator[str]:
+    """
+    A proxy server stand-in, every connection is served by `handle`.
+    Yields the proxy URL
+    """
+    server = await asyncio.start_server(
+        handle,
+        host="127.0.0.1",
+        port=0,
+        ssl=ssl_context,
+    )
+    host, port = server.sockets[0].getsockname()[:2]
+    try:
+        yield f"{scheme}://{host}:{port}"
+    finally:
+        server.close()
+        await server.wait_closed()